@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Офлайн-анализ Docker образа по архиву `docker save` (демон Docker не нужен)
+
+Поддерживаются архивы в формате docker (manifest.json + <слой>/layer.tar) и OCI
+(index.json + blobs/sha256, слои в том числе сжатые gzip). Отчет:
+    - размер каждого слоя и команда Dockerfile, которая его создала;
+    - размер по Python-пакетам (по dist-info/RECORD) в итоговой файловой системе;
+    - файлы, перекрытые или удаленные в верхних слоях (занимают место, но не видны);
+    - дубликаты файлов (одинаковое содержимое по разным путям);
+    - пакеты и каталоги, которые не загружаются приложением, и время импорта
+      модулей, которые приложение действительно загружает (python -X importtime).
+
+Время импорта измеряется интерпретатором хоста на извлеченных из образа site-packages
+и коде приложения, поэтому версия Python хоста должна совпадать с версией в образе.
+"""
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+SITE_PACKAGES_RE = re.compile(r"^(usr/(?:local/)?lib/python(\d+\.\d+)/(?:site|dist)-packages)/")
+UNUSED_DIR_NAMES = {"tests", "test", "testing", "docs", "examples", "benchmarks"}
+
+
+def format_size(bytes_size: float) -> str:
+    """Форматирование размера в читаемый вид"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if abs(bytes_size) < 1024.0:
+            return f"{bytes_size:.2f}{unit}"
+        bytes_size /= 1024.0
+    return f"{bytes_size:.2f}PB"
+
+
+def _normalize(name: str) -> str:
+    """Путь внутри слоя без префиксов "./" и "/"; точки в начале имен (.bashrc, .wh.*) сохраняются"""
+    while name.startswith(("./", "/")):
+        name = name[2:] if name.startswith("./") else name[1:]
+    return posixpath.normpath(name) if name else name
+
+
+def read_image_layout(archive: tarfile.TarFile) -> Tuple[List[str], Dict]:
+    """
+    Пути слоев (снизу вверх) и конфигурация образа
+
+    Returns:
+        (список путей слоев внутри архива, JSON конфигурации образа)
+    """
+    names = set(archive.getnames())
+    if "manifest.json" in names:
+        manifest = json.load(archive.extractfile("manifest.json"))[0]
+        config = json.load(archive.extractfile(manifest["Config"]))
+        return manifest["Layers"], config
+    if "index.json" in names:
+        def blob(digest: str) -> str:
+            return "blobs/" + digest.replace(":", "/")
+        index = json.load(archive.extractfile("index.json"))
+        manifest = json.load(archive.extractfile(blob(index["manifests"][0]["digest"])))
+        if "manifests" in manifest:
+            # Индекс мультиплатформенного образа: берем первый манифест
+            manifest = json.load(archive.extractfile(blob(manifest["manifests"][0]["digest"])))
+        config = json.load(archive.extractfile(blob(manifest["config"]["digest"])))
+        return [blob(layer["digest"]) for layer in manifest["layers"]], config
+    raise ValueError("Архив не похож на результат docker save: нет manifest.json или index.json")
+
+
+def layer_commands(config: Dict) -> List[str]:
+    """Команды Dockerfile для слоев с содержимым (пустые записи истории пропускаются)"""
+    commands = []
+    for entry in config.get("history", []):
+        if entry.get("empty_layer"):
+            continue
+        command = entry.get("created_by", "")
+        command = re.sub(r"^/bin/sh -c (#\(nop\) )?", "", command).strip()
+        commands.append(command)
+    return commands
+
+
+class ImageFilesystem:
+    """Итоговая файловая система образа с учетом перекрытых и удаленных (whiteout) файлов"""
+
+    def __init__(self, extract_dir: Optional[str] = None, extract_re: Optional[re.Pattern] = None,
+                 hash_min_size: int = 4096):
+        # Путь -> (индекс слоя, размер, sha256 или None)
+        self.files: Dict[str, Tuple[int, int, Optional[str]]] = {}
+        self.shadowed: List[Dict] = []
+        self.layers: List[Dict] = []
+        self.extract_dir = extract_dir
+        self.extract_re = extract_re
+        self.hash_min_size = hash_min_size
+
+    def _remove(self, path: str, layer: int, reason: str, recursive: bool = True):
+        prefix = path + "/"
+        names = [p for p in self.files if p == path or p.startswith(prefix)] if recursive else [path]
+        for name in names:
+            owner, size, _ = self.files.pop(name)
+            if size:
+                self.shadowed.append({"path": name, "size": size, "layer": owner, "by_layer": layer, "reason": reason})
+        if self.extract_dir:
+            target = os.path.join(self.extract_dir, path)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target, ignore_errors=True)
+            elif os.path.lexists(target):
+                os.remove(target)
+
+    def add_layer(self, index: int, layer: tarfile.TarFile, command: str):
+        size = count = 0
+        for member in layer:
+            path = _normalize(member.name)
+            if not path or path == ".":
+                continue
+            directory, base = posixpath.split(path)
+            if base == ".wh..wh..opq":
+                # Непрозрачный каталог: содержимое нижних слоев скрыто
+                for name in [p for p in self.files if p.startswith(directory + "/") and self.files[p][0] < index]:
+                    self._remove(name, index, "whiteout", recursive=False)
+                continue
+            if base.startswith(".wh."):
+                self._remove(posixpath.join(directory, base[4:]), index, "whiteout")
+                continue
+            if member.isdir():
+                continue
+            if path in self.files:
+                self._remove(path, index, "overwritten", recursive=False)
+            digest = None
+            if member.isfile():
+                size += member.size
+                count += 1
+                extract = self.extract_dir and self.extract_re and self.extract_re.match(path)
+                if member.size >= self.hash_min_size or extract:
+                    data = layer.extractfile(member).read()
+                    if member.size >= self.hash_min_size:
+                        digest = hashlib.sha256(data).hexdigest()
+                    if extract:
+                        target = os.path.join(self.extract_dir, path)
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        with open(target, "wb") as f:
+                            f.write(data)
+            self.files[path] = (index, member.size if member.isfile() else 0, digest)
+        self.layers.append({"index": index, "command": command, "size": size, "files": count})
+
+    def duplicates(self, top: int = 20) -> List[Dict]:
+        """Группы файлов с одинаковым содержимым; потери - размер всех копий, кроме одной"""
+        groups: Dict[str, List[str]] = {}
+        for path, (_, size, digest) in self.files.items():
+            if digest:
+                groups.setdefault(digest, []).append(path)
+        result = []
+        for digest, paths in groups.items():
+            if len(paths) > 1:
+                size = self.files[paths[0]][1]
+                result.append({"size": size, "wasted": size * (len(paths) - 1), "paths": sorted(paths)})
+        result.sort(key=lambda g: -g["wasted"])
+        return result[:top]
+
+
+def python_packages(fs: ImageFilesystem) -> Tuple[Dict[str, Dict], Optional[str], Optional[str]]:
+    """
+    Размеры Python-пакетов в site-packages по файлам RECORD из dist-info
+
+    Returns:
+        (дистрибутив -> {size, files, top_level}, каталог site-packages, версия Python образа)
+    """
+    site_dirs: Dict[str, str] = {}
+    for path in fs.files:
+        match = SITE_PACKAGES_RE.match(path)
+        if match:
+            site_dirs[match.group(1)] = match.group(2)
+    if not site_dirs:
+        return {}, None, None
+    # Основной каталог - с наибольшим числом файлов
+    site_dir = max(site_dirs, key=lambda d: sum(1 for p in fs.files if p.startswith(d + "/")))
+    prefix = site_dir + "/"
+
+    packages: Dict[str, Dict] = {}
+    for path in fs.files:
+        if path.startswith(prefix) and path.endswith(".dist-info/RECORD"):
+            dist = path[len(prefix):].split("/")[0]
+            name = re.sub(r"-[^-]+\.dist-info$", "", dist)
+            packages[name] = {"size": 0, "files": 0, "top_level": set(), "record_path": path}
+    return packages, site_dir, site_dirs[site_dir]
+
+
+def assign_package_files(fs: ImageFilesystem, packages: Dict[str, Dict], site_dir: str, records: Dict[str, List[str]]):
+    """Распределение файлов site-packages по дистрибутивам; файлы без RECORD - по имени каталога"""
+    prefix = site_dir + "/"
+    owners: Dict[str, str] = {}
+    for name, paths in records.items():
+        for rel in paths:
+            owners[posixpath.normpath(prefix + rel)] = name
+            top = rel.split("/")[0]
+            if not top.endswith((".dist-info", ".data")) and top != "..":
+                packages[name]["top_level"].add(re.sub(r"\.(py|so|pyd)$|\.cpython.*$", "", top))
+    for path, (_, size, _) in fs.files.items():
+        if not path.startswith(prefix):
+            continue
+        name = owners.get(path)
+        if name is None:
+            name = "(без RECORD) " + path[len(prefix):].split("/")[0]
+            packages.setdefault(name, {"size": 0, "files": 0, "top_level": {path[len(prefix):].split("/")[0]}})
+        packages[name]["size"] += size
+        packages[name]["files"] += 1
+
+
+def read_records(archive: tarfile.TarFile, layer_paths: List[str], wanted: Dict[str, str]) -> Dict[str, List[str]]:
+    """Содержимое файлов RECORD (путь в образе -> дистрибутив) из слоев, которым они принадлежат"""
+    records: Dict[str, List[str]] = {}
+    remaining = dict(wanted)
+    for layer_path in reversed(layer_paths):
+        if not remaining:
+            break
+        with tarfile.open(fileobj=archive.extractfile(layer_path), mode="r|*") as layer:
+            for member in layer:
+                path = _normalize(member.name)
+                if path in remaining and member.isfile():
+                    text = layer.extractfile(member).read().decode("utf-8", "replace")
+                    records[remaining.pop(path)] = [line.split(",")[0] for line in text.splitlines() if line]
+    return records
+
+
+def measure_imports(root: str, site_dir: str, app_dir: str, module: str, image_python: Optional[str]) -> Dict:
+    """
+    Время импорта модулей приложения интерпретатором хоста (python -X importtime)
+
+    Импорт выполняется дважды: первый запуск включает компиляцию .pyc, которых нет в образе
+    (так же платит каждый новый контейнер), по второму считаются времена модулей
+
+    Returns:
+        Словарь: loaded (модуль -> накопленное время, мкс), top_level (пакет верхнего уровня -> мкс),
+        module_self_us (код модуля приложения без импортов), first_run_us, total_us, error
+    """
+    host_python = f"{sys.version_info.major}.{sys.version_info.minor}"
+    if image_python and image_python != host_python:
+        return {"error": f"Python образа {image_python}, хоста {host_python}: замер импорта пропущен"}
+    env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": os.pathsep.join([os.path.join(root, app_dir),
+                                                                            os.path.join(root, site_dir)])}
+    # -S: без site-packages хоста, -I недоступен из-за PYTHONPATH
+    command = [sys.executable, "-S", "-X", "importtime", "-c", f"import {module}"]
+    runs = []
+    for _ in range(2):
+        try:
+            result = subprocess.run(command, cwd=os.path.join(root, app_dir), env=env, capture_output=True,
+                                    text=True, timeout=120)
+        except subprocess.TimeoutExpired:
+            return {"error": "Импорт приложения не завершился за 120 с"}
+        own: Dict[str, int] = {}
+        loaded: Dict[str, int] = {}
+        for line in result.stderr.splitlines():
+            match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+            if match:
+                own[match.group(4)] = int(match.group(1))
+                loaded[match.group(4)] = int(match.group(2))
+        runs.append(loaded)
+    top_level: Dict[str, int] = {}
+    for name, cumulative in loaded.items():
+        if "." not in name:
+            top_level[name] = top_level.get(name, 0) + cumulative
+    report = {
+        "loaded": loaded,
+        "top_level": dict(sorted(top_level.items(), key=lambda item: -item[1])),
+        "module_self_us": own.get(module),
+        "first_run_us": runs[0].get(module),
+        "total_us": loaded.get(module, sum(top_level.values())),
+    }
+    if result.returncode != 0:
+        report["error"] = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+    return report
+
+
+def unused_files(fs: ImageFilesystem, packages: Dict[str, Dict], site_dir: str, imported: Optional[set]) -> Dict:
+    """Неиспользуемые приложением пакеты и каталоги тестов/документации внутри site-packages"""
+    unused_packages = {}
+    if imported is not None:
+        for name, info in packages.items():
+            if info["top_level"] and not (info["top_level"] & imported):
+                unused_packages[name] = info["size"]
+    extra_dirs: Dict[str, int] = {}
+    prefix = site_dir + "/"
+    for path, (_, size, _) in fs.files.items():
+        if not path.startswith(prefix):
+            continue
+        parts = path[len(prefix):].split("/")
+        for i, part in enumerate(parts[:-1]):
+            if part in UNUSED_DIR_NAMES or part == "__pycache__":
+                key = "/".join(parts[:i + 1])
+                extra_dirs[key] = extra_dirs.get(key, 0) + size
+                break
+    return {
+        "packages": dict(sorted(unused_packages.items(), key=lambda item: -item[1])),
+        "packages_size": sum(unused_packages.values()),
+        "test_doc_cache_dirs": dict(sorted(extra_dirs.items(), key=lambda item: -item[1])[:30]),
+        "test_doc_cache_size": sum(extra_dirs.values()),
+    }
+
+
+def analyze(path: str, app_dir: str = "app", module: str = "app", measure: bool = True,
+            hash_min_size: int = 4096) -> Dict:
+    """Полный анализ архива docker save"""
+    app_dir = app_dir.strip("/")
+    workdir = tempfile.mkdtemp(prefix="image-analyze-") if measure else None
+    try:
+        with tarfile.open(path, "r:*") as archive:
+            layer_paths, config = read_image_layout(archive)
+            commands = layer_commands(config)
+            extract_re = re.compile(rf"^({SITE_PACKAGES_RE.pattern[1:-1]}|{re.escape(app_dir)})/") if measure else None
+            fs = ImageFilesystem(workdir, extract_re, hash_min_size)
+            for index, layer_path in enumerate(layer_paths):
+                command = commands[index] if index < len(commands) else ""
+                with tarfile.open(fileobj=archive.extractfile(layer_path), mode="r|*") as layer:
+                    fs.add_layer(index, layer, command)
+            packages, site_dir, image_python = python_packages(fs)
+            records = read_records(archive, layer_paths,
+                                   {info["record_path"]: name for name, info in packages.items() if "record_path" in info})
+        for info in packages.values():
+            info.pop("record_path", None)
+        if site_dir:
+            assign_package_files(fs, packages, site_dir, records)
+
+        imports = None
+        if measure and site_dir:
+            imports = measure_imports(workdir, site_dir, app_dir, module, image_python)
+        imported = set(imports["top_level"]) if imports and "top_level" in imports else None
+        unused = unused_files(fs, packages, site_dir, imported) if site_dir else {}
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    total = sum(size for _, size, _ in fs.files.values())
+    return {
+        "image": os.path.basename(path),
+        "python": image_python,
+        "site_packages": site_dir,
+        "filesystem_size": total,
+        "layers": fs.layers,
+        "packages": {name: {"size": info["size"], "files": info["files"], "top_level": sorted(info["top_level"])}
+                     for name, info in sorted(packages.items(), key=lambda item: -item[1]["size"])},
+        "shadowed_size": sum(item["size"] for item in fs.shadowed),
+        "shadowed": sorted(fs.shadowed, key=lambda item: -item["size"])[:30],
+        "duplicates": fs.duplicates(),
+        "unused": unused,
+        "imports": imports,
+    }
+
+
+def format_report(report: Dict, top: int = 15) -> str:
+    lines = [f"# Образ {report['image']}", "",
+             f"Итоговая файловая система: {format_size(report['filesystem_size'])}, "
+             f"перекрыто или удалено в верхних слоях: {format_size(report['shadowed_size'])}", "",
+             "| Слой | Размер | Файлов | Команда |", "|-----:|-------:|-------:|---------|"]
+    for layer in report["layers"]:
+        command = layer["command"].replace("|", "\\|")
+        lines.append(f"| {layer['index']} | {format_size(layer['size'])} | {layer['files']} | `{command[:100]}` |")
+
+    if report["packages"]:
+        imports = report.get("imports") or {}
+        top_level_time = imports.get("top_level", {})
+        lines += ["", f"## Python-пакеты ({report['site_packages']})", "",
+                  "| Пакет | Размер | Файлов | Импорт приложением, мс |", "|-------|-------:|-------:|-----------------------:|"]
+        for name, info in list(report["packages"].items())[:top]:
+            cost = sum(top_level_time.get(m, 0) for m in info["top_level"])
+            used = f"{cost / 1000:.1f}" if cost else ("не загружается" if top_level_time else "-")
+            lines.append(f"| {name} | {format_size(info['size'])} | {info['files']} | {used} |")
+
+    unused = report.get("unused") or {}
+    if unused.get("packages"):
+        lines += ["", f"## Пакеты, не загружаемые приложением: {format_size(unused['packages_size'])}", ""]
+        lines += [f"- {name}: {format_size(size)}" for name, size in list(unused["packages"].items())[:top]]
+    if unused.get("test_doc_cache_size"):
+        lines += ["", f"Тесты, документация и __pycache__ в site-packages: {format_size(unused['test_doc_cache_size'])}"]
+
+    if report["duplicates"]:
+        wasted = sum(group["wasted"] for group in report["duplicates"])
+        lines += ["", f"## Дубликаты (топ {len(report['duplicates'])}, лишние копии {format_size(wasted)})", ""]
+        for group in report["duplicates"][:10]:
+            lines.append(f"- {format_size(group['size'])} x{len(group['paths'])}: {', '.join(group['paths'][:3])}")
+    if report["shadowed"]:
+        lines += ["", "## Перекрытые и удаленные файлы (топ)", ""]
+        for item in report["shadowed"][:10]:
+            lines.append(f"- {item['path']}: {format_size(item['size'])} (слой {item['layer']} -> {item['by_layer']}, {item['reason']})")
+
+    imports = report.get("imports")
+    if imports:
+        lines += ["", "## Время импорта приложения", ""]
+        if imports.get("error"):
+            lines.append(f"Ошибка: {imports['error']}")
+        if imports.get("top_level"):
+            lines.append(f"Всего: {imports['total_us'] / 1000:.1f} мс (первый запуск с компиляцией .pyc: "
+                         f"{(imports['first_run_us'] or 0) / 1000:.1f} мс), из них код модуля "
+                         f"{imports.get('module_self_us', 0) / 1000:.1f} мс")
+            lines += [f"- {name}: {us / 1000:.1f} мс" for name, us in list(imports["top_level"].items())[:top]]
+    return "\n".join(lines)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Анализ слоев, пакетов и стоимости импорта Docker образа по docker save")
+    parser.add_argument("archive", help="Архив docker save (.tar или .tar.gz)")
+    parser.add_argument("--app-dir", default="/app", help="Каталог приложения в образе")
+    parser.add_argument("--module", default="app", help="Модуль приложения для замера импорта")
+    parser.add_argument("--no-imports", action="store_true", help="Не измерять время импорта")
+    parser.add_argument("--hash-min-size", type=int, default=4096, help="Минимальный размер файла для поиска дубликатов")
+    parser.add_argument("--output", default=None, help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    report = analyze(args.archive, args.app_dir, args.module, not args.no_imports, args.hash_min_size)
+    text = format_report(report)
+    print(text)
+    if args.output:
+        with open(f"{args.output}.json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        with open(f"{args.output}.md", "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"\nОтчет сохранен в {args.output}.json и {args.output}.md")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
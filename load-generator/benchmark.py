@@ -0,0 +1,252 @@
+"""
+Бенчмарк настроек Kafka producer
+Прогоняет матрицу конфигураций (linger_ms, batch_size, compression_type, acks, сериализатор)
+фиксированное время каждую и сохраняет сравнительный отчет (JSON + таблица)
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from kafka import KafkaProducer
+from kafka.errors import KafkaError
+
+from keys import KeyDistribution, key_distribution_from_env
+from rate_control import InFlightTracker
+from sketch import QuantileSketch
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Компактный бинарный формат транзакции: user_id (uint32), amount в центах (uint32), timestamp в мс (uint64)
+BINARY_TRANSACTION = struct.Struct('<IIQ')
+
+
+def serialize_json(transaction: Dict) -> bytes:
+    return json.dumps(transaction).encode('utf-8')
+
+
+def serialize_binary(transaction: Dict) -> bytes:
+    # Время в мс получается из того же поля timestamp, что и в JSON, чтобы сообщения несли одинаковые данные
+    timestamp_ms = int(datetime.fromisoformat(transaction['timestamp']).timestamp() * 1000)
+    return BINARY_TRANSACTION.pack(
+        transaction['user_id'],
+        int(round(transaction['amount'] * 100)),
+        timestamp_ms
+    )
+
+
+SERIALIZERS = {
+    'json': serialize_json,
+    'binary': serialize_binary,
+}
+
+DEFAULT_MATRIX = {
+    'linger_ms': [0, 5, 20],
+    'batch_size': [16384, 131072],
+    'compression_type': ['none', 'gzip', 'lz4'],
+    'acks': ['all', 1],
+    'serializer': ['json', 'binary'],
+}
+
+
+def build_transaction(user_id: int) -> Dict:
+    """Транзакция в формате генератора (LoadGenerator.generate_transaction)"""
+    return {
+        "user_id": user_id,
+        "amount": round(random.uniform(1, 1000), 2),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+def expand_matrix(matrix: Dict[str, List]) -> List[Dict]:
+    """Декартово произведение значений параметров матрицы"""
+    names = list(matrix)
+    return [dict(zip(names, values)) for values in itertools.product(*(matrix[n] for n in names))]
+
+
+def _find_metric(metrics: Dict, name: str) -> Optional[float]:
+    """Поиск метрики клиента Kafka по имени во всех группах"""
+    for group in metrics.values():
+        value = group.get(name)
+        if isinstance(value, (int, float)) and value == value:
+            return float(value)
+    return None
+
+
+def run_config(config: Dict, bootstrap_servers: List[str], topic: str,
+               duration_seconds: float, max_in_flight: int, keyed_sends: bool = False,
+               key_distribution: Optional[KeyDistribution] = None) -> Dict:
+    """
+    Прогон одной конфигурации producer с максимальной скоростью в течение duration_seconds
+
+    Ключи сообщений выбираются как в генераторе: user_id из key_distribution (по умолчанию
+    последовательные) и ключ user_id при keyed_sends, поэтому батчи и партиции совпадают с реальной нагрузкой
+
+    Returns:
+        Результат: пропускная способность, перцентили задержки подтверждения, объем данных
+    """
+    serializer = SERIALIZERS[config['serializer']]
+    compression = None if config['compression_type'] == 'none' else config['compression_type']
+    result = {'config': config}
+    try:
+        producer = KafkaProducer(
+            bootstrap_servers=bootstrap_servers,
+            acks=config['acks'],
+            linger_ms=config['linger_ms'],
+            batch_size=config['batch_size'],
+            compression_type=compression,
+            key_serializer=lambda k: str(k).encode('utf-8'),
+            retries=5,
+            request_timeout_ms=30000
+        )
+    except Exception as e:
+        # Например, кодек сжатия без установленной библиотеки
+        logger.warning(f"Skipping {config}: {e}")
+        result['error'] = str(e)
+        return result
+
+    in_flight = InFlightTracker(max_in_flight=max_in_flight)
+    ack_latency = QuantileSketch()
+    lock = threading.Lock()
+    counters = {'acked': 0, 'errors': 0}
+
+    def on_success(sent_at, _metadata):
+        latency_ms = (time.perf_counter() - sent_at) * 1000
+        with lock:
+            ack_latency.add(latency_ms)
+            counters['acked'] += 1
+        in_flight.release()
+
+    def on_error(_exception):
+        with lock:
+            counters['errors'] += 1
+        in_flight.release(error=True)
+
+    sent = 0
+    payload_bytes = 0
+    user_id = 1
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < duration_seconds:
+            if not in_flight.acquire():
+                continue
+            if key_distribution:
+                user_id = key_distribution.next_key()
+            payload = serializer(build_transaction(user_id))
+            try:
+                future = producer.send(topic, payload, key=user_id if keyed_sends else None)
+            except KafkaError:
+                in_flight.release(error=True)
+                with lock:
+                    counters['errors'] += 1
+                continue
+            future.add_callback(on_success, time.perf_counter())
+            future.add_errback(on_error)
+            sent += 1
+            payload_bytes += len(payload)
+            user_id += 1
+        producer.flush()
+        elapsed = time.perf_counter() - start
+        client_metrics = producer.metrics()
+    finally:
+        producer.close()
+
+    # Степень сжатия (сжатый/исходный размер батчей) по метрикам клиента
+    compression_rate = _find_metric(client_metrics, 'compression-rate-avg') or 1.0
+    result.update({
+        'duration_seconds': round(elapsed, 3),
+        'sent': sent,
+        'acked': counters['acked'],
+        'errors': counters['errors'],
+        'throughput_per_sec': round(counters['acked'] / elapsed, 1),
+        'payload_bytes': payload_bytes,
+        'avg_payload_bytes': round(payload_bytes / sent, 1) if sent else 0,
+        'wire_bytes_estimate': int(payload_bytes * compression_rate),
+        'compression_rate': round(compression_rate, 3),
+        'outgoing_byte_rate': _find_metric(client_metrics, 'outgoing-byte-rate'),
+        'ack_latency_ms': {
+            'p50': ack_latency.quantile(0.50),
+            'p95': ack_latency.quantile(0.95),
+            'p99': ack_latency.quantile(0.99),
+        },
+    })
+    logger.info(f"{config}: {result['throughput_per_sec']:.0f} msg/s, "
+                f"p99 ack={result['ack_latency_ms']['p99']}ms, {result['wire_bytes_estimate']} bytes on wire")
+    return result
+
+
+def format_table(results: List[Dict]) -> str:
+    """Таблица сравнения конфигураций, отсортированная по пропускной способности"""
+    header = (f"| {'linger_ms':>9} | {'batch_size':>10} | {'compression':<11} | {'acks':<4} | {'serializer':<10} "
+              f"| {'msg/s':>9} | {'p50 ms':>7} | {'p99 ms':>7} | {'B/msg wire':>10} |")
+    lines = [header, '|' + '|'.join('-' * (len(c)) for c in header.split('|')[1:-1]) + '|']
+    ok = [r for r in results if 'error' not in r]
+    for r in sorted(ok, key=lambda r: r['throughput_per_sec'], reverse=True):
+        c = r['config']
+        latency = r['ack_latency_ms']
+        wire_per_msg = r['wire_bytes_estimate'] / r['sent'] if r['sent'] else 0
+        lines.append(
+            f"| {c['linger_ms']:>9} | {c['batch_size']:>10} | {c['compression_type']:<11} | {str(c['acks']):<4} "
+            f"| {c['serializer']:<10} | {r['throughput_per_sec']:>9.0f} | {latency['p50'] or 0:>7.1f} "
+            f"| {latency['p99'] or 0:>7.1f} | {wire_per_msg:>10.1f} |"
+        )
+    for r in results:
+        if 'error' in r:
+            lines.append(f"| пропущено: {r['config']} - {r['error']}")
+    return '\n'.join(lines)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк настроек Kafka producer")
+    parser.add_argument("--matrix", help="JSON-файл с матрицей параметров (по умолчанию встроенная матрица)")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность прогона одной конфигурации в секундах")
+    parser.add_argument("--topic", default=os.getenv('BENCHMARK_TOPIC', 'producer-benchmark'), help="Топик для бенчмарка")
+    parser.add_argument("--max-in-flight", type=int, default=50000, help="Максимум неподтвержденных сообщений")
+    parser.add_argument("--keyed-sends", choices=['true', 'false'], default=os.getenv('KEYED_SENDS', 'false').lower(),
+                        help="Отправка с ключом user_id, как в генераторе (по умолчанию KEYED_SENDS); "
+                             "распределение ключей - KEY_DISTRIBUTION")
+    parser.add_argument("--output", default="producer_benchmark", help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    matrix = DEFAULT_MATRIX
+    if args.matrix:
+        with open(args.matrix) as f:
+            matrix = json.load(f)
+    configs = expand_matrix(matrix)
+    bootstrap_servers = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:19092').split(',')
+    logger.info(f"Running {len(configs)} producer configurations, {args.duration}s each")
+
+    keyed_sends = args.keyed_sends == 'true'
+    # Для каждой конфигурации свое распределение ключей: при KEY_SEED последовательности ключей совпадают
+    results = [run_config(c, bootstrap_servers, args.topic, args.duration, args.max_in_flight,
+                          keyed_sends, key_distribution_from_env()) for c in configs]
+    table = format_table(results)
+    print(table)
+
+    with open(f"{args.output}.json", "w") as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "duration_seconds": args.duration,
+            "topic": args.topic,
+            "keyed_sends": keyed_sends,
+            "key_distribution": os.getenv('KEY_DISTRIBUTION', 'sequential'),
+            "results": results,
+        }, f, indent=2)
+    with open(f"{args.output}.md", "w") as f:
+        f.write(table + "\n")
+    print(f"\nРезультаты сохранены в {args.output}.json и {args.output}.md")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Координация нескольких экземпляров генератора нагрузки через Redis
+Экземпляры регистрируются в общем хранилище, делят глобальную скорость и пространство ключей
+и публикуют итоговые результаты, которые объединяются в общий отчет
+"""
+import json
+import os
+import socket
+import time
+import uuid
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+
+class GeneratorCoordinator:
+    """Регистрация экземпляра генератора и расчет его доли общей нагрузки"""
+
+    def __init__(self, redis_client: redis.Redis, run_id: str = 'default',
+                 instance_id: Optional[str] = None, heartbeat_ttl: float = 15.0,
+                 results_ttl: float = 86400.0):
+        self.redis_client = redis_client
+        self.run_id = run_id
+        self.instance_id = instance_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        # Экземпляр без heartbeat дольше heartbeat_ttl секунд считается ушедшим
+        self.heartbeat_ttl = heartbeat_ttl
+        # Результаты и отчет запуска хранятся results_ttl секунд после последней публикации
+        self.results_ttl = int(results_ttl)
+        self.instances_key = f"loadgen:{run_id}:instances"
+        self.results_key = f"loadgen:{run_id}:results"
+        self.report_key = f"loadgen:{run_id}:report"
+        # Последний выданный ключ каждого экземпляра: от максимума отсчитывается новая раскладка ключей
+        self.keys_key = f"loadgen:{run_id}:last_keys"
+        self.index = 0
+        self.instance_count = 1
+        self.last_key = 0
+        self._key_base = 0
+        self._base_sequence = 0
+        self._rebase_pending = False
+
+    def register(self) -> Tuple[int, int]:
+        """Регистрация экземпляра, возвращает (индекс, количество экземпляров)"""
+        logger.info(f"Registering load generator instance {self.instance_id} in run '{self.run_id}'")
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.zremrangebyscore(self.instances_key, '-inf', now - self.heartbeat_ttl)
+        pipe.zadd(self.instances_key, {self.instance_id: now})
+        pipe.zcard(self.instances_key)
+        _, _, active = pipe.execute()
+        if active == 1:
+            # Первый экземпляр нового прогона: результаты прошлых прогонов с тем же run_id не объединяются
+            self.redis_client.delete(self.results_key, self.report_key, self.keys_key)
+            logger.info(f"New run '{self.run_id}': previous results cleared")
+        return self.heartbeat()
+
+    def heartbeat(self) -> Tuple[int, int]:
+        """
+        Обновление heartbeat и пересчет доли экземпляра
+
+        Returns:
+            (индекс экземпляра, количество активных экземпляров)
+        """
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.zadd(self.instances_key, {self.instance_id: now})
+        pipe.zremrangebyscore(self.instances_key, '-inf', now - self.heartbeat_ttl)
+        pipe.zrange(self.instances_key, 0, -1)
+        pipe.hset(self.keys_key, self.instance_id, self.last_key)
+        pipe.expire(self.keys_key, self.results_ttl)
+        pipe.hvals(self.keys_key)
+        _, _, members, _, _, last_keys = pipe.execute()
+
+        instances = sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+        index = instances.index(self.instance_id) if self.instance_id in instances else 0
+        count = max(1, len(instances))
+        if (index, count) != (self.index, self.instance_count):
+            # Новая раскладка начинается выше всех опубликованных ключей и кратна count,
+            # чтобы ключи с разными index не пересекались и с ключами прежней раскладки
+            high = max([int(k) for k in last_keys] + [self.last_key])
+            self._key_base = -(-high // count) * count
+            self._rebase_pending = True
+            logger.info(f"Rebalanced: instance {index + 1}/{count} ({self.instance_id}), keys from {self._key_base + 1}")
+        self.index, self.instance_count = index, count
+        return index, count
+
+    def rate_share(self, global_rate: float) -> float:
+        """Доля глобальной целевой скорости для этого экземпляра"""
+        return global_rate / self.instance_count
+
+    def key_for(self, sequence: int) -> int:
+        """
+        Ключ (user_id) из пространства ключей экземпляра: ключи с остатком index по модулю instance_count
+
+        После перебалансировки номер последовательности отсчитывается заново от базы новой раскладки.
+        Прочие экземпляры узнают о смене состава только на своем heartbeat, поэтому ключи, выданные
+        ими по старой раскладке в этом интервале (до одного heartbeat), могут совпасть с новыми
+        """
+        if self._rebase_pending:
+            self._base_sequence = sequence
+            self._rebase_pending = False
+        self.last_key = self._key_base + (sequence - self._base_sequence) * self.instance_count + self.index + 1
+        return self.last_key
+
+    def deregister(self):
+        """Удаление экземпляра из списка активных (остальные перебалансируются)"""
+        try:
+            self.redis_client.zrem(self.instances_key, self.instance_id)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to deregister instance {self.instance_id}: {e}")
+
+    def publish_results(self, results: Dict):
+        """Публикация итоговых результатов экземпляра"""
+        pipe = self.redis_client.pipeline()
+        pipe.hset(self.results_key, self.instance_id, json.dumps(results))
+        pipe.expire(self.results_key, self.results_ttl)
+        pipe.execute()
+        logger.info(f"Published results of instance {self.instance_id}")
+
+    def collect_results(self) -> List[Dict]:
+        """Результаты всех экземпляров запуска"""
+        raw = self.redis_client.hgetall(self.results_key)
+        return [json.loads(v) for v in raw.values()]
+
+    def publish_merged_report(self) -> Dict:
+        """Объединение результатов всех экземпляров и сохранение общего отчета"""
+        report = merge_results(self.collect_results())
+        report['run_id'] = self.run_id
+        self.redis_client.set(self.report_key, json.dumps(report), ex=self.results_ttl)
+        return report
+
+
+def merge_results(results: List[Dict]) -> Dict:
+    """
+    Объединение результатов нескольких экземпляров
+
+    Каждый результат содержит счетчики, интервал работы и сериализованный скетч latency
+    """
+    if not results:
+        return {'instances': 0}
+
+    latency = None
+    for result in results:
+        sketch = QuantileSketch.from_dict(result['latency_sketch'])
+        if latency is None:
+            latency = sketch
+        else:
+            latency.merge(sketch)
+
+    started_at = min(r['started_at'] for r in results)
+    finished_at = max(r['finished_at'] for r in results)
+    duration = max(finished_at - started_at, 1e-9)
+    transactions_sent = sum(r['transactions_sent'] for r in results)
+
+    return {
+        'instances': len(results),
+        'instance_ids': sorted(r['instance_id'] for r in results),
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'duration_seconds': round(duration, 3),
+        'transactions_sent': transactions_sent,
+        'failed_requests': sum(r['failed_requests'] for r in results),
+        'achieved_rate': round(transactions_sent / duration, 2),
+        'latency_ms': {
+            'p50': latency.quantile(0.50),
+            'p95': latency.quantile(0.95),
+            'p99': latency.quantile(0.99),
+            'avg': latency.mean,
+        },
+    }
+
+
+def coordinator_from_env() -> Optional[GeneratorCoordinator]:
+    """Создание координатора, если включен режим координации (LOADGEN_COORDINATION=true)"""
+    if os.getenv('LOADGEN_COORDINATION', 'false').lower() != 'true':
+        return None
+    redis_client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        socket_connect_timeout=5
+    )
+    redis_client.ping()
+    return GeneratorCoordinator(
+        redis_client,
+        run_id=os.getenv('LOADGEN_RUN_ID', 'default'),
+        instance_id=os.getenv('LOADGEN_INSTANCE_ID') or None,
+        heartbeat_ttl=float(os.getenv('LOADGEN_HEARTBEAT_TTL', 15)),
+        results_ttl=float(os.getenv('LOADGEN_RESULTS_TTL', 86400))
+    )
@@ -7,12 +7,23 @@ import time
 import random
 import logging
 import os
-import numpy as np
+import platform
+import sys
+import threading
 from datetime import datetime
+import redis
 from kafka import KafkaProducer
-from kafka.errors import KafkaError
 from prometheus_client import push_to_gateway, CollectorRegistry, Gauge, Histogram, Counter
-from collections import deque
+from coordination import GeneratorCoordinator, coordinator_from_env
+from keys import KeyDistribution, key_distribution_from_env
+# В образе late_data.py скопирован рядом (Dockerfile), при запуске из репозитория берется из monitoring/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'monitoring'))
+from late_data import LatenessRecorder
+from probe import ProbeTagger
+from rate_control import AdaptiveRateController, InFlightTracker
+from profiles import ConstantProfile, LoadProfile, load_profile
+from run_recorder import RunRecorder
+from sketch import QuantileSketch
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,22 +35,66 @@ LATENCY_P50 = Gauge('load_generator_latency_p50_ms', 'P50 latency in millisecond
 LATENCY_P95 = Gauge('load_generator_latency_p95_ms', 'P95 latency in milliseconds', registry=registry)
 LATENCY_P99 = Gauge('load_generator_latency_p99_ms', 'P99 latency in milliseconds', registry=registry)
 LATENCY_AVG = Gauge('load_generator_latency_avg_ms', 'Average latency in milliseconds', registry=registry)
+LATENCY_CUMULATIVE = Gauge('load_generator_latency_cumulative_ms', 'Latency quantiles since generator start in milliseconds', ['quantile'], registry=registry)
 REQUEST_COUNTER = Counter('load_generator_requests_total', 'Total number of requests', ['status'], registry=registry)
 REQUEST_LATENCY = Histogram('load_generator_request_latency_seconds', 'Request latency in seconds', registry=registry)
 TRANSACTIONS_SENT = Counter('load_generator_transactions_sent_total', 'Total transactions sent to Kafka', registry=registry)
+TARGET_RATE = Gauge('load_generator_target_rate', 'Target rate from load profile (events/sec)', registry=registry)
+PARTITION_SENDS = Counter('load_generator_partition_sends_total', 'Transactions acknowledged per Kafka partition', ['partition'], registry=registry)
+IN_FLIGHT = Gauge('load_generator_in_flight', 'Sent but not yet acknowledged transactions', registry=registry)
+ACK_LATENCY = Histogram(
+    'load_generator_ack_latency_seconds',
+    'Kafka acknowledgement latency in seconds',
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    registry=registry
+)
+THROTTLE_EVENTS = Counter('load_generator_throttle_events_total', 'Adaptive rate decreases', registry=registry)
+ALLOWED_RATE = Gauge('load_generator_allowed_rate', 'Rate allowed by adaptive controller (events/sec)', registry=registry)
+INSTANCES = Gauge('load_generator_instances', 'Number of coordinated load generator instances', registry=registry)
+ACHIEVED_RATE = Gauge('load_generator_achieved_rate', 'Achieved send rate over the last second (events/sec)', registry=registry)
+
+
+def _parse_acks(value):
+    """acks из переменной окружения: 'all' или число (0, 1)"""
+    return value if value == 'all' else int(value)
+
+
+def lateness_recorder_from_env(source: str):
+    """
+    Учет задержки между временем события и подтверждением Kafka в счетчиках late data
+    (monitoring/late_data.py), если включен LATENESS_RECORDING=true
+    """
+    if os.getenv('LATENESS_RECORDING', 'false').lower() != 'true':
+        return None
+    redis_client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        socket_connect_timeout=5
+    )
+    return LatenessRecorder(
+        redis_client,
+        source=source,
+        allowed_lateness=float(os.getenv('ALLOWED_LATENESS_SECONDS', 5))
+    )
 
 
 class LoadGenerator:
     """Генератор нагрузки для тестирования системы"""
     
-    def __init__(self):
+    def __init__(self, coordinator: GeneratorCoordinator = None,
+                 key_distribution: KeyDistribution = None):
         self._wait_for_kafka()
         self.producer = KafkaProducer(
             bootstrap_servers=[os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:19092')],
             value_serializer=lambda x: json.dumps(x).encode('utf-8'),
+            key_serializer=lambda k: str(k).encode('utf-8'),
             retries=5,
             request_timeout_ms=30000,
-            acks='all'  # Гарантия доставки
+            # Настройки producer (подбираются бенчмарком benchmark.py)
+            acks=_parse_acks(os.getenv('PRODUCER_ACKS', 'all')),  # Гарантия доставки
+            linger_ms=int(os.getenv('PRODUCER_LINGER_MS', 0)),
+            batch_size=int(os.getenv('PRODUCER_BATCH_SIZE', 16384)),
+            compression_type=os.getenv('PRODUCER_COMPRESSION') or None
         )
         logger.info("Kafka producer initialized")
         
@@ -48,8 +103,51 @@ class LoadGenerator:
         self.prometheus_gateway = os.getenv('PROMETHEUS_GATEWAY', 'pushgateway:9091')
         self.kafka_topic = os.getenv('KAFKA_TOPIC', 'transactions')
         
-        # Буфер для метрик latency (последние 1000 запросов)
-        self.latency_buffer = deque(maxlen=1000)
+        # Координатор для режима нескольких экземпляров (None = автономный режим)
+        self.coordinator = coordinator
+        
+        # Распределение ключей (None = последовательные user_id) и отправка с ключом user_id
+        # (по умолчанию без ключа, как раньше: ключ меняет распределение сообщений по партициям)
+        self.key_distribution = key_distribution
+        self.keyed_sends = os.getenv('KEYED_SENDS', 'false').lower() == 'true'
+        
+        # Ограничение неподтвержденных отправок и адаптивная скорость (ADAPTIVE_RATE=true)
+        self.in_flight = InFlightTracker(max_in_flight=int(os.getenv('MAX_IN_FLIGHT', 10000)))
+        self.backpressure_events = 0
+        self.rate_controller = None
+        if os.getenv('ADAPTIVE_RATE', 'false').lower() == 'true':
+            self.rate_controller = AdaptiveRateController(
+                ack_latency_threshold_ms=float(os.getenv('ADAPTIVE_ACK_LATENCY_MS', 500)),
+                decrease_factor=float(os.getenv('ADAPTIVE_DECREASE_FACTOR', 0.7)),
+                increase_step=float(os.getenv('ADAPTIVE_INCREASE_STEP', 100))
+            )
+        
+        # Зонд end-to-end latency: доля сообщений с временем отправки и порядковым номером
+        probe_sample_rate = float(os.getenv('PROBE_SAMPLE_RATE', 0))
+        self.probe = None
+        if probe_sample_rate > 0:
+            source_id = coordinator.instance_id if coordinator else os.getenv('HOSTNAME', 'generator')
+            self.probe = ProbeTagger(probe_sample_rate, source_id=source_id)
+            self.probe.set_partitions(self.producer.partitions_for(self.kafka_topic))
+            logger.info(f"E2E probe enabled: sample rate {probe_sample_rate}, partitions {self.probe.partitions}")
+        
+        # Задержка событий до подтверждения Kafka для мониторинга late data: callback'и producer
+        # складывают пары (время события, время подтверждения), цикл генерации раз в секунду
+        # передает их в LatenessRecorder
+        self.lateness = lateness_recorder_from_env(
+            f"loadgen-{coordinator.instance_id if coordinator else os.getenv('HOSTNAME', 'generator')}")
+        self._lateness_lock = threading.Lock()
+        self._lateness_events = []
+        self._lateness_acked = []
+        
+        # Квантильные скетчи latency: окно между отправками метрик и накопительный с момента старта
+        self.latency_window = QuantileSketch()
+        self.latency_total = QuantileSketch()
+        # Задержка подтверждений Kafka за весь прогон (пишется только из потока callback'ов producer)
+        self.ack_latency_total = QuantileSketch()
+        
+        # Запись результатов прогона в файл (RUN_RECORD_PATH), создается при старте генерации
+        self.recorder: RunRecorder = None
         
         # Счетчики для метрик
         self.total_requests = 0
@@ -89,44 +187,119 @@ class LoadGenerator:
         }
         return transaction
     
-    def send_to_kafka(self, transaction):
-        """Отправка транзакции в Kafka"""
+    def send_to_kafka(self, transaction, partition=None, acquire_timeout=1.0):
+        """
+        Отправка транзакции в Kafka
+        
+        Args:
+            acquire_timeout: Сколько секунд ждать свободного слота in-flight (0 - не ждать)
+        """
+        # Время события: ожидание слота in-flight входит в задержку до подтверждения
+        event_time = time.time()
+        # Не больше MAX_IN_FLIGHT неподтвержденных сообщений: иначе ждем освобождения слота
+        if not self.in_flight.acquire(timeout=acquire_timeout):
+            self.backpressure_events += 1
+            self.failed_requests += 1
+            REQUEST_COUNTER.labels(status='backpressure').inc()
+            if self.recorder:
+                self.recorder.record_error('backpressure')
+            return False
+        
         try:
-            future = self.producer.send(self.kafka_topic, transaction)
-            # Не ждем подтверждения для производительности
+            key = transaction['user_id'] if self.keyed_sends else None
+            sent_at = time.perf_counter()
+            future = self.producer.send(self.kafka_topic, transaction, key=key, partition=partition)
+            # Не ждем подтверждения для производительности, результат учитываем в callback
+            future.add_callback(self._on_send_success, sent_at, event_time)
+            future.add_errback(self._on_send_error)
             self.transactions_sent += 1
             TRANSACTIONS_SENT.inc()
             return True
-        except KafkaError as e:
+        except Exception as e:
+            # KafkaError, ошибка сериализации или неверная явная партиция: слот освобождается в любом случае
+            self.in_flight.release(error=True)
             logger.error(f"Failed to send transaction to Kafka: {e}")
             self.failed_requests += 1
             REQUEST_COUNTER.labels(status='error').inc()
+            if self.recorder:
+                self.recorder.record_error('send', f"{type(e).__name__}: {e}")
             return False
     
+    def _on_send_success(self, sent_at, event_time, record_metadata):
+        """Учет подтвержденной отправки: задержка подтверждения и партиция"""
+        ack_latency = time.perf_counter() - sent_at
+        if self.lateness:
+            with self._lateness_lock:
+                self._lateness_events.append(event_time)
+                self._lateness_acked.append(time.time())
+        self.in_flight.release(ack_latency_ms=ack_latency * 1000)
+        self.successful_requests += 1
+        self.ack_latency_total.add(ack_latency * 1000)
+        if self.recorder:
+            self.recorder.record_ack(ack_latency * 1000)
+        REQUEST_COUNTER.labels(status='success').inc()
+        ACK_LATENCY.observe(ack_latency)
+        PARTITION_SENDS.labels(partition=str(record_metadata.partition)).inc()
+    
+    def _on_send_error(self, exception):
+        """Учет отправки, завершившейся ошибкой брокера"""
+        self.in_flight.release(error=True)
+        self.failed_requests += 1
+        REQUEST_COUNTER.labels(status='error').inc()
+        if self.recorder:
+            self.recorder.record_error('delivery', f"{type(exception).__name__}: {exception}")
+        logger.error(f"Failed to deliver transaction to Kafka: {exception}")
+    
+    def _record_lateness(self, flush=False):
+        """Передача накопленных задержек подтверждения в LatenessRecorder (пишет в Redis пачками)"""
+        with self._lateness_lock:
+            events, self._lateness_events = self._lateness_events, []
+            acked, self._lateness_acked = self._lateness_acked, []
+        if events:
+            self.lateness.record_batch(events, acked)
+        if flush:
+            self.lateness.flush()
+    
+    def _record_latency(self, latency_ms):
+        """Учет измерения latency в оконном и накопительном скетчах"""
+        self.latency_window.add(latency_ms)
+        self.latency_total.add(latency_ms)
+        REQUEST_LATENCY.observe(latency_ms / 1000.0)
+        if self.recorder:
+            self.recorder.record_batch_latency(latency_ms)
+    
+    def export_latency_sketch(self) -> str:
+        """Сериализованный накопительный скетч latency (для объединения между экземплярами)"""
+        return self.latency_total.to_json()
+    
     def _push_metrics_to_prometheus(self):
         """Расчет и отправка метрик в Prometheus через pushgateway"""
-        if len(self.latency_buffer) == 0:
+        if self.latency_window.count == 0:
             return
         
         try:
-            # Расчет перцентилей
-            latencies = np.array(list(self.latency_buffer))
-            p50 = np.percentile(latencies, 50)
-            p95 = np.percentile(latencies, 95)
-            p99 = np.percentile(latencies, 99)
-            avg_latency = np.mean(latencies)
+            # Перцентили за окно с момента предыдущей отправки
+            p50 = self.latency_window.quantile(0.50)
+            p95 = self.latency_window.quantile(0.95)
+            p99 = self.latency_window.quantile(0.99)
+            avg_latency = self.latency_window.mean
+            self.latency_window.clear()
             
             # Установка значений метрик
             LATENCY_P50.set(p50)
             LATENCY_P95.set(p95)
             LATENCY_P99.set(p99)
             LATENCY_AVG.set(avg_latency)
+            for q in (0.5, 0.95, 0.99):
+                LATENCY_CUMULATIVE.labels(quantile=str(q)).set(self.latency_total.quantile(q))
             
-            # Отправка в pushgateway
+            # Отправка в pushgateway (в режиме координации - отдельная группа на экземпляр)
+            grouping_key = {'instance': self.coordinator.instance_id} if self.coordinator else None
             push_to_gateway(
                 self.prometheus_gateway,
                 job='load_generator',
-                registry=registry
+                registry=registry,
+                grouping_key=grouping_key
             )
             
             logger.info(f"Metrics pushed: p50={p50:.2f}ms, p95={p95:.2f}ms, p99={p99:.2f}ms, avg={avg_latency:.2f}ms")
@@ -134,39 +307,137 @@ class LoadGenerator:
         except Exception as e:
             logger.warning(f"Failed to push metrics to Prometheus: {e}")
     
-    def generate_transactions(self, events_per_second=1000, duration_seconds=None):
+    def _coordinator_heartbeat(self):
+        """Heartbeat координатора и перебалансировка доли экземпляра"""
+        try:
+            _, instance_count = self.coordinator.heartbeat()
+            INSTANCES.set(instance_count)
+        except Exception as e:
+            # Без связи с Redis продолжаем с последней известной долей
+            logger.warning(f"Coordinator heartbeat failed: {e}")
+    
+    def _publish_coordinated_results(self, start_time):
+        """Публикация результатов экземпляра и общего отчета по всем экземплярам"""
+        try:
+            self.coordinator.deregister()
+            self.coordinator.publish_results({
+                'instance_id': self.coordinator.instance_id,
+                'started_at': start_time,
+                'finished_at': time.time(),
+                'transactions_sent': self.transactions_sent,
+                'failed_requests': self.failed_requests,
+                'latency_sketch': self.latency_total.to_dict(),
+            })
+            # Последний завершившийся экземпляр сохраняет полный отчет
+            report = self.coordinator.publish_merged_report()
+            logger.info(f"Merged report ({report['instances']} instances): "
+                        f"{report['transactions_sent']} sent, {report['achieved_rate']:.0f} events/sec, "
+                        f"p99={report['latency_ms']['p99']}ms")
+        except Exception as e:
+            logger.warning(f"Failed to publish coordinated results: {e}")
+    
+    def generate_transactions(self, events_per_second=1000, duration_seconds=None,
+                              profile: LoadProfile = None):
         """
         Генерация потока транзакций
         
         Args:
-            events_per_second: Количество транзакций в секунду
-            duration_seconds: Длительность генерации в секундах (None = бесконечно)
+            events_per_second: Количество транзакций в секунду (если профиль не задан)
+            duration_seconds: Длительность генерации в секундах (None = длительность профиля или бесконечно)
+            profile: Профиль нагрузки, задающий целевую скорость во времени
         """
-        logger.info(f"Starting transaction generation: {events_per_second} events/sec")
+        if profile is None:
+            profile = ConstantProfile(events_per_second)
+        if duration_seconds is None:
+            duration_seconds = profile.duration
+        logger.info(f"Starting transaction generation: {profile.describe()}")
+        
+        if self.coordinator:
+            self.coordinator.register()
+            INSTANCES.set(self.coordinator.instance_count)
+        
+        record_path = os.getenv('RUN_RECORD_PATH')
+        if record_path:
+            self.recorder = RunRecorder(
+                record_path,
+                self.run_config(profile, duration_seconds),
+                snapshot_interval=float(os.getenv('RUN_RECORD_SNAPSHOT_SECONDS', 60))
+            )
+            logger.info(f"Recording run results to {record_path}")
         
         start_time = time.time()
         metrics_push_counter = 0
         user_counter = 1
+        user_sequence = 0
+        # Дробная часть целевой скорости переносится на следующую секунду
+        rate_carry = 0.0
+        backpressure_seen = 0
         
         try:
             while True:
                 batch_start = time.time()
                 
+                target_rate = profile.rate_at(batch_start - start_time)
+                if self.coordinator:
+                    target_rate = self.coordinator.rate_share(target_rate)
+                TARGET_RATE.set(target_rate)
+                if self.rate_controller:
+                    # Скорость ограничивается по ошибкам и задержке подтверждений за прошлую секунду
+                    ack_p99, errors = self.in_flight.take_window()
+                    throttles_before = self.rate_controller.throttle_events
+                    target_rate = self.rate_controller.update(
+                        target_rate, ack_p99, errors,
+                        backpressure=self.backpressure_events > backpressure_seen
+                    )
+                    backpressure_seen = self.backpressure_events
+                    THROTTLE_EVENTS.inc(self.rate_controller.throttle_events - throttles_before)
+                    ALLOWED_RATE.set(target_rate)
+                batch_size = int(target_rate + rate_carry)
+                rate_carry = target_rate + rate_carry - batch_size
+                
                 # Генерация батча транзакций
-                for i in range(events_per_second):
+                sent_in_batch = 0
+                for i in range(batch_size):
+                    if self.key_distribution:
+                        # Каждый экземпляр выбирает из полного пространства ключей, сохраняя форму распределения
+                        user_counter = self.key_distribution.next_key()
+                    elif self.coordinator:
+                        user_counter = self.coordinator.key_for(user_sequence)
+                        user_sequence += 1
                     transaction = self.generate_transaction(user_counter)
-                    self.send_to_kafka(transaction)
+                    partition = None
+                    if self.probe and self.probe.should_probe():
+                        partition = self.probe.tag(transaction)
+                    # Ожидание слотов in-flight ограничено секундой батча: при остановке брокера
+                    # остаток батча сразу учитывается как backpressure, а цикл метрик не замирает
+                    acquire_timeout = max(0.0, batch_start + 1.0 - time.time())
+                    if self.send_to_kafka(transaction, partition=partition, acquire_timeout=acquire_timeout):
+                        sent_in_batch += 1
+                        if partition is not None:
+                            self.probe.commit(partition)
                     user_counter += 1
                     
                     # Периодически проверяем задержку (опционально)
                     if i % 100 == 0:
                         latency = (time.time() - batch_start) * 1000
-                        self.latency_buffer.append(latency)
-                        REQUEST_LATENCY.observe(latency / 1000.0)
+                        self._record_latency(latency)
+                
+                if self.lateness:
+                    self._record_lateness()
+                
+                # Фактическая скорость: отправленные события за время батча (не меньше секунды)
+                ACHIEVED_RATE.set(sent_in_batch / max(1.0, time.time() - batch_start))
+                IN_FLIGHT.set(self.in_flight.in_flight)
+                if self.recorder:
+                    self.recorder.record_second(batch_start - start_time, target_rate, sent_in_batch,
+                                                self.successful_requests, self.failed_requests,
+                                                self.in_flight.in_flight)
                 
                 # Периодическая отправка метрик в Prometheus (каждые 5 секунд)
                 metrics_push_counter += 1
                 if metrics_push_counter >= 5:
+                    if self.coordinator:
+                        self._coordinator_heartbeat()
                     self._push_metrics_to_prometheus()
                     metrics_push_counter = 0
                 
@@ -187,18 +458,98 @@ class LoadGenerator:
         finally:
             self.producer.flush()
             self.producer.close()
+            if self.lateness:
+                self._record_lateness(flush=True)
+            if self.coordinator:
+                self._publish_coordinated_results(start_time)
             logger.info(f"Total transactions sent: {self.transactions_sent}")
             logger.info(f"Successful: {self.successful_requests}, Failed: {self.failed_requests}")
+            if self.rate_controller:
+                logger.info(f"Throttle events: {self.rate_controller.throttle_events}, "
+                            f"final allowed rate: {self.rate_controller.rate:.0f} events/sec")
+            
+            # Сохранение накопительного скетча latency для объединения с другими экземплярами
+            sketch_path = os.getenv('LATENCY_SKETCH_PATH')
+            if sketch_path:
+                with open(sketch_path, 'w') as f:
+                    f.write(self.export_latency_sketch())
+                logger.info(f"Latency sketch saved to {sketch_path}")
+            
+            # Итоги прогона для внешних экспериментов (scripts/capacity_experiment.py)
+            summary_path = os.getenv('RUN_SUMMARY_PATH')
+            if summary_path:
+                self.write_run_summary(summary_path, start_time, profile)
+            
+            if self.recorder:
+                self.recorder.close({
+                    'transactions_sent': self.transactions_sent,
+                    'successful_requests': self.successful_requests,
+                    'failed_requests': self.failed_requests,
+                    'backpressure_events': self.backpressure_events,
+                    'throttle_events': self.rate_controller.throttle_events if self.rate_controller else 0,
+                })
+                logger.info(f"Run results saved to {self.recorder.path}")
+    
+    def run_config(self, profile: LoadProfile, duration_seconds) -> dict:
+        """Конфигурация прогона для файла результатов"""
+        return {
+            'profile': profile.describe(),
+            'duration_seconds': duration_seconds,
+            'instance': self.coordinator.instance_id if self.coordinator else os.getenv('HOSTNAME', 'generator'),
+            'topic': self.kafka_topic,
+            'producer': {
+                'acks': os.getenv('PRODUCER_ACKS', 'all'),
+                'linger_ms': int(os.getenv('PRODUCER_LINGER_MS', 0)),
+                'batch_size': int(os.getenv('PRODUCER_BATCH_SIZE', 16384)),
+                'compression': os.getenv('PRODUCER_COMPRESSION') or None,
+            },
+            'keyed_sends': self.keyed_sends,
+            'key_distribution': os.getenv('KEY_DISTRIBUTION', 'sequential'),
+            'max_in_flight': self.in_flight.max_in_flight,
+            'adaptive_rate': self.rate_controller is not None,
+            'probe_sample_rate': float(os.getenv('PROBE_SAMPLE_RATE', 0)),
+            'python': platform.python_version(),
+        }
+    
+    def write_run_summary(self, path: str, start_time: float, profile: LoadProfile):
+        """Сохранение итогов прогона: счетчики, интервал работы и скетч задержки подтверждений"""
+        finished_at = time.time()
+        summary = {
+            'profile': profile.describe(),
+            'started_at': start_time,
+            'finished_at': finished_at,
+            'transactions_sent': self.transactions_sent,
+            'successful_requests': self.successful_requests,
+            'failed_requests': self.failed_requests,
+            'achieved_rate': round(self.successful_requests / max(finished_at - start_time, 1e-9), 2),
+            'ack_latency_sketch': self.ack_latency_total.to_dict(),
+        }
+        with open(path, 'w') as f:
+            json.dump(summary, f)
+        logger.info(f"Run summary saved to {path}")
 
 
 def generate_transactions():
     """Генерация потока транзакций (основная функция)"""
     events_per_second = int(os.getenv('EVENTS_PER_SECOND', 1000))
     
-    generator = LoadGenerator()
+    # Профиль нагрузки (если не задан - постоянная скорость EVENTS_PER_SECOND)
+    profile = None
+    profile_name = os.getenv('LOAD_PROFILE')
+    if profile_name:
+        profile_file = os.getenv('LOAD_PROFILE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles.json'))
+        profile = load_profile(profile_file, profile_name)
+    
+    generator = LoadGenerator(
+        coordinator=coordinator_from_env(),
+        key_distribution=key_distribution_from_env()
+    )
     # Даем время другим сервисам запуститься
-    time.sleep(10)
-    generator.generate_transactions(events_per_second=events_per_second)
+    time.sleep(float(os.getenv('STARTUP_DELAY_SECONDS', 10)))
+    duration = os.getenv('DURATION_SECONDS')
+    generator.generate_transactions(events_per_second=events_per_second,
+                                    duration_seconds=float(duration) if duration else None,
+                                    profile=profile)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+"""
+Распределения ключей (user_id) для моделирования перекоса нагрузки по партициям
+В продакшене несколько "горячих" пациентов или учреждений дают основную часть событий,
+что приводит к горячим партициям Kafka и перекосу подзадач Flink
+"""
+import abc
+import os
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class KeyDistribution(abc.ABC):
+    """
+    Базовое распределение ключей из диапазона [1, cardinality]
+
+    Ключи генерируются пачками через NumPy, чтобы выборка одного ключа стоила O(1)
+    """
+
+    def __init__(self, cardinality: int, chunk_size: int = 65536, seed: Optional[int] = None):
+        if cardinality < 1:
+            raise ValueError("Key cardinality must be positive")
+        self.cardinality = cardinality
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+        self._chunk = np.empty(0, dtype=np.int64)
+        self._position = 0
+
+    @abc.abstractmethod
+    def _sample(self, size: int) -> np.ndarray:
+        """Пачка из size ключей"""
+
+    def next_key(self) -> int:
+        if self._position >= len(self._chunk):
+            self._chunk = self._sample(self.chunk_size)
+            self._position = 0
+        key = int(self._chunk[self._position])
+        self._position += 1
+        return key
+
+    def describe(self) -> str:
+        return f"{self.__class__.__name__}(cardinality={self.cardinality})"
+
+
+class UniformKeys(KeyDistribution):
+    """Равномерное распределение ключей"""
+
+    def _sample(self, size: int) -> np.ndarray:
+        return self.rng.integers(1, self.cardinality + 1, size=size)
+
+    def describe(self) -> str:
+        return f"uniform(cardinality={self.cardinality})"
+
+
+class ZipfKeys(KeyDistribution):
+    """Ограниченное распределение Ципфа: вероятность ключа ранга k пропорциональна 1/k^exponent"""
+
+    def __init__(self, cardinality: int, exponent: float = 1.1, **kwargs):
+        super().__init__(cardinality, **kwargs)
+        self.exponent = exponent
+        weights = 1.0 / np.power(np.arange(1, cardinality + 1, dtype=np.float64), exponent)
+        self._cdf = np.cumsum(weights / weights.sum())
+
+    def _sample(self, size: int) -> np.ndarray:
+        ranks = np.searchsorted(self._cdf, self.rng.random(size), side='right')
+        return np.minimum(ranks, self.cardinality - 1) + 1
+
+    def describe(self) -> str:
+        return f"zipf(cardinality={self.cardinality}, s={self.exponent})"
+
+
+class HotSetKeys(KeyDistribution):
+    """Доля hot_fraction событий приходится на hot_keys горячих ключей, остальные - равномерно"""
+
+    def __init__(self, cardinality: int, hot_keys: int = 10, hot_fraction: float = 0.8, **kwargs):
+        super().__init__(cardinality, **kwargs)
+        if not 0 < hot_keys <= cardinality:
+            raise ValueError("hot_keys must be in (0, cardinality]")
+        self.hot_keys = hot_keys
+        self.hot_fraction = hot_fraction
+
+    def _sample(self, size: int) -> np.ndarray:
+        hot = self.rng.random(size) < self.hot_fraction
+        keys = self.rng.integers(self.hot_keys + 1, self.cardinality + 1, size=size) \
+            if self.hot_keys < self.cardinality else np.ones(size, dtype=np.int64)
+        keys[hot] = self.rng.integers(1, self.hot_keys + 1, size=int(hot.sum()))
+        return keys
+
+    def describe(self) -> str:
+        return f"hot-set(cardinality={self.cardinality}, {self.hot_keys} hot keys get {self.hot_fraction:.0%})"
+
+
+def key_distribution_from_env() -> Optional[KeyDistribution]:
+    """
+    Распределение ключей из переменных окружения
+
+    KEY_DISTRIBUTION: sequential (по умолчанию, последовательные user_id), uniform, zipf, hotset
+    """
+    name = os.getenv('KEY_DISTRIBUTION', 'sequential').lower()
+    if name == 'sequential':
+        return None
+    cardinality = int(os.getenv('KEY_CARDINALITY', 10000))
+    seed = int(os.getenv('KEY_SEED')) if os.getenv('KEY_SEED') else None
+    if name == 'uniform':
+        distribution = UniformKeys(cardinality, seed=seed)
+    elif name == 'zipf':
+        distribution = ZipfKeys(cardinality, exponent=float(os.getenv('ZIPF_EXPONENT', 1.1)), seed=seed)
+    elif name == 'hotset':
+        distribution = HotSetKeys(
+            cardinality,
+            hot_keys=int(os.getenv('HOT_KEYS', 10)),
+            hot_fraction=float(os.getenv('HOT_FRACTION', 0.8)),
+            seed=seed
+        )
+    else:
+        raise ValueError(f"Unknown key distribution: {name}")
+    logger.info(f"Key distribution: {distribution.describe()}")
+    return distribution
@@ -0,0 +1,181 @@
+"""
+Сквозной (end-to-end) замер задержки конвейера
+Генератор встраивает в выборочные сообщения время отправки и порядковый номер,
+а консьюмер-зонд читает входной или выходной топик и считает задержку, потери и переупорядочивание
+"""
+import json
+import os
+import random
+import time
+import logging
+from typing import Dict, Optional
+
+from prometheus_client import push_to_gateway, CollectorRegistry, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+PROBE_FIELD = '_probe'
+
+# Prometheus метрики зонда
+registry = CollectorRegistry()
+E2E_LATENCY = Histogram(
+    'pipeline_e2e_latency_seconds',
+    'End-to-end latency from generator send to probe consumer',
+    ['partition'],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+    registry=registry
+)
+PROBES_RECEIVED = Counter('pipeline_probe_received_total', 'Probe messages received', ['partition'], registry=registry)
+PROBES_REORDERED = Counter('pipeline_probe_reordered_total', 'Probe messages received out of order', ['partition'], registry=registry)
+PROBES_DUPLICATED = Counter('pipeline_probe_duplicates_total', 'Duplicate probe messages received', ['partition'], registry=registry)
+PROBES_LOST = Gauge('pipeline_probe_lost', 'Probe messages missing (sequence gaps)', ['partition'], registry=registry)
+
+
+class ProbeTagger:
+    """
+    Сторона генератора: помечает выборочные сообщения зондом
+
+    Зонды отправляются в явно заданную партицию по кругу, а порядковый номер ведется
+    отдельно для каждой партиции, чтобы потери и порядок можно было проверить по партициям
+    """
+
+    def __init__(self, sample_rate: float, source_id: str = 'generator'):
+        self.sample_rate = sample_rate
+        self.source_id = source_id
+        self.partitions = []
+        self.sequences: Dict[int, int] = {}
+        self._next_partition = 0
+
+    def set_partitions(self, partitions):
+        """Установка списка партиций топика"""
+        self.partitions = sorted(partitions or [])
+        for partition in self.partitions:
+            self.sequences.setdefault(partition, 0)
+
+    def should_probe(self) -> bool:
+        return self.sample_rate > 0 and bool(self.partitions) and random.random() < self.sample_rate
+
+    def tag(self, message: Dict) -> int:
+        """
+        Встраивание зонда в сообщение, возвращает партицию для отправки
+
+        Номер в партиции предварительный: он занимается только после успешной отправки (commit),
+        иначе неотправленный зонд выглядел бы у консьюмера как потеря
+        """
+        partition = self.partitions[self._next_partition % len(self.partitions)]
+        self._next_partition += 1
+        message[PROBE_FIELD] = {
+            'src': self.source_id,
+            'partition': partition,
+            'seq': self.sequences[partition],
+            'ts_ns': time.time_ns(),
+        }
+        return partition
+
+    def commit(self, partition: int):
+        """Зонд партиции передан продюсеру: следующий зонд получит следующий номер"""
+        self.sequences[partition] += 1
+
+
+class ProbeTracker:
+    """Сторона консьюмера: учет задержки, потерь и переупорядочивания зондов"""
+
+    def __init__(self):
+        # (источник, партиция) -> состояние последовательности
+        self.streams: Dict[tuple, Dict] = {}
+
+    def observe(self, probe: Dict, received_ns: Optional[int] = None) -> float:
+        """
+        Учет полученного зонда
+
+        Returns:
+            Задержка end-to-end в секундах
+        """
+        received_ns = received_ns or time.time_ns()
+        partition = str(probe['partition'])
+        latency = max(0, received_ns - probe['ts_ns']) / 1e9
+        E2E_LATENCY.labels(partition=partition).observe(latency)
+        PROBES_RECEIVED.labels(partition=partition).inc()
+
+        key = (probe['src'], partition)
+        seq = probe['seq']
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = {'first': seq, 'max': seq, 'received': 1, 'seen_recent': {seq}}
+            self.streams[key] = stream
+        elif seq in stream['seen_recent']:
+            PROBES_DUPLICATED.labels(partition=partition).inc()
+            return latency
+        else:
+            if seq < stream['max']:
+                PROBES_REORDERED.labels(partition=partition).inc()
+            stream['first'] = min(stream['first'], seq)
+            stream['max'] = max(stream['max'], seq)
+            stream['received'] += 1
+            stream['seen_recent'].add(seq)
+            # Окно для поиска дубликатов ограничено, чтобы память не росла
+            if len(stream['seen_recent']) > 10000:
+                floor = stream['max'] - 5000
+                stream['seen_recent'] = {s for s in stream['seen_recent'] if s > floor}
+
+        PROBES_LOST.labels(partition=partition).set(self.lost(key))
+        return latency
+
+    def lost(self, key: tuple) -> int:
+        """Количество пропущенных номеров в последовательности"""
+        stream = self.streams[key]
+        expected = stream['max'] - stream['first'] + 1
+        return max(0, expected - stream['received'])
+
+    def summary(self) -> Dict:
+        result = {}
+        for (src, partition), stream in self.streams.items():
+            result[f"{src}/{partition}"] = {
+                'received': stream['received'],
+                'lost': self.lost((src, partition)),
+            }
+        return result
+
+
+def run_probe_consumer():
+    """Запуск консьюмера-зонда (топик задается PROBE_TOPIC: входной или выходной топик конвейера)"""
+    from kafka import KafkaConsumer
+
+    topic = os.getenv('PROBE_TOPIC', os.getenv('KAFKA_TOPIC', 'transactions'))
+    prometheus_gateway = os.getenv('PROMETHEUS_GATEWAY', 'pushgateway:9091')
+    consumer = KafkaConsumer(
+        topic,
+        bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:19092').split(','),
+        group_id=os.getenv('PROBE_GROUP_ID', 'pipeline-probe'),
+        auto_offset_reset='latest',
+        value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+    )
+    logger.info(f"Probe consumer started on topic '{topic}'")
+
+    tracker = ProbeTracker()
+    last_push = time.time()
+    try:
+        while True:
+            batches = consumer.poll(timeout_ms=1000)
+            for records in batches.values():
+                for record in records:
+                    value = record.value
+                    if isinstance(value, dict) and PROBE_FIELD in value:
+                        tracker.observe(value[PROBE_FIELD])
+
+            if time.time() - last_push >= 5:
+                try:
+                    push_to_gateway(prometheus_gateway, job='pipeline_probe', registry=registry)
+                except Exception as e:
+                    logger.warning(f"Failed to push probe metrics to Prometheus: {e}")
+                logger.info(f"Probe streams: {tracker.summary()}")
+                last_push = time.time()
+    except KeyboardInterrupt:
+        logger.info("Probe consumer interrupted by user")
+    finally:
+        consumer.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    run_probe_consumer()
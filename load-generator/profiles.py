@@ -0,0 +1,219 @@
+"""
+Профили нагрузки для генератора транзакций
+Описывают целевую скорость (событий в секунду) как функцию времени от начала генерации
+"""
+import abc
+import csv
+import json
+import math
+import os
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoadProfile(abc.ABC):
+    """Базовый профиль нагрузки"""
+
+    def __init__(self, duration: Optional[float] = None):
+        # Длительность профиля в секундах (None = бесконечно)
+        self.duration = duration
+
+    @abc.abstractmethod
+    def rate_at(self, elapsed: float) -> float:
+        """Целевая скорость (событий/сек) в момент elapsed секунд от старта"""
+
+    def describe(self) -> str:
+        return self.__class__.__name__
+
+
+class ConstantProfile(LoadProfile):
+    """Постоянная скорость"""
+
+    def __init__(self, rate: float, duration: Optional[float] = None):
+        super().__init__(duration)
+        self.rate = float(rate)
+
+    def rate_at(self, elapsed: float) -> float:
+        return self.rate
+
+    def describe(self) -> str:
+        return f"constant({self.rate:.0f}/s)"
+
+
+class RampProfile(LoadProfile):
+    """Линейный рост (или спад) скорости от start_rate до end_rate за ramp_seconds"""
+
+    def __init__(self, start_rate: float, end_rate: float, ramp_seconds: float,
+                 duration: Optional[float] = None):
+        super().__init__(duration)
+        self.start_rate = float(start_rate)
+        self.end_rate = float(end_rate)
+        self.ramp_seconds = float(ramp_seconds)
+
+    def rate_at(self, elapsed: float) -> float:
+        if self.ramp_seconds <= 0 or elapsed >= self.ramp_seconds:
+            return self.end_rate
+        progress = elapsed / self.ramp_seconds
+        return self.start_rate + (self.end_rate - self.start_rate) * progress
+
+    def describe(self) -> str:
+        return f"ramp({self.start_rate:.0f}->{self.end_rate:.0f}/s за {self.ramp_seconds:.0f}s)"
+
+
+class StepProfile(LoadProfile):
+    """Ступенчатая нагрузка: список ступеней {"rate": ..., "seconds": ...}"""
+
+    def __init__(self, steps: List[Dict], repeat: bool = False,
+                 duration: Optional[float] = None):
+        super().__init__(duration)
+        if not steps:
+            raise ValueError("Step profile requires at least one step")
+        self.steps = [(float(s['seconds']), float(s['rate'])) for s in steps]
+        self.repeat = repeat
+        self.cycle_seconds = sum(seconds for seconds, _ in self.steps)
+
+    def rate_at(self, elapsed: float) -> float:
+        if self.repeat and self.cycle_seconds > 0:
+            elapsed = elapsed % self.cycle_seconds
+        position = 0.0
+        for seconds, rate in self.steps:
+            position += seconds
+            if elapsed < position:
+                return rate
+        # После последней ступени держим ее скорость
+        return self.steps[-1][1]
+
+    def describe(self) -> str:
+        rates = ','.join(f"{rate:.0f}" for _, rate in self.steps)
+        return f"step([{rates}]/s{', repeat' if self.repeat else ''})"
+
+
+class SpikeProfile(LoadProfile):
+    """Базовая скорость с кратковременными всплесками"""
+
+    def __init__(self, base_rate: float, spike_rate: float, spike_start: float,
+                 spike_seconds: float, period: Optional[float] = None,
+                 duration: Optional[float] = None):
+        super().__init__(duration)
+        self.base_rate = float(base_rate)
+        self.spike_rate = float(spike_rate)
+        self.spike_start = float(spike_start)
+        self.spike_seconds = float(spike_seconds)
+        # Период повторения всплеска (None = один всплеск)
+        self.period = float(period) if period else None
+
+    def rate_at(self, elapsed: float) -> float:
+        if elapsed < self.spike_start:
+            return self.base_rate
+        offset = elapsed - self.spike_start
+        if self.period:
+            offset = offset % self.period
+        return self.spike_rate if offset < self.spike_seconds else self.base_rate
+
+    def describe(self) -> str:
+        return f"spike({self.base_rate:.0f}/s, пик {self.spike_rate:.0f}/s на {self.spike_seconds:.0f}s)"
+
+
+class SineProfile(LoadProfile):
+    """Синусоидальная (суточная) нагрузка: base_rate ± amplitude с периодом period секунд"""
+
+    def __init__(self, base_rate: float, amplitude: float, period: float,
+                 phase: float = 0.0, duration: Optional[float] = None):
+        super().__init__(duration)
+        if period <= 0:
+            raise ValueError("Sine profile period must be positive")
+        self.base_rate = float(base_rate)
+        self.amplitude = float(amplitude)
+        self.period = float(period)
+        self.phase = float(phase)
+
+    def rate_at(self, elapsed: float) -> float:
+        angle = 2 * math.pi * (elapsed + self.phase) / self.period
+        return max(0.0, self.base_rate + self.amplitude * math.sin(angle))
+
+    def describe(self) -> str:
+        return f"sine({self.base_rate:.0f}±{self.amplitude:.0f}/s, период {self.period:.0f}s)"
+
+
+class TraceProfile(LoadProfile):
+    """
+    Воспроизведение записанной нагрузки
+    Трасса - CSV с колонками seconds,rate (скорость держится до следующей точки)
+    """
+
+    def __init__(self, points: List[tuple], loop: bool = False, speedup: float = 1.0,
+                 duration: Optional[float] = None):
+        super().__init__(duration)
+        if not points:
+            raise ValueError("Trace profile requires at least one point")
+        self.points = sorted((float(t), float(r)) for t, r in points)
+        self.loop = loop
+        # Ускорение воспроизведения (2.0 = трасса проигрывается в 2 раза быстрее)
+        self.speedup = float(speedup)
+        # Последняя точка держится столько же, сколько предпоследний интервал
+        last_step = self.points[-1][0] - self.points[-2][0] if len(self.points) > 1 else 1.0
+        self.trace_seconds = self.points[-1][0] + last_step
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> 'TraceProfile':
+        points = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                points.append((row['seconds'], row['rate']))
+        logger.info(f"Loaded load trace from {path}: {len(points)} points")
+        return cls(points, **kwargs)
+
+    def rate_at(self, elapsed: float) -> float:
+        position = elapsed * self.speedup
+        if self.loop and self.trace_seconds > 0:
+            position = position % self.trace_seconds
+        rate = self.points[0][1]
+        for t, r in self.points:
+            if t > position:
+                break
+            rate = r
+        return rate
+
+    def describe(self) -> str:
+        return f"trace({len(self.points)} точек, {self.trace_seconds:.0f}s{', loop' if self.loop else ''})"
+
+
+PROFILE_TYPES = {
+    'constant': ConstantProfile,
+    'ramp': RampProfile,
+    'step': StepProfile,
+    'spike': SpikeProfile,
+    'sine': SineProfile,
+}
+
+
+def build_profile(spec: Dict, base_dir: str = '.') -> LoadProfile:
+    """Создание профиля из словаря конфигурации"""
+    spec = dict(spec)
+    profile_type = spec.pop('type', 'constant')
+    if profile_type == 'trace':
+        # Относительный путь к трассе считается от директории конфигурации
+        return TraceProfile.from_csv(os.path.join(base_dir, spec.pop('file')), **spec)
+    if profile_type not in PROFILE_TYPES:
+        raise ValueError(f"Unknown load profile type: {profile_type}")
+    return PROFILE_TYPES[profile_type](**spec)
+
+
+def load_profile(config_path: str, name: str) -> LoadProfile:
+    """
+    Загрузка именованного профиля из JSON-файла конфигурации
+
+    Args:
+        config_path: Путь к файлу с секцией "profiles"
+        name: Имя профиля в файле
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+    profiles = config.get('profiles', {})
+    if name not in profiles:
+        raise ValueError(f"Load profile '{name}' not found in {config_path}. Available: {sorted(profiles)}")
+    profile = build_profile(profiles[name], base_dir=os.path.dirname(os.path.abspath(config_path)))
+    logger.info(f"Load profile '{name}': {profile.describe()}")
+    return profile
@@ -0,0 +1,107 @@
+"""
+Контроль отправки в Kafka: ограничение числа неподтвержденных сообщений (in-flight)
+и адаптивное управление скоростью по схеме AIMD (аддитивный рост, мультипликативное снижение)
+"""
+import threading
+import time
+import logging
+from typing import Optional
+
+from sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightTracker:
+    """
+    Учет отправленных, но еще не подтвержденных брокером сообщений
+
+    Подтверждения приходят из потока ввода-вывода KafkaProducer, поэтому состояние защищено блокировкой
+    """
+
+    def __init__(self, max_in_flight: int = 10000):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        # Задержка подтверждений и ошибки с момента последнего take_window()
+        self._ack_latency = QuantileSketch()
+        self._errors = 0
+
+    def acquire(self, timeout: float = 1.0) -> bool:
+        """Занять слот перед отправкой; False, если слот не освободился за timeout секунд"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= self.max_in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, ack_latency_ms: Optional[float] = None, error: bool = False):
+        """Освободить слот после подтверждения или ошибки"""
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            if error:
+                self._errors += 1
+            elif ack_latency_ms is not None:
+                self._ack_latency.add(ack_latency_ms)
+            self._condition.notify()
+
+    def take_window(self):
+        """
+        Статистика подтверждений за окно с момента предыдущего вызова
+
+        Returns:
+            (p99 задержки подтверждения в мс или None, количество ошибок)
+        """
+        with self._condition:
+            p99 = self._ack_latency.quantile(0.99)
+            errors = self._errors
+            self._ack_latency.clear()
+            self._errors = 0
+        return p99, errors
+
+
+class AdaptiveRateController:
+    """
+    AIMD-регулятор скорости отправки
+
+    При ошибках, переполнении in-flight или росте p99 задержки подтверждения выше порога скорость
+    умножается на decrease_factor, иначе растет на increase_step событий/сек за интервал до целевой
+    """
+
+    def __init__(self, ack_latency_threshold_ms: float = 500.0, decrease_factor: float = 0.7,
+                 increase_step: float = 100.0, min_rate: float = 1.0):
+        self.ack_latency_threshold_ms = ack_latency_threshold_ms
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.min_rate = min_rate
+        self.rate: Optional[float] = None
+        self.throttle_events = 0
+
+    def update(self, target_rate: float, ack_p99_ms: Optional[float], errors: int,
+               backpressure: bool = False) -> float:
+        """
+        Пересчет допустимой скорости за прошедший интервал
+
+        Returns:
+            Скорость для следующего интервала (не выше целевой)
+        """
+        if self.rate is None:
+            self.rate = target_rate
+
+        congested = errors > 0 or backpressure or (
+            ack_p99_ms is not None and ack_p99_ms > self.ack_latency_threshold_ms
+        )
+        if congested:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.throttle_events += 1
+            logger.info(f"Throttling to {self.rate:.0f} events/sec "
+                        f"(errors={errors}, ack_p99={ack_p99_ms}, backpressure={backpressure})")
+        else:
+            self.rate = self.rate + self.increase_step
+
+        self.rate = min(self.rate, target_rate)
+        return self.rate
@@ -0,0 +1,143 @@
+"""
+Запись результатов прогона генератора нагрузки в файл (JSON Lines, .gz - со сжатием)
+
+Файл пишется по ходу прогона и сбрасывается на диск после каждой строки, поэтому память генератора
+не растет с длительностью прогона, а прерванный прогон остается читаемым до последней записанной секунды.
+Строки различаются полем type:
+    config   - конфигурация прогона (первая строка)
+    second   - одна секунда: целевая и фактическая скорость, подтверждения, ошибки, in-flight
+    snapshot - скетчи задержек за интервал snapshot_interval и сводка ошибок за него
+    summary  - итоги прогона (последняя строка, если генератор завершился штатно)
+"""
+import gzip
+import json
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from sketch import QuantileSketch
+
+# Различных сообщений об ошибках в одном снимке; остальные учитываются только счетчиком
+MAX_ERROR_MESSAGES = 20
+
+
+def open_run_file(path: str, mode: str = 'rt'):
+    """Файл прогона: gzip по расширению .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_run(path: str) -> Iterator[Dict]:
+    """Построчное чтение файла прогона; оборванная последняя строка (прогон прерван) пропускается"""
+    with open_run_file(path) as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except EOFError:
+            return
+
+
+class RunRecorder:
+    """
+    Запись прогона: строка на каждую секунду и снимки скетчей раз в snapshot_interval секунд
+
+    Подтверждения и ошибки приходят из потока callback'ов KafkaProducer, поэтому оконные скетчи
+    и сводка ошибок защищены блокировкой
+    """
+
+    def __init__(self, path: str, config: Dict, snapshot_interval: float = 60.0):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.started_at = time.time()
+        self._file = open_run_file(path, 'wt')
+        self._lock = threading.Lock()
+        self._ack_latency = QuantileSketch()
+        self._batch_latency = QuantileSketch()
+        self._ack_latency_total = QuantileSketch()
+        self._errors: Dict[str, int] = {}
+        self._error_count = 0
+        self._last_snapshot = 0.0
+        self._last_acked = 0
+        self._last_failed = 0
+        self._write({'type': 'config', 'started_at': self.started_at, **config})
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def record_ack(self, latency_ms: float):
+        with self._lock:
+            self._ack_latency.add(latency_ms)
+            self._ack_latency_total.add(latency_ms)
+
+    def record_batch_latency(self, latency_ms: float):
+        with self._lock:
+            self._batch_latency.add(latency_ms)
+
+    def record_error(self, kind: str, message: str = ''):
+        """Ошибка отправки; одинаковые сообщения за интервал снимка сворачиваются в счетчик"""
+        key = f"{kind}: {message[:200]}" if message else kind
+        with self._lock:
+            self._error_count += 1
+            if key in self._errors or len(self._errors) < MAX_ERROR_MESSAGES:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            else:
+                self._errors['other'] = self._errors.get('other', 0) + 1
+
+    def record_second(self, elapsed: float, target_rate: float, sent: int, acked_total: int,
+                      failed_total: int, in_flight: int):
+        """
+        Итоги одной секунды генерации
+
+        Args:
+            elapsed: Секунд с начала прогона
+            target_rate: Целевая скорость (после координации и адаптивного ограничения)
+            sent: Отправлено за секунду
+            acked_total, failed_total: Накопительные счетчики подтверждений и ошибок генератора
+            in_flight: Неподтвержденных сообщений в конце секунды
+        """
+        self._write({
+            'type': 'second',
+            't': round(elapsed, 3),
+            'target': round(target_rate, 2),
+            'sent': sent,
+            'acked': acked_total - self._last_acked,
+            'failed': failed_total - self._last_failed,
+            'in_flight': in_flight,
+        })
+        self._last_acked = acked_total
+        self._last_failed = failed_total
+        if elapsed - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot(elapsed)
+
+    def snapshot(self, elapsed: float):
+        """Снимок скетчей задержек и ошибок за интервал с предыдущего снимка"""
+        with self._lock:
+            record = {
+                'type': 'snapshot',
+                't': round(elapsed, 3),
+                'interval': round(elapsed - self._last_snapshot, 3),
+                'ack_latency': self._ack_latency.to_dict(),
+                'batch_latency': self._batch_latency.to_dict(),
+                'errors': self._errors,
+            }
+            self._ack_latency.clear()
+            self._batch_latency.clear()
+            self._errors = {}
+        self._last_snapshot = elapsed
+        self._write(record)
+
+    def close(self, summary: Optional[Dict] = None):
+        """Последний снимок, итоговая строка и закрытие файла"""
+        finished_at = time.time()
+        self.snapshot(finished_at - self.started_at)
+        with self._lock:
+            total = self._ack_latency_total.to_dict()
+            error_count = self._error_count
+        self._write({'type': 'summary', 'finished_at': finished_at, 'errors': error_count,
+                     'ack_latency': total, **(summary or {})})
+        self._file.close()
@@ -0,0 +1,192 @@
+"""
+Отчет по записанным прогонам генератора нагрузки (RUN_RECORD_PATH)
+Один файл - сводка прогона, несколько - сравнение с первым (baseline) и поиск регрессий
+пропускной способности, хвостовой задержки подтверждений и доли ошибок.
+Файлы читаются построчно, скетчи снимков объединяются, поэтому память не зависит от длительности прогона
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+from run_recorder import read_run
+from sketch import QuantileSketch
+
+QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99, 'p999': 0.999}
+
+# Поля конфигурации, которые различаются между прогонами и не влияют на сравнение
+VOLATILE_CONFIG = {'type', 'started_at', 'instance'}
+
+
+def load_run(path: str, skip_seconds: float = 0.0) -> Dict:
+    """
+    Сводка прогона
+
+    Args:
+        path: Файл прогона
+        skip_seconds: Первые секунды прогона (прогрев), не входящие в сводку
+    """
+    config: Dict = {}
+    summary = None
+    seconds = sent = acked = failed = 0
+    target_sum = 0.0
+    shortfall_seconds = 0
+    first_t = last_t = None
+    ack_latency = QuantileSketch()
+    batch_latency = QuantileSketch()
+    worst_interval = {'p99': None, 't': None}
+    errors: Dict[str, int] = {}
+
+    for record in read_run(path):
+        kind = record.get('type')
+        if kind == 'config':
+            config = record
+        elif kind == 'second':
+            if record['t'] < skip_seconds:
+                continue
+            seconds += 1
+            sent += record['sent']
+            acked += record['acked']
+            failed += record['failed']
+            target_sum += record['target']
+            if record['sent'] < 0.95 * record['target']:
+                shortfall_seconds += 1
+            first_t = record['t'] if first_t is None else first_t
+            last_t = record['t']
+        elif kind == 'snapshot':
+            # Снимок, целиком попавший в прогрев, не учитывается
+            if record['t'] <= skip_seconds:
+                continue
+            snapshot = QuantileSketch.from_dict(record['ack_latency'])
+            ack_latency.merge(snapshot)
+            batch_latency.merge(QuantileSketch.from_dict(record['batch_latency']))
+            p99 = snapshot.quantile(0.99)
+            if p99 is not None and (worst_interval['p99'] is None or p99 > worst_interval['p99']):
+                worst_interval = {'p99': p99, 't': record['t']}
+            for message, count in record['errors'].items():
+                errors[message] = errors.get(message, 0) + count
+        elif kind == 'summary':
+            summary = record
+
+    duration = (last_t - first_t + 1) if seconds else 0.0
+    return {
+        'path': path,
+        'config': {k: v for k, v in config.items() if k not in VOLATILE_CONFIG},
+        'complete': summary is not None,
+        'duration_seconds': duration,
+        'seconds': seconds,
+        'target_rate': target_sum / seconds if seconds else 0.0,
+        'sent_rate': sent / duration if duration else 0.0,
+        'achieved_rate': acked / duration if duration else 0.0,
+        'shortfall_fraction': shortfall_seconds / seconds if seconds else 0.0,
+        'error_rate': failed / (acked + failed) if acked + failed else 0.0,
+        'ack_latency_ms': {name: ack_latency.quantile(q) for name, q in QUANTILES.items()},
+        'batch_latency_p99_ms': batch_latency.quantile(0.99),
+        'worst_interval_p99_ms': worst_interval['p99'],
+        'worst_interval_t': worst_interval['t'],
+        'errors': dict(sorted(errors.items(), key=lambda item: -item[1])[:10]),
+    }
+
+
+def config_diff(base: Dict, other: Dict) -> Dict:
+    """Различающиеся поля конфигурации: поле -> (baseline, прогон)"""
+    keys = set(base) | set(other)
+    return {k: (base.get(k), other.get(k)) for k in sorted(keys) if base.get(k) != other.get(k)}
+
+
+def compare(base: Dict, run: Dict, max_throughput_drop: float, max_latency_increase: float,
+            max_error_rate_increase: float) -> List[Dict]:
+    """Регрессии прогона относительно baseline"""
+    regressions = []
+
+    def check(metric: str, base_value, value, limit: float, higher_is_better: bool):
+        if not base_value or value is None:
+            return
+        change = (value - base_value) / base_value
+        if (-change if higher_is_better else change) > limit:
+            regressions.append({'metric': metric, 'baseline': base_value, 'current': value, 'change': change})
+
+    check('achieved_rate', base['achieved_rate'], run['achieved_rate'], max_throughput_drop, True)
+    for name in ('p99', 'p999'):
+        check(f'ack_latency_{name}_ms', base['ack_latency_ms'][name], run['ack_latency_ms'][name],
+              max_latency_increase, False)
+    check('worst_interval_p99_ms', base['worst_interval_p99_ms'], run['worst_interval_p99_ms'],
+          max_latency_increase, False)
+    if run['error_rate'] - base['error_rate'] > max_error_rate_increase:
+        regressions.append({'metric': 'error_rate', 'baseline': base['error_rate'], 'current': run['error_rate'],
+                            'change': None})
+    return regressions
+
+
+def _fmt(value, pattern: str = '.2f') -> str:
+    return '-' if value is None else format(value, pattern)
+
+
+def format_report(runs: List[Dict], comparisons: List[Dict]) -> str:
+    lines = [
+        "| Прогон | Длительность, с | Цель, ev/s | Подтверждено, ev/s | Секунд с недобором | Ошибки | "
+        "ack p50, мс | ack p99, мс | ack p99.9, мс | Худший p99 интервала, мс |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for run in runs:
+        latency = run['ack_latency_ms']
+        name = run['path'] + ('' if run['complete'] else ' (прерван)')
+        lines.append(
+            f"| {name} | {run['duration_seconds']:.0f} | {run['target_rate']:.0f} | {run['achieved_rate']:.0f} | "
+            f"{run['shortfall_fraction']:.1%} | {run['error_rate']:.3%} | {_fmt(latency['p50'])} | "
+            f"{_fmt(latency['p99'])} | {_fmt(latency['p999'])} | {_fmt(run['worst_interval_p99_ms'])} |"
+        )
+    for comparison in comparisons:
+        lines.append(f"\n#### {comparison['path']} относительно {runs[0]['path']}\n")
+        for key, (base_value, value) in comparison['config_diff'].items():
+            lines.append(f"- конфигурация `{key}`: {base_value} -> {value}")
+        if not comparison['regressions']:
+            lines.append("- регрессий нет")
+        for r in comparison['regressions']:
+            change = f" ({r['change']:+.1%})" if r['change'] is not None else ""
+            lines.append(f"- регрессия `{r['metric']}`: {r['baseline']:.4g} -> {r['current']:.4g}{change}")
+    for run in runs:
+        if run['errors']:
+            lines.append(f"\nОшибки {run['path']}:")
+            lines.extend(f"- {message}: {count}" for message, count in run['errors'].items())
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка и сравнение записанных прогонов генератора нагрузки")
+    parser.add_argument("runs", nargs="+", help="Файлы прогонов; первый - baseline для остальных")
+    parser.add_argument("--skip-seconds", type=float, default=0.0, help="Не учитывать первые секунды (прогрев)")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.05,
+                        help="Допустимое снижение подтвержденной скорости (доля)")
+    parser.add_argument("--max-latency-increase", type=float, default=0.2,
+                        help="Допустимый рост p99/p99.9 задержки подтверждений (доля)")
+    parser.add_argument("--max-error-rate-increase", type=float, default=0.001,
+                        help="Допустимый рост доли ошибок (абсолютный)")
+    parser.add_argument("--output", help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    runs = [load_run(path, args.skip_seconds) for path in args.runs]
+    comparisons = []
+    for run in runs[1:]:
+        comparisons.append({
+            'path': run['path'],
+            'config_diff': config_diff(runs[0]['config'], run['config']),
+            'regressions': compare(runs[0], run, args.max_throughput_drop, args.max_latency_increase,
+                                   args.max_error_rate_increase),
+        })
+
+    report = format_report(runs, comparisons)
+    print(report)
+    if args.output:
+        with open(f"{args.output}.json", "w") as f:
+            json.dump({'runs': runs, 'comparisons': comparisons}, f, indent=2, ensure_ascii=False)
+        with open(f"{args.output}.md", "w") as f:
+            f.write(f"# Прогоны генератора нагрузки\n\n{report}\n")
+        print(f"\nОтчет сохранен в {args.output}.json и {args.output}.md")
+
+    if any(c['regressions'] for c in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Потоковый квантильный скетч (в стиле DDSketch)
+Значения раскладываются по логарифмическим корзинам с гарантированной относительной точностью,
+добавление выполняется за O(1), скетчи разных экземпляров генератора можно объединять
+"""
+import json
+import math
+from typing import Dict, Optional
+
+
+class QuantileSketch:
+    """Объединяемый квантильный скетч с относительной точностью relative_accuracy"""
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048,
+                 min_value: float = 1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        # Значения меньше min_value (в т.ч. нули) считаются отдельно
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, weight: int = 1):
+        """
+        Добавление значения
+
+        Значения меньше min_value (нули и отрицательные) считаются в zero_count: квантили,
+        попадающие на них, равны 0. Сумма, минимум и максимум учитывают исходное значение,
+        поэтому mean и quantile(0) могут быть отрицательными
+        """
+        if value < self.min_value:
+            self.zero_count += weight
+        else:
+            key = self._key(value)
+            self.buckets[key] = self.buckets.get(key, 0) + weight
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _collapse(self):
+        """Слияние самых нижних корзин, чтобы ограничить память (точность сохраняется для верхних квантилей)"""
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.buckets[target] += self.buckets.pop(key)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Значение квантиля q (0-1) или None для пустого скетча"""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Середина корзины (gamma^(k-1), gamma^k] с относительной ошибкой <= relative_accuracy
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def merge(self, other: 'QuantileSketch'):
+        """Объединение с другим скетчем той же точности"""
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, bucket_count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + bucket_count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def clear(self):
+        """Сброс скетча (для оконных метрик)"""
+        self.buckets.clear()
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def to_dict(self) -> Dict:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            'min_value': self.min_value,
+            'buckets': {str(k): v for k, v in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuantileSketch':
+        sketch = cls(data['relative_accuracy'], data.get('max_buckets', 2048), data.get('min_value', 1e-9))
+        sketch.buckets = {int(k): int(v) for k, v in data['buckets'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, payload: str) -> 'QuantileSketch':
+        return cls.from_dict(json.loads(payload))
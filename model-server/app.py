@@ -1,6 +1,9 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import redis
 import json
+import os
+import threading
 import time
 import logging
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, REGISTRY, CONTENT_TYPE_LATEST
@@ -10,7 +13,16 @@ from fastapi.responses import Response
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Остаток буфера журнала предсказаний дописывается при остановке
+    if prediction_stream:
+        prediction_stream.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Prometheus метрики
 PREDICTION_COUNTER = Counter('model_predictions_total', 'Total number of predictions', ['status'])
@@ -20,16 +32,100 @@ PREDICTION_LATENCY = Histogram(
     buckets=[0.001, 0.002, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.2, 0.5, 1.0]
 )
 PREDICTION_RISK_SCORE = Gauge('model_prediction_risk_score', 'Latest prediction risk score')
+PREDICTION_LOG_DROPPED = Counter('model_prediction_log_dropped_total', 'Predictions not written to the Redis stream')
+
+# Журнал предсказаний: lists - списки patient:{id}:predictions, stream - общий Redis Stream, both - оба
+PREDICTION_LOG_MODE = os.getenv('PREDICTION_LOG_MODE', 'lists')
+
+
+class PredictionStreamWriter:
+    """
+    Журнал предсказаний в Redis Stream для чтения группами потребителей (XREADGROUP/XACK)
+
+    Запрос только добавляет запись в буфер. Фоновый поток добавляет записи в поток пачками XADD
+    через pipeline: при batch_size записях или раз в flush_interval секунд. Длина потока
+    ограничивается приблизительно (MAXLEN ~), чтобы Redis обрезал его целыми узлами.
+    Если Redis недоступен, буфер не растет больше max_buffer записей, лишние отбрасываются
+    """
+
+    def __init__(self, client: redis.Redis, stream: str, maxlen: int, batch_size: int = 100,
+                 flush_interval: float = 0.5, max_buffer: int = 10000):
+        self.client = client
+        self.stream = stream
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._batch_ready = threading.Event()
+        self._stop = threading.Event()
+        # Пишет только этот поток, поэтому пачки попадают в поток в порядке предсказаний
+        self._thread = threading.Thread(target=self._flush_loop, name='prediction-stream-flush', daemon=True)
+        self._thread.start()
+
+    def append(self, record: dict):
+        data = json.dumps(record)
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                PREDICTION_LOG_DROPPED.inc()
+                return
+            self._buffer.append(data)
+            if len(self._buffer) >= self.batch_size:
+                self._batch_ready.set()
+
+    def _write(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for data in batch:
+            pipe.xadd(self.stream, {'data': data}, maxlen=self.maxlen, approximate=True)
+        try:
+            pipe.execute()
+        except redis.RedisError as e:
+            PREDICTION_LOG_DROPPED.inc(len(batch))
+            logger.error(f"Prediction stream write error: {e}")
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._batch_ready.wait(self.flush_interval)
+            self._batch_ready.clear()
+            try:
+                self._write()
+            except Exception:
+                # Поток должен пережить любую ошибку, иначе журнал перестанет писаться до перезапуска
+                logger.exception("Prediction stream flush failed")
+
+    def close(self):
+        """Остановка фонового потока и запись остатка буфера"""
+        self._stop.set()
+        self._batch_ready.set()
+        self._thread.join()
+        self._write()
+
 
 # Подключение к Redis
 try:
-    redis_client = redis.Redis(host='redis', port=6379, decode_responses=True, socket_connect_timeout=5)
+    redis_client = redis.Redis(host=os.getenv('REDIS_HOST', 'redis'), port=int(os.getenv('REDIS_PORT', '6379')), decode_responses=True, socket_connect_timeout=5)
     redis_client.ping()
     logger.info("Successfully connected to Redis")
 except redis.ConnectionError as e:
     logger.error(f"Redis connection error: {e}")
     redis_client = None
 
+prediction_stream = None
+if redis_client and PREDICTION_LOG_MODE in ('stream', 'both'):
+    prediction_stream = PredictionStreamWriter(
+        redis_client,
+        stream=os.getenv('PREDICTION_STREAM', 'predictions'),
+        maxlen=int(os.getenv('PREDICTION_STREAM_MAXLEN', '100000')),
+        batch_size=int(os.getenv('PREDICTION_STREAM_BATCH', '100')),
+        flush_interval=float(os.getenv('PREDICTION_STREAM_FLUSH_INTERVAL', '0.5'))
+    )
+
+
 @app.get("/health")
 async def health():
     redis_status = "connected" if redis_client and redis_client.ping() else "disconnected"
@@ -58,9 +154,12 @@ async def predict(features: dict):
                 'risk_score': risk_score,
                 'timestamp': time.time()
             }
-            patient_id = features.get('patient_id', 'unknown')
-            redis_client.lpush(f"patient:{patient_id}:predictions", json.dumps(feature_record))
-            redis_client.ltrim(f"patient:{patient_id}:predictions", 0, 99)
+            if PREDICTION_LOG_MODE in ('lists', 'both'):
+                patient_id = features.get('patient_id', 'unknown')
+                redis_client.lpush(f"patient:{patient_id}:predictions", json.dumps(feature_record))
+                redis_client.ltrim(f"patient:{patient_id}:predictions", 0, 99)
+            if prediction_stream:
+                prediction_stream.append(feature_record)
         
         # Обновление метрик
         PREDICTION_COUNTER.labels(status='success').inc()
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Герметичный бенчмарк /predict model-server
+Запускает app.py в процессе бенчмарка (ASGI без сети) или под uvicorn на 127.0.0.1, Redis заменяется
+fakeredis в отдельном процессе. Прогоняет фиксированные нагрузки (single, concurrent, batch),
+сравнивает запросы в секунду, p50/p99 и память на запрос с сохраненным baseline и завершается
+с кодом 1 при регрессии больше порога
+
+Kafka и доступ в сеть не нужны
+"""
+import argparse
+import asyncio
+import csv
+import gc
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA = os.path.join(APP_DIR, '..', 'data', 'hospital_readmissions_30k.csv')
+DEFAULT_BASELINE = os.path.join(APP_DIR, 'benchmark_baseline.json')
+
+# Фиксированные нагрузки: batch - пачки одновременных запросов, следующая пачка после ответа на всю предыдущую
+WORKLOADS = {
+    'single': {'requests': 2000, 'concurrency': 1, 'batch_size': 1},
+    'concurrent': {'requests': 4000, 'concurrency': 32, 'batch_size': 1},
+    'batch': {'requests': 4000, 'concurrency': 1, 'batch_size': 100},
+}
+
+# Метрики под контролем регрессий: True - больше значит лучше
+GATED_METRICS = {
+    'requests_per_second': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'memory_per_request_bytes': False,
+}
+
+# Замер памяти - отдельный проход фиксированной длины: пик включает мусор, ожидающий сборщика,
+# поэтому он сравним с baseline только при одинаковом числе запросов
+MEMORY_PASS_REQUESTS = 1000
+
+# Изменения памяти меньше этого порога не считаются регрессией (гранулярность аллокатора и страниц)
+MEMORY_NOISE_BYTES = 1024
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Процесс завершился с кодом {process.returncode} до открытия порта {port}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Порт {port} не открылся за {timeout:.0f} с")
+
+
+def start_fake_redis(port: int) -> subprocess.Popen:
+    """fakeredis в отдельном процессе, чтобы его память и CPU не попадали в замеры приложения"""
+    code = ("import sys; from fakeredis import TcpFakeServer; "
+            "TcpFakeServer(('127.0.0.1', int(sys.argv[1]))).serve_forever()")
+    process = subprocess.Popen([sys.executable, '-c', code, str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port, process)
+    return process
+
+
+def load_payloads(path: str, count: int) -> List[Dict]:
+    """Записи пациентов из локального датасета в формате запроса /predict (без целевой переменной)"""
+    payloads = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            row.pop('readmitted_30_days', None)
+            for field in ('age', 'cholesterol', 'medication_count', 'length_of_stay'):
+                row[field] = int(row[field])
+            row['bmi'] = float(row['bmi'])
+            payloads.append(row)
+            if len(payloads) >= count:
+                break
+    if not payloads:
+        raise ValueError(f"В {path} нет записей")
+    return payloads
+
+
+def read_rss(pid: int) -> Dict[str, int]:
+    """Текущий и пиковый RSS процесса в байтах из /proc"""
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0]) * 1024
+    return values
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """Сброс VmHWM (Linux 4.0+), чтобы пик считался только по текущей нагрузке"""
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def drive(client: httpx.AsyncClient, payloads: List[Dict], requests: int, concurrency: int,
+                batch_size: int) -> Dict:
+    """Выполняет нагрузку и возвращает задержки запросов (с) и число ошибок"""
+    latencies: List[float] = []
+    errors = 0
+
+    async def call(payload: Dict):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            response = await client.post('/predict', json=payload)
+        except httpx.TransportError:
+            errors += 1
+            return
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200 or 'error' in response.json():
+            errors += 1
+
+    started = time.perf_counter()
+    if batch_size > 1:
+        for offset in range(0, requests, batch_size):
+            await asyncio.gather(*(call(payloads[i % len(payloads)])
+                                   for i in range(offset, min(offset + batch_size, requests))))
+    else:
+        counter = iter(range(requests))
+
+        async def worker():
+            for i in counter:
+                await call(payloads[i % len(payloads)])
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {'elapsed': time.perf_counter() - started, 'latencies': latencies, 'errors': errors}
+
+
+def summarize_pass(result: Dict) -> Dict:
+    latencies = sorted(result['latencies'])
+    return {
+        'requests_per_second': len(latencies) / result['elapsed'],
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': result['errors'],
+    }
+
+
+class InProcessTarget:
+    """app.py в процессе бенчмарка через ASGI транспорт httpx"""
+
+    name = 'inprocess'
+
+    def __init__(self):
+        if APP_DIR not in sys.path:
+            sys.path.insert(0, APP_DIR)
+        import app as app_module
+        if app_module.redis_client is None:
+            raise RuntimeError("model-server не подключился к Redis")
+        # Логи каждого предсказания форматируются как в сервисе, но не выводятся в консоль
+        self.devnull = open(os.devnull, 'w')
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, logging.StreamHandler):
+                handler.setStream(self.devnull)
+        self.app = app_module.app
+
+    def client(self, limit: int) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url='http://model-server')
+
+    def memory_pass(self, payloads: List[Dict], spec: Dict, requests: int) -> Dict:
+        """Пик выделенной Python памяти сверх исходной на один одновременный запрос (tracemalloc)"""
+        async def measured():
+            async with self.client(max(spec['concurrency'], spec['batch_size'])) as client:
+                # Клиент и его соединения создаются до замера
+                await drive(client, payloads, 10, 1, 1)
+                gc.collect()
+                start = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await drive(client, payloads, requests, spec['concurrency'], spec['batch_size'])
+                return (start, *tracemalloc.get_traced_memory())
+
+        tracemalloc.start()
+        try:
+            before, current, peak = asyncio.run(measured())
+        finally:
+            tracemalloc.stop()
+        in_flight = max(spec['concurrency'], spec['batch_size'])
+        return {
+            'memory_per_request_bytes': (peak - before) / in_flight,
+            'retained_per_request_bytes': (current - before) / requests,
+        }
+
+    async def _drive(self, payloads: List[Dict], spec: Dict, requests: int) -> Dict:
+        async with self.client(max(spec['concurrency'], spec['batch_size'])) as client:
+            return await drive(client, payloads, requests, spec['concurrency'], spec['batch_size'])
+
+    def run(self, payloads: List[Dict], spec: Dict, requests: int) -> Dict:
+        return asyncio.run(self._drive(payloads, spec, requests))
+
+    def close(self):
+        self.devnull.close()
+
+
+class UvicornTarget(InProcessTarget):
+    """app.py под uvicorn (как в контейнере) на локальном порту"""
+
+    name = 'uvicorn'
+
+    def __init__(self, env: Dict[str, str]):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(self.port),
+             '--log-level', 'warning'],
+            cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_port(self.port, self.process)
+
+    def client(self, limit: int) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url=f'http://127.0.0.1:{self.port}',
+                                 limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit))
+
+    def memory_pass(self, payloads: List[Dict], spec: Dict, requests: int) -> Dict:
+        """Рост пикового RSS процесса uvicorn на один одновременный запрос"""
+        before = read_rss(self.process.pid)['VmRSS']
+        if not reset_peak_rss(self.process.pid):
+            return {}
+        self.run(payloads, spec, requests)
+        after = read_rss(self.process.pid)
+        in_flight = max(spec['concurrency'], spec['batch_size'])
+        return {
+            'memory_per_request_bytes': max(0, after['VmHWM'] - before) / in_flight,
+            'retained_per_request_bytes': (after['VmRSS'] - before) / requests,
+        }
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def benchmark(target, payloads: List[Dict], workloads: Dict[str, Dict], repeats: int, warmup: int,
+              scale: float) -> Dict[str, Dict]:
+    """Прогоняет нагрузки repeats раз и берет медиану каждой метрики по повторам"""
+    target.run(payloads, WORKLOADS['single'], warmup)
+    results = {}
+    for name, spec in workloads.items():
+        requests = max(1, int(spec['requests'] * scale))
+        passes = []
+        for repeat in range(repeats):
+            passes.append(summarize_pass(target.run(payloads, spec, requests)))
+            print(f"  {target.name}/{name} #{repeat + 1}: {passes[-1]['requests_per_second']:.0f} req/s, "
+                  f"p99 {passes[-1]['p99_ms']:.2f} мс")
+        metrics = {key: statistics.median(p[key] for p in passes) for key in passes[0]}
+        metrics['errors'] = sum(p['errors'] for p in passes)
+        metrics.update(target.memory_pass(payloads, spec, MEMORY_PASS_REQUESTS))
+        metrics.update({'requests': requests, 'repeats': repeats, **spec})
+        results[name] = metrics
+    return results
+
+
+def environment_info() -> Dict:
+    import fastapi
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'fastapi': fastapi.__version__,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Сравнение с baseline: список метрик с изменением хуже порога"""
+    regressions = []
+    for workload, metrics in results.items():
+        base = baseline.get(workload)
+        if not base:
+            continue
+        for metric, higher_is_better in GATED_METRICS.items():
+            if metric not in metrics or not base.get(metric):
+                continue
+            change = (metrics[metric] - base[metric]) / base[metric]
+            worse = -change if higher_is_better else change
+            if metric == 'memory_per_request_bytes' and metrics[metric] - base[metric] < MEMORY_NOISE_BYTES:
+                continue
+            if worse > threshold:
+                regressions.append({'workload': workload, 'metric': metric, 'baseline': base[metric],
+                                    'current': metrics[metric], 'change': change})
+        if metrics.get('errors'):
+            regressions.append({'workload': workload, 'metric': 'errors', 'baseline': base.get('errors', 0),
+                                'current': metrics['errors'], 'change': None})
+    return regressions
+
+
+def format_report(mode: str, results: Dict[str, Dict], baseline: Dict[str, Dict]) -> str:
+    lines = [
+        f"| Режим | Нагрузка | req/s | p50, мс | p99, мс | Память на запрос, КБ | Удержано на запрос, Б | Ошибки |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for workload, m in results.items():
+        base = baseline.get(workload, {})
+
+        def cell(metric, fmt, scale=1.0):
+            if metric not in m:
+                return "-"
+            text = format(m[metric] * scale, fmt)
+            if base.get(metric):
+                text += f" ({(m[metric] - base[metric]) / base[metric]:+.0%})"
+            return text
+
+        lines.append(f"| {mode} | {workload} | {cell('requests_per_second', '.0f')} | {cell('p50_ms', '.2f')} | "
+                     f"{cell('p99_ms', '.2f')} | {cell('memory_per_request_bytes', '.1f', 1 / 1024)} | "
+                     f"{m.get('retained_per_request_bytes', 0):.0f} | {m['errors']} |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Герметичный бенчмарк /predict model-server")
+    parser.add_argument("--mode", choices=['inprocess', 'uvicorn'], default='inprocess',
+                        help="inprocess - ASGI без сети, uvicorn - отдельный процесс на 127.0.0.1")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="Нагрузки через запятую")
+    parser.add_argument("--repeats", type=int, default=3, help="Повторов каждой нагрузки (берется медиана)")
+    parser.add_argument("--warmup", type=int, default=200, help="Запросов прогрева")
+    parser.add_argument("--scale", type=float, default=1.0, help="Множитель числа запросов в нагрузках")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="CSV с записями пациентов для запросов")
+    parser.add_argument("--redis-host", help="Локальный redis-server вместо fakeredis")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Файл baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимое ухудшение метрики относительно baseline (доля)")
+    parser.add_argument("--update-baseline", action="store_true", help="Записать результаты в baseline")
+    parser.add_argument("--output", help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    workloads = {name: WORKLOADS[name] for name in args.workloads.split(",")}
+    payloads = load_payloads(args.data, 1000)
+
+    redis_process = None
+    if args.redis_host:
+        redis_host, redis_port = args.redis_host, args.redis_port
+    elif FAKEREDIS_AVAILABLE:
+        redis_host, redis_port = '127.0.0.1', free_port()
+        redis_process = start_fake_redis(redis_port)
+    else:
+        sys.exit("Нужен fakeredis (pip install fakeredis) или локальный redis-server (--redis-host)")
+    env = {**os.environ, 'REDIS_HOST': redis_host, 'REDIS_PORT': str(redis_port)}
+    os.environ.update(env)
+
+    target = None
+    try:
+        target = InProcessTarget() if args.mode == 'inprocess' else UvicornTarget(env)
+        results = benchmark(target, payloads, workloads, args.repeats, args.warmup, args.scale)
+    finally:
+        if target:
+            target.close()
+        if redis_process:
+            redis_process.terminate()
+            redis_process.wait()
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    baseline = stored.get('results', {}).get(args.mode, {})
+    environment = environment_info()
+
+    report = format_report(args.mode, results, baseline)
+    print("\n" + report)
+    regressions = compare(results, baseline, args.threshold)
+
+    if baseline and stored.get('environment') != environment:
+        print(f"\nВнимание: baseline снят в другом окружении ({stored.get('environment')}), "
+              f"сравнение ориентировочное")
+
+    if args.output:
+        with open(f"{args.output}.json", "w") as f:
+            json.dump({'mode': args.mode, 'environment': environment, 'results': results,
+                       'regressions': regressions}, f, indent=2, ensure_ascii=False)
+        with open(f"{args.output}.md", "w") as f:
+            f.write(f"# Бенчмарк model-server /predict\n\n{report}\n")
+
+    if args.update_baseline:
+        stored.setdefault('results', {})[args.mode] = results
+        stored['environment'] = environment
+        stored['updated_at'] = datetime.now().isoformat()
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline обновлен: {args.baseline}")
+        return
+
+    if not baseline:
+        print(f"\nBaseline для режима {args.mode} не найден, сохраните его через --update-baseline")
+        return
+    if regressions:
+        print(f"\nРегрессии больше {args.threshold:.0%}:")
+        for r in regressions:
+            change = f"{r['change']:+.0%}" if r['change'] is not None else ""
+            print(f"- {r['workload']}/{r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} {change}")
+        sys.exit(1)
+    print(f"\nРегрессий больше {args.threshold:.0%} нет")
+
+
+if __name__ == "__main__":
+    main()
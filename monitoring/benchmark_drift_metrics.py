@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Сравнение векторизованных метрик drift (drift_metrics.py) с Evidently DataDriftTable
+по скорости и согласованности решений о drift по колонкам на датасете 30k
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+from drift_metrics import compute_drift_metrics, drift_summary, prepare_features
+
+try:
+    from evidently.report import Report
+    from evidently.metrics import DataDriftTable
+    EVIDENTLY_AVAILABLE = True
+except ImportError:
+    EVIDENTLY_AVAILABLE = False
+
+
+def timed(func: Callable, repeats: int):
+    """Медианное время выполнения и результат последнего запуска"""
+    durations = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations)), result
+
+
+def evidently_drift(reference: pd.DataFrame, current: pd.DataFrame) -> Dict[str, bool]:
+    """Решения Evidently о drift по колонкам"""
+    report = Report(metrics=[DataDriftTable()])
+    report.run(reference_data=reference, current_data=current)
+    result = report.as_dict()['metrics'][0]['result']
+    return {col: bool(info['drift_detected']) for col, info in result['drift_by_columns'].items()}
+
+
+def inject_drift(data: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
+    """Сдвиг части признаков для проверки согласованности на данных с drift"""
+    rng = np.random.default_rng(seed)
+    drifted = data.copy()
+    drifted['age'] = drifted['age'] + 8
+    drifted['bmi'] = drifted['bmi'] * rng.normal(1.15, 0.05, len(drifted))
+    mask = rng.random(len(drifted)) < 0.3
+    drifted.loc[mask, 'discharge_destination'] = 'Home'
+    return drifted
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк векторизованных метрик drift против Evidently")
+    parser.add_argument("--data", default="../data/hospital_readmissions_30k.csv", help="CSV с данными")
+    parser.add_argument("--repeats", type=int, default=5, help="Количество повторов для замера времени")
+    parser.add_argument("--output", default="drift_metrics_benchmark.json", help="Файл с результатами")
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data)
+    half = len(data) // 2
+    reference, current = data.iloc[:half], data.iloc[half:]
+    scenarios = {'no_drift': current, 'injected_drift': inject_drift(current)}
+
+    results = []
+    print(f"{'Сценарий':<16s} | {'Векторизованно, c':>18s} | {'Evidently, c':>13s} | {'Ускорение':>10s} | {'Согласие':>9s}")
+    print("-" * 80)
+    for name, scenario in scenarios.items():
+        vector_time, metrics = timed(lambda: compute_drift_metrics(reference, scenario), args.repeats)
+        entry = {
+            'scenario': name,
+            'rows': {'reference': len(reference), 'current': len(scenario)},
+            'vectorized_seconds': vector_time,
+            'vectorized_summary': drift_summary(metrics),
+        }
+        line = f"{name:<16s} | {vector_time:>18.4f} | "
+        if EVIDENTLY_AVAILABLE:
+            # Evidently получает те же подготовленные признаки (blood_pressure разобран на два числа)
+            ref_features, cur_features = prepare_features(reference), prepare_features(scenario)
+            evidently_time, evidently = timed(lambda: evidently_drift(ref_features, cur_features), args.repeats)
+            common = [c for c in metrics.index if c in evidently]
+            agreement = float(np.mean([bool(metrics.loc[c, 'drifted']) == evidently[c] for c in common])) if common else 0.0
+            entry.update({
+                'evidently_seconds': evidently_time,
+                'speedup': evidently_time / vector_time if vector_time > 0 else None,
+                'agreement': agreement,
+                'disagreements': [c for c in common if bool(metrics.loc[c, 'drifted']) != evidently[c]],
+            })
+            line += f"{evidently_time:>13.4f} | {entry['speedup']:>9.1f}x | {agreement:>8.0%}"
+        else:
+            line += f"{'N/A':>13s} | {'N/A':>10s} | {'N/A':>9s}"
+        print(line)
+        results.append(entry)
+
+    if not EVIDENTLY_AVAILABLE:
+        print("\nEvidently не установлен: замерена только векторизованная реализация")
+
+    with open(args.output, "w") as f:
+        json.dump({'results': results}, f, indent=2, default=str)
+    print(f"\nРезультаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
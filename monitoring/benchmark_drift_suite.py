@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк детекции drift в DataDriftMonitor на размерах окон от 1k до 10M строк
+В текущие окна, выбранные из второй половины hospital_readmissions_30k.csv, внедряется
+контролируемый drift (сдвиг среднего, изменение дисперсии, смена долей категорий, пропуски)
+разной величины. Для каждого пути детекции (Evidently, _simple_drift_detection и векторизованные
+метрики) измеряются задержка, пропускная способность, пиковая память и точность детекции
+
+Работает без сети: push в Prometheus заменен заглушкой
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import logging
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+import data_drift_monitor
+from data_drift_monitor import DataDriftMonitor, EVIDENTLY_AVAILABLE
+from dataset_loader import load_dataset
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_TARGETS = ['age', 'bmi', 'cholesterol', 'length_of_stay']
+CATEGORICAL_TARGETS = ['gender', 'discharge_destination', 'diabetes']
+DRIFT_TYPES = ['mean_shift', 'variance_change', 'category_mix', 'missing_values']
+
+
+class OfflineMonitor(DataDriftMonitor):
+    """Монитор без выгрузки метрик: push только подсчитывается"""
+
+    def __init__(self):
+        super().__init__(redis_client=None, prometheus_gateway='offline', export_mode='push')
+        self.pushes = 0
+
+    def push_metrics(self):
+        self.pushes += 1
+
+
+def inject_drift(window: pd.DataFrame, drift_type: str, magnitude: float,
+                 reference: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Внедрение drift в окно
+
+    mean_shift: числовые признаки сдвигаются на magnitude стандартных отклонений референса
+    variance_change: отклонения от среднего растягиваются в (1 + magnitude) раз
+    category_mix: доля magnitude значений категориальных признаков заменяется самой редкой категорией
+    missing_values: доля magnitude значений целевых признаков заменяется пропусками
+    """
+    if magnitude == 0:
+        return window
+    drifted = window.copy()
+    if drift_type in ('mean_shift', 'variance_change'):
+        for col in NUMERIC_TARGETS:
+            values = drifted[col].to_numpy(dtype=np.float64)
+            mean, std = float(reference[col].mean()), float(reference[col].std())
+            if drift_type == 'mean_shift':
+                drifted[col] = values + magnitude * std
+            else:
+                drifted[col] = mean + (values - mean) * (1 + magnitude)
+    elif drift_type == 'category_mix':
+        for col in CATEGORICAL_TARGETS:
+            rare = reference[col].value_counts().index[-1]
+            mask = rng.random(len(drifted)) < magnitude
+            values = drifted[col].astype(object).to_numpy(copy=True)
+            values[mask] = rare
+            drifted[col] = pd.Series(values, index=drifted.index).astype(reference[col].dtype)
+    elif drift_type == 'missing_values':
+        for col in NUMERIC_TARGETS + CATEGORICAL_TARGETS:
+            mask = rng.random(len(drifted)) < magnitude
+            if isinstance(drifted[col].dtype, pd.CategoricalDtype):
+                drifted[col] = drifted[col].mask(mask)
+            else:
+                drifted[col] = drifted[col].astype(np.float64).mask(mask)
+    else:
+        raise ValueError(f"Unknown drift type: {drift_type}")
+    return drifted
+
+
+def detection_paths(monitor: OfflineMonitor) -> Dict[str, Callable[[pd.DataFrame], Dict]]:
+    paths = {
+        'simple': monitor._simple_drift_detection,
+        'vectorized': monitor.monitor_feature_drift,
+    }
+    if EVIDENTLY_AVAILABLE:
+        paths['evidently'] = monitor.monitor_data_drift
+    return paths
+
+
+def measure(detect: Callable[[pd.DataFrame], Dict], window: pd.DataFrame) -> Dict:
+    """
+    Задержка, пропускная способность и пиковая память одного вызова детекции
+
+    Память замеряется отдельным повторным вызовом: трассировка выделений замедляет код в разы
+    """
+    start = time.perf_counter()
+    result = detect(window)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    detect(window)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'latency_seconds': elapsed,
+        'throughput_rows_per_sec': len(window) / elapsed if elapsed > 0 else None,
+        'peak_memory_mb': peak / 2 ** 20,
+        'drift_score': float(result.get('drift_score', 0.0)),
+        'detected': bool(result.get('drift_detected', False)),
+        'error': result.get('error'),
+    }
+
+
+def accuracy(results: List[Dict]) -> Dict[str, Dict]:
+    """Доля верных решений по путям: recall на окнах с drift и false positive rate на контрольных"""
+    summary = {}
+    for path in sorted({r['path'] for r in results}):
+        rows = [r for r in results if r['path'] == path and not r.get('error')]
+        drifted = [r for r in rows if r['magnitude'] > 0]
+        control = [r for r in rows if r['magnitude'] == 0]
+        summary[path] = {
+            'recall': float(np.mean([r['detected'] for r in drifted])) if drifted else None,
+            'false_positive_rate': float(np.mean([r['detected'] for r in control])) if control else None,
+            'recall_by_type': {
+                t: float(np.mean([r['detected'] for r in drifted if r['drift_type'] == t]))
+                for t in DRIFT_TYPES if any(r['drift_type'] == t for r in drifted)
+            },
+        }
+    return summary
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк скорости и точности детекции drift")
+    parser.add_argument("--data", default="../data/hospital_readmissions_30k.csv", help="CSV с данными")
+    parser.add_argument("--window-sizes", default="1000,10000,100000,1000000,10000000",
+                        help="Размеры окон через запятую")
+    parser.add_argument("--magnitudes", default="0,0.1,0.25,0.5", help="Величины drift через запятую (0 - контроль)")
+    parser.add_argument("--drift-types", default=",".join(DRIFT_TYPES), help="Типы drift через запятую")
+    parser.add_argument("--evidently-max-rows", type=int, default=100000,
+                        help="Наибольшее окно для Evidently (полный отчет на 10M строк занимает часы)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора случайных чисел")
+    parser.add_argument("--output", default="drift_suite_benchmark", help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    window_sizes = [int(v) for v in args.window_sizes.split(',')]
+    magnitudes = [float(v) for v in args.magnitudes.split(',')]
+    drift_types = args.drift_types.split(',')
+    rng = np.random.default_rng(args.seed)
+
+    data = load_dataset(args.data)
+    half = len(data) // 2
+    reference, pool = data.iloc[:half].reset_index(drop=True), data.iloc[half:].reset_index(drop=True)
+    monitor = OfflineMonitor()
+    monitor.set_reference_data(reference)
+    paths = detection_paths(monitor)
+
+    results = []
+    for size in window_sizes:
+        base = pool.iloc[rng.integers(0, len(pool), size)].reset_index(drop=True)
+        for drift_type in drift_types:
+            for magnitude in magnitudes:
+                if magnitude == 0 and drift_type != drift_types[0]:
+                    continue  # Контрольное окно без drift одно на размер
+                window = inject_drift(base, drift_type, magnitude, reference, rng)
+                for path, detect in paths.items():
+                    if path == 'evidently' and size > args.evidently_max_rows:
+                        continue
+                    row = {'path': path, 'window_size': size,
+                           'drift_type': drift_type if magnitude > 0 else 'none', 'magnitude': magnitude,
+                           **measure(detect, window)}
+                    results.append(row)
+                    logger.info(f"{path:<10s} n={size:<9d} {row['drift_type']:<16s} m={magnitude:<5} "
+                                f"{row['latency_seconds']:.3f}s detected={row['detected']}")
+                del window
+        del base
+
+    summary = accuracy(results)
+    lines = [f"| {'путь':<10} | {'окно':>9} | {'drift':<16} | {'величина':>8} | {'задержка, c':>11} "
+             f"| {'строк/с':>12} | {'память, МБ':>10} | {'score':>6} | {'detected':>8} |"]
+    lines.append('|' + '|'.join('-' * len(c) for c in lines[0].split('|')[1:-1]) + '|')
+    for r in results:
+        lines.append(f"| {r['path']:<10} | {r['window_size']:>9} | {r['drift_type']:<16} | {r['magnitude']:>8} "
+                     f"| {r['latency_seconds']:>11.3f} | {r['throughput_rows_per_sec'] or 0:>12,.0f} "
+                     f"| {r['peak_memory_mb']:>10.1f} | {r['drift_score']:>6.3f} | {str(r['detected']):>8} |")
+    lines.append("")
+    for path, s in summary.items():
+        lines.append(f"- {path}: recall={s['recall']}, false positive rate={s['false_positive_rate']}, "
+                     f"по типам: {s['recall_by_type']}")
+    if not EVIDENTLY_AVAILABLE:
+        lines.append("- evidently: не установлен, путь пропущен")
+    table = "\n".join(lines)
+    print(table)
+
+    with open(f"{args.output}.json", "w") as f:
+        json.dump({'results': results, 'accuracy': summary, 'pushes_stubbed': monitor.pushes,
+                   'evidently_available': EVIDENTLY_AVAILABLE}, f, indent=2)
+    with open(f"{args.output}.md", "w") as f:
+        f.write(table + "\n")
+    print(f"\nРезультаты сохранены в {args.output}.json и {args.output}.md")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Детали каждого вызова монитора не нужны в выводе бенчмарка
+    logging.getLogger(data_drift_monitor.__name__).setLevel(logging.ERROR)
+    sys.exit(main())
@@ -6,11 +6,19 @@ import json
 import time
 import logging
 import pandas as pd
-from typing import Dict, Optional
-from prometheus_client import Gauge, push_to_gateway, CollectorRegistry
+from typing import Dict, Iterable, List, Optional, Union
+from prometheus_client import Gauge, push_to_gateway, CollectorRegistry, start_http_server
 import redis
 import os
 
+from dataset_loader import load_dataset, logical_type
+from drift_metrics import compute_drift_metrics, drift_summary
+from drift_profile import ReferenceProfile, StreamingDriftDetector, WindowStats, compare_to_profile
+from late_data import read_lateness
+from parallel_drift import ParallelDriftEvaluator, summarize_groups
+from profile_store import StoredProfile, open_profile
+from schema_validation import SchemaValidator
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -27,11 +35,65 @@ class DataDriftMonitor:
     """Монитор для отслеживания data drift"""
     
     def __init__(self, redis_client: Optional[redis.Redis] = None,
-                 prometheus_gateway: str = "pushgateway:9091"):
+                 prometheus_gateway: str = "pushgateway:9091", export_mode: str = "push",
+                 schema_validator: Optional[SchemaValidator] = None, late_window_seconds: int = 300,
+                 late_bucket_seconds: int = 60):
+        """
+        Args:
+            redis_client: Клиент Redis (счетчики late data)
+            prometheus_gateway: Адрес Pushgateway для режима push
+            export_mode: push - один пакетный push реестра за цикл, pull - endpoint /metrics
+            schema_validator: Проверка значений по декларативной схеме (по умолчанию readmissions_schema.json)
+            late_window_seconds: Окно, за которое считается доля late data
+            late_bucket_seconds: Размер корзин счетчиков late data в Redis (как у LatenessRecorder)
+        """
+        if export_mode not in ("push", "pull"):
+            raise ValueError(f"Unknown export mode: {export_mode}")
         self.redis_client = redis_client
         self.prometheus_gateway = prometheus_gateway
+        self.export_mode = export_mode
+        self.schema_validator = schema_validator or SchemaValidator()
+        # Необязательные колонки схемы, об отсутствии которых уже сообщено
+        self._optional_missing_reported = set()
+        self.late_window_seconds = late_window_seconds
+        self.late_bucket_seconds = late_bucket_seconds
         self.reference_data = None
+        # Профиль референсных данных считается один раз при установке референса
+        self.reference_profile: Optional[ReferenceProfile] = None
+        self.streaming_detector: Optional[StreamingDriftDetector] = None
+        # Все метрики монитора живут в одном реестре: цикл проверок обновляет gauge,
+        # а выгрузка - один push за цикл или scrape endpoint
         self.registry = CollectorRegistry()
+        self.drift_score_gauge = Gauge('data_drift_score', 'Data drift score (0-1)', registry=self.registry)
+        self.drift_detected_gauge = Gauge('data_drift_detected', 'Data drift detected (1=yes, 0=no)', registry=self.registry)
+        self.feature_score_gauge = Gauge('data_drift_feature_score', 'Per-feature drift statistic',
+                                         ['feature', 'metric'], registry=self.registry)
+        self.feature_detected_gauge = Gauge('data_drift_feature_detected', 'Per-feature drift detected (1=yes, 0=no)',
+                                            ['feature'], registry=self.registry)
+        self.group_score_gauge = Gauge('data_drift_group_score', 'Data drift score per segment and window',
+                                       ['segment', 'window'], registry=self.registry)
+        self.late_ratio_gauge = Gauge('late_data_ratio', 'Ratio of late-arriving data', registry=self.registry)
+        self.lateness_histogram_gauge = Gauge('late_data_lateness_seconds_by_bucket',
+                                              'Records with lateness below the bound over the late-data window',
+                                              ['le'], registry=self.registry)
+        self.late_records_gauge = Gauge('late_data_records', 'Records accounted over the late-data window',
+                                        registry=self.registry)
+        self.watermark_lag_gauge = Gauge('late_data_watermark_lag_seconds', 'Watermark lag of the latest window',
+                                         registry=self.registry)
+        self.window_watermark_lag_gauge = Gauge('late_data_window_watermark_lag_seconds', 'Watermark lag per window',
+                                                ['window'], registry=self.registry)
+        self.schema_failures_gauge = Gauge('schema_compliance_failures_total',
+                                           'Failed schema checks: missing columns, type mismatches, violated rules',
+                                           registry=self.registry)
+        self.schema_violating_ratio_gauge = Gauge('schema_violating_rows_ratio',
+                                                  'Share of rows violating at least one schema rule in the last check',
+                                                  registry=self.registry)
+        self.schema_violations_gauge = Gauge('schema_rule_violations', 'Rows violating a schema rule in the last check',
+                                             ['column', 'rule'], registry=self.registry)
+        self.cycle_duration_gauge = Gauge('data_drift_cycle_duration_seconds', 'Duration of the last monitoring cycle',
+                                          registry=self.registry)
+        self.last_cycle_gauge = Gauge('data_drift_last_cycle_timestamp_seconds', 'Completion time of the last monitoring cycle',
+                                      registry=self.registry)
         
         if not EVIDENTLY_AVAILABLE:
             logger.warning("Evidently not available. Using simple drift detection.")
@@ -39,8 +101,109 @@ class DataDriftMonitor:
     def set_reference_data(self, data: pd.DataFrame):
         """Установка референсных данных"""
         self.reference_data = data
+        self.reference_profile = ReferenceProfile.build(data)
         logger.info(f"Reference data set: {data.shape}")
     
+    def set_reference_profile(self, stored: StoredProfile):
+        """
+        Установка сохраненного референсного профиля (без загрузки полного датасета)
+        
+        В качестве reference_data используется сохраненная в профиле выборка строк
+        """
+        self.reference_profile = stored.profile
+        self.reference_data = stored.sample_frame()
+        logger.info(f"Reference profile set: {len(stored.profile.columns)} columns, "
+                    f"sample {None if self.reference_data is None else self.reference_data.shape}")
+    
+    def enable_streaming(self, window_size: int = 1000, slide_size: Optional[int] = None):
+        """
+        Включение потоковой детекции drift
+        
+        Args:
+            window_size: Размер окна в записях
+            slide_size: Шаг скользящего окна в записях (None = tumbling-окно)
+        """
+        if self.reference_profile is None:
+            raise ValueError("Reference data must be set before enabling streaming drift detection")
+        self.streaming_detector = StreamingDriftDetector(
+            self.reference_profile, window_size=window_size, slide_size=slide_size
+        )
+        logger.info(f"Streaming drift detection enabled: window={window_size}, slide={slide_size or window_size}")
+    
+    def observe(self, records: Union[pd.DataFrame, Iterable[Dict]]) -> List[Dict]:
+        """
+        Инкрементальное обновление статистики окна поступившими записями
+        
+        Returns:
+            Результаты drift для завершившихся окон
+        """
+        if self.streaming_detector is None:
+            self.enable_streaming()
+        results = self.streaming_detector.add(records)
+        for result in results:
+            self._record_drift(result['drift_score'], result['drift_detected'])
+            if result['drift_detected']:
+                logger.warning(f"⚠️ Data drift detected in window! Score: {result['drift_score']:.3f}, "
+                               f"columns: {result['drifted_columns']}")
+                self._send_alert(f"Обнаружен data drift (score={result['drift_score']:.2f})")
+        if results:
+            self.push_metrics()
+        return results
+    
+    def _record_drift(self, drift_score: float, drift_detected: bool):
+        """Обновление итоговых метрик drift в реестре монитора"""
+        self.drift_score_gauge.set(drift_score)
+        self.drift_detected_gauge.set(1 if drift_detected else 0)
+    
+    def push_metrics(self):
+        """Один пакетный push всего реестра в Prometheus gateway (в режиме push)"""
+        if self.export_mode != "push":
+            return
+        try:
+            push_to_gateway(
+                self.prometheus_gateway,
+                job="data_drift",
+                registry=self.registry
+            )
+            logger.debug("Pushed monitoring metrics")
+        except Exception as e:
+            logger.warning(f"Failed to push metrics to Prometheus: {e}")
+    
+    def start_metrics_server(self, port: int = 9105):
+        """Запуск endpoint /metrics для scrape реестра монитора (режим pull)"""
+        start_http_server(port, registry=self.registry)
+        logger.info(f"Metrics endpoint started on port {port}")
+    
+    def run_cycle(self, current_data: pd.DataFrame, feature_drift: bool = True,
+                  drift_method: str = 'full') -> Dict:
+        """
+        Цикл проверок: drift, drift по признакам, late data и схема, затем одна выгрузка метрик
+        
+        Args:
+            current_data: Данные окна
+            feature_drift: Считать ли метрики по признакам относительно reference_data (метод full)
+            drift_method: full - Evidently (или простая проверка) относительно всего reference_data,
+                profile - PSI по корзинам референсного профиля, без обращения к референсным строкам
+        
+        Returns:
+            Результаты проверок цикла
+        """
+        if drift_method not in ('full', 'profile'):
+            raise ValueError(f"Unknown drift method: {drift_method}")
+        start = time.time()
+        if drift_method == 'profile':
+            result = {'drift': self.monitor_profile_drift(current_data)}
+        else:
+            result = {'drift': self.monitor_data_drift(current_data)}
+            if feature_drift:
+                result['feature_drift'] = self.monitor_feature_drift(current_data)
+        result['late_ratio'] = self.monitor_late_data()
+        result['schema_failures'] = self.monitor_schema_compliance(current_data)
+        self.cycle_duration_gauge.set(time.time() - start)
+        self.last_cycle_gauge.set_to_current_time()
+        self.push_metrics()
+        return result
+    
     def monitor_data_drift(self, current_data: pd.DataFrame) -> Dict:
         """
         Мониторинг data drift между референсными и текущими данными
@@ -77,24 +240,7 @@ class DataDriftMonitor:
                 drift_score = metric_result.get('drift_score', 0.0)
                 drift_detected = drift_score > 0.2  # Порог для детекции drift
             
-            # Push метрик в Prometheus gateway
-            try:
-                # Создаем временный registry для push
-                push_registry = CollectorRegistry()
-                drift_score_gauge = Gauge('data_drift_score', 'Data drift score (0-1)', registry=push_registry)
-                drift_detected_gauge = Gauge('data_drift_detected', 'Data drift detected (1=yes, 0=no)', registry=push_registry)
-                
-                drift_score_gauge.set(drift_score)
-                drift_detected_gauge.set(1 if drift_detected else 0)
-                
-                push_to_gateway(
-                    self.prometheus_gateway,
-                    job="data_drift",
-                    registry=push_registry
-                )
-                logger.debug(f"Pushed drift metrics: score={drift_score:.3f}, detected={drift_detected}")
-            except Exception as e:
-                logger.warning(f"Failed to push metrics to Prometheus: {e}")
+            self._record_drift(drift_score, drift_detected)
             
             # Алерт при превышении порога
             if drift_detected:
@@ -111,16 +257,108 @@ class DataDriftMonitor:
             logger.error(f"Error in drift detection: {e}")
             return {'drift_score': 0.0, 'drift_detected': False, 'error': str(e)}
     
+    def monitor_profile_drift(self, current_data: pd.DataFrame) -> Dict:
+        """
+        Drift окна относительно корзин референсного профиля (PSI по колонкам)
+        
+        Стоимость зависит только от размера окна: референс представлен долями корзин профиля,
+        поэтому работает и с сохраненным профилем (.drprof) без полного датасета
+        """
+        if self.reference_profile is None:
+            logger.warning("Reference profile not set. Skipping drift detection.")
+            return {'drift_score': 0.0, 'drift_detected': False}
+        
+        stats = WindowStats(self.reference_profile)
+        stats.update(current_data)
+        result = compare_to_profile(self.reference_profile, stats)
+        self._record_drift(result['drift_score'], result['drift_detected'])
+        for feature, psi in result['column_scores'].items():
+            self.feature_score_gauge.labels(feature=feature, metric='psi').set(psi)
+            self.feature_detected_gauge.labels(feature=feature).set(1 if feature in result['drifted_columns'] else 0)
+        if result['drift_detected']:
+            logger.warning(f"⚠️ Data drift detected! Score: {result['drift_score']:.3f}, "
+                           f"columns: {result['drifted_columns']}")
+            self._send_alert(f"Обнаружен data drift (score={result['drift_score']:.2f})")
+        return result
+    
+    def monitor_feature_drift(self, current_data: pd.DataFrame) -> Dict:
+        """
+        Векторизованные метрики drift (PSI, KS, Jensen-Shannon, Wasserstein) по всем признакам
+        
+        Args:
+            current_data: Текущие данные для сравнения
+        
+        Returns:
+            Словарь с drift_score, drift_detected и таблицей метрик по признакам
+        """
+        if self.reference_data is None:
+            logger.warning("Reference data not set. Skipping feature drift detection.")
+            return {'drift_score': 0.0, 'drift_detected': False}
+        
+        try:
+            metrics = compute_drift_metrics(self.reference_data, current_data)
+            summary = drift_summary(metrics)
+            
+            for feature, row in metrics.iterrows():
+                for metric in ('psi', 'js', 'ks', 'wasserstein'):
+                    if pd.notna(row[metric]):
+                        self.feature_score_gauge.labels(feature=feature, metric=metric).set(row[metric])
+                self.feature_detected_gauge.labels(feature=feature).set(1 if row['drifted'] else 0)
+            
+            if summary['drift_detected']:
+                logger.warning(f"⚠️ Feature drift detected! Score: {summary['drift_score']:.3f}, "
+                               f"columns: {summary['drifted_columns']}")
+            
+            return {
+                **summary,
+                'features': metrics.to_dict(orient='index'),
+                'timestamp': time.time()
+            }
+        except Exception as e:
+            logger.error(f"Error in feature drift detection: {e}")
+            return {'drift_score': 0.0, 'drift_detected': False, 'error': str(e)}
+    
+    def monitor_drift_parallel(self, current_data: pd.DataFrame, segment_by: Optional[str] = None,
+                               window_column: Optional[str] = None, window_freq: Optional[str] = None,
+                               window_rows: Optional[int] = None, max_workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Параллельная оценка drift по окнам и сегментам (например, почасовой backfill за сутки)
+        
+        Returns:
+            Матрица (segment, window, feature) x метрики; итог по группам публикуется
+            как data_drift_group_score{segment, window}
+        """
+        if self.reference_data is None:
+            raise ValueError("Reference data must be set before parallel drift evaluation")
+        evaluator = ParallelDriftEvaluator(self.reference_data, max_workers=max_workers)
+        matrix = evaluator.evaluate(current_data, segment_by=segment_by, window_column=window_column,
+                                    window_freq=window_freq, window_rows=window_rows)
+        if matrix.empty:
+            return matrix
+        summary = summarize_groups(matrix)
+        
+        # Окна прошлых запусков не накапливаются в реестре
+        self.group_score_gauge.clear()
+        for (segment, window), row in summary.iterrows():
+            self.group_score_gauge.labels(segment=str(segment), window=str(window)).set(row['drift_score'])
+        
+        self.push_metrics()
+        
+        drifted_groups = summary[summary['drift_detected']]
+        if len(drifted_groups):
+            logger.warning(f"⚠️ Data drift detected in {len(drifted_groups)} of {len(summary)} segment/window groups")
+        return matrix
+    
     def _simple_drift_detection(self, current_data: pd.DataFrame) -> Dict:
         """Простая детекция drift на основе статистик"""
         try:
-            # Сравнение средних значений числовых колонок
-            numeric_cols = self.reference_data.select_dtypes(include=['number']).columns
+            # Сравнение средних значений числовых колонок (референсные средние берутся из профиля)
+            numeric_cols = [name for name, col in self.reference_profile.columns.items() if col.kind == 'numeric']
             
             drift_scores = []
             for col in numeric_cols:
                 if col in current_data.columns:
-                    ref_mean = self.reference_data[col].mean()
+                    ref_mean = self.reference_profile.columns[col].mean
                     curr_mean = current_data[col].mean()
                     
                     # Простой drift score на основе относительного изменения
@@ -131,22 +369,7 @@ class DataDriftMonitor:
             avg_drift_score = sum(drift_scores) / len(drift_scores) if drift_scores else 0.0
             drift_detected = avg_drift_score > 0.2
             
-            # Push метрик в Prometheus gateway
-            try:
-                push_registry = CollectorRegistry()
-                drift_score_gauge = Gauge('data_drift_score', 'Data drift score (0-1)', registry=push_registry)
-                drift_detected_gauge = Gauge('data_drift_detected', 'Data drift detected (1=yes, 0=no)', registry=push_registry)
-                
-                drift_score_gauge.set(avg_drift_score)
-                drift_detected_gauge.set(1 if drift_detected else 0)
-                
-                push_to_gateway(
-                    self.prometheus_gateway,
-                    job="data_drift",
-                    registry=push_registry
-                )
-            except Exception as e:
-                logger.warning(f"Failed to push metrics to Prometheus: {e}")
+            self._record_drift(avg_drift_score, drift_detected)
             
             return {
                 'drift_score': avg_drift_score,
@@ -159,35 +382,32 @@ class DataDriftMonitor:
     
     def monitor_late_data(self) -> float:
         """
-        Мониторинг доли late-arriving данных
+        Мониторинг доли late-arriving данных по счетчикам LatenessRecorder в Redis
         
         Returns:
-            Доля late данных (0-1)
+            Доля late данных (0-1) за последние late_window_seconds секунд
         """
         late_ratio = 0.0
         
         if self.redis_client:
             try:
-                # Попытка получить метрики из Redis
-                late_count = self.redis_client.get('late_data_count') or 0
-                total_count = self.redis_client.get('total_data_count') or 1
-                late_ratio = float(late_count) / float(total_count) if total_count > 0 else 0.0
+                lateness = read_lateness(self.redis_client, window_seconds=self.late_window_seconds,
+                                         bucket_seconds=self.late_bucket_seconds)
+                late_ratio = lateness['late_ratio']
+                self.late_records_gauge.set(lateness['total'])
+                for bound, count in lateness['histogram'].items():
+                    self.lateness_histogram_gauge.labels(le=bound).set(count)
+                self.window_watermark_lag_gauge.clear()
+                for window in lateness['windows']:
+                    if window['watermark_lag'] is not None:
+                        self.window_watermark_lag_gauge.labels(window=str(window['start'])).set(window['watermark_lag'])
+                lags = [w['watermark_lag'] for w in lateness['windows'] if w['watermark_lag'] is not None]
+                if lags:
+                    self.watermark_lag_gauge.set(lags[-1])
             except Exception as e:
                 logger.warning(f"Failed to get late data metrics from Redis: {e}")
         
-        # Push метрики late data в Prometheus
-        try:
-            push_registry = CollectorRegistry()
-            late_ratio_gauge = Gauge('late_data_ratio', 'Ratio of late-arriving data', registry=push_registry)
-            late_ratio_gauge.set(late_ratio)
-            
-            push_to_gateway(
-                self.prometheus_gateway,
-                job="data_drift",
-                registry=push_registry
-            )
-        except Exception as e:
-            logger.warning(f"Failed to push late data metrics to Prometheus: {e}")
+        self.late_ratio_gauge.set(late_ratio)
         
         return late_ratio
     
@@ -199,9 +419,12 @@ class DataDriftMonitor:
             current_data: Текущие данные для проверки
         
         Returns:
-            Количество ошибок схемы
+            Количество проваленных проверок схемы: отсутствующие колонки, несовпадения типов
+            и нарушенные правила значений (правило считается один раз независимо от числа строк;
+            доля нарушающих строк публикуется отдельно в schema_violating_rows_ratio)
         """
         failures = 0
+        missing_cols = set()
         
         if self.reference_data is not None:
             # Проверка наличия всех колонок
@@ -213,27 +436,32 @@ class DataDriftMonitor:
                 failures += len(missing_cols)
                 logger.warning(f"Missing columns: {missing_cols}")
             
-            # Проверка типов данных
+            # Проверка типов данных (логических: int8 и int64, category и str считаются совместимыми)
             for col in ref_cols & curr_cols:
                 ref_dtype = self.reference_data[col].dtype
                 curr_dtype = current_data[col].dtype
-                if ref_dtype != curr_dtype:
+                if logical_type(ref_dtype) != logical_type(curr_dtype):
                     failures += 1
                     logger.warning(f"Type mismatch for {col}: {ref_dtype} vs {curr_dtype}")
         
-        # Push метрики в Prometheus
-        try:
-            push_registry = CollectorRegistry()
-            schema_failures_gauge = Gauge('schema_compliance_failures_total', 'Total schema compliance failures', registry=push_registry)
-            schema_failures_gauge.set(failures)
-            
-            push_to_gateway(
-                self.prometheus_gateway,
-                job="data_drift",
-                registry=push_registry
-            )
-        except Exception as e:
-            logger.warning(f"Failed to push schema compliance metrics to Prometheus: {e}")
+        # Проверка значений: диапазоны, форматы, перечисления, пропуски
+        report = self.schema_validator.validate_frame(current_data)
+        # Отсутствие необязательной колонки (например, readmitted_30_days в живых окнах) - не нарушение строк
+        optional_missing = {c for c in report.missing_columns if f"{c}:missing" not in report.violations}
+        if optional_missing - self._optional_missing_reported:
+            logger.info(f"Optional schema columns absent: {sorted(optional_missing - self._optional_missing_reported)}")
+            self._optional_missing_reported |= optional_missing
+        self.schema_violations_gauge.clear()
+        for key, count in report.violations.items():
+            column, rule = key.split(':', 1)
+            self.schema_violations_gauge.labels(column=column, rule=rule).set(count)
+            logger.warning(f"Schema rule {key} violated by {count} rows, e.g. {report.samples[key]}")
+            # Колонка, отсутствующая относительно референса, уже учтена выше
+            if not (rule == 'missing' and column in missing_cols):
+                failures += 1
+        
+        self.schema_failures_gauge.set(failures)
+        self.schema_violating_ratio_gauge.set(report.violating_ratio)
         
         return failures
     
@@ -244,9 +472,9 @@ class DataDriftMonitor:
 
 
 def load_reference_data(file_path: str) -> pd.DataFrame:
-    """Загрузка референсных данных"""
+    """Загрузка референсных данных (компактные типы, Parquet-кэш при наличии pyarrow)"""
     try:
-        df = pd.read_csv(file_path)
+        df = load_dataset(file_path)
         logger.info(f"Reference data loaded from {file_path}: {df.shape}")
         return df
     except Exception as e:
@@ -261,8 +489,12 @@ if __name__ == '__main__':
     reference_path = sys.argv[1] if len(sys.argv) > 1 else '../data/hospital_readmissions_30k.csv'
     
     try:
-        # Загрузка референсных данных
-        reference_data = load_reference_data(reference_path)
+        # Загрузка референсных данных: сохраненный профиль (profile_store.py build) или CSV
+        stored_profile = None
+        if reference_path.endswith('.drprof'):
+            stored_profile = open_profile(reference_path)
+        else:
+            reference_data = load_reference_data(reference_path)
         
         # Инициализация монитора
         redis_host = os.getenv('REDIS_HOST', 'redis')
@@ -275,19 +507,19 @@ if __name__ == '__main__':
             logger.warning("Redis not available, continuing without Redis")
         
         monitor = DataDriftMonitor(redis_client=redis_client)
-        monitor.set_reference_data(reference_data)
+        if stored_profile is not None:
+            monitor.set_reference_profile(stored_profile)
+        else:
+            monitor.set_reference_data(reference_data)
         
         # Пример текущих данных (в реальности читать из Kafka/Flink)
-        current_data = reference_data.sample(1000)  # Для демонстрации
-        
-        # Мониторинг drift
-        drift_result = monitor.monitor_data_drift(current_data)
-        
-        # Мониторинг late data
-        late_ratio = monitor.monitor_late_data()
+        current_data = monitor.reference_data.sample(1000, replace=True)  # Для демонстрации
         
-        # Мониторинг schema compliance
-        schema_failures = monitor.monitor_schema_compliance(current_data)
+        # Цикл проверок (drift, late data, schema compliance) с одной выгрузкой метрик
+        cycle = monitor.run_cycle(current_data)
+        drift_result = cycle['drift']
+        late_ratio = cycle['late_ratio']
+        schema_failures = cycle['schema_failures']
         
         print(f"\nData Drift Results:")
         print(f"  Drift Score: {drift_result['drift_score']:.3f}")
@@ -0,0 +1,253 @@
+"""
+Типизированная загрузка датасета повторных госпитализаций
+Явная карта типов (категории для строковых колонок, уменьшенные числовые типы,
+blood_pressure как два небольших целых), чтение CSV по частям и кэш в Parquet,
+который сбрасывается при изменении исходного файла (mtime/размер, затем SHA-256)
+
+Parquet-кэш требует pyarrow; без него данные каждый раз читаются из CSV
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Целевые типы колонок; целая колонка с пропусками становится nullable (Int32 и т.п.),
+# со значениями вне диапазона типа - float64
+DTYPES: Dict[str, str] = {
+    'patient_id': 'int32',
+    'age': 'int8',
+    'gender': 'category',
+    'blood_pressure': 'category',
+    'cholesterol': 'int16',
+    'bmi': 'float32',
+    'diabetes': 'category',
+    'hypertension': 'category',
+    'medication_count': 'int8',
+    'length_of_stay': 'int16',
+    'discharge_destination': 'category',
+    'readmitted_30_days': 'category',
+}
+BLOOD_PRESSURE_DTYPE = 'int16'
+CACHE_VERSION = 2
+DEFAULT_CHUNKSIZE = 500000
+
+
+def _downcast(series: pd.Series, dtype: str) -> pd.Series:
+    if dtype == 'category':
+        return series.astype('category')
+    target = np.dtype(dtype)
+    if target.kind == 'f':
+        return series.astype(target)
+    values = pd.to_numeric(series, errors='coerce')
+    info = np.iinfo(target)
+    if values.notna().any() and (values.min() < info.min or values.max() > info.max):
+        # float64 точно хранит целые до 2^53 (float32 - только до 2^24, крупные ID искажались бы)
+        return values.astype(np.float64)
+    if values.isna().any():
+        # Пропуски: nullable-тип той же ширины (int32 -> Int32), целые значения не теряют точность
+        return values.astype(target.name.capitalize())
+    return values.astype(target)
+
+
+def _convert_chunk(chunk: pd.DataFrame, split_blood_pressure: bool) -> pd.DataFrame:
+    for col in chunk.columns:
+        if col == 'blood_pressure' and split_blood_pressure:
+            continue
+        if col in DTYPES:
+            chunk[col] = _downcast(chunk[col], DTYPES[col])
+        elif not pd.api.types.is_numeric_dtype(chunk[col]):
+            chunk[col] = chunk[col].astype('category')
+    if split_blood_pressure and 'blood_pressure' in chunk.columns:
+        parts = chunk['blood_pressure'].astype(str).str.split('/', n=1, expand=True)
+        position = chunk.columns.get_loc('blood_pressure')
+        chunk = chunk.drop(columns=['blood_pressure'])
+        chunk.insert(position, 'bp_systolic', _downcast(parts[0], BLOOD_PRESSURE_DTYPE))
+        diastolic = parts[1] if parts.shape[1] > 1 else pd.Series(np.nan, index=chunk.index)
+        chunk.insert(position + 1, 'bp_diastolic', _downcast(diastolic, BLOOD_PRESSURE_DTYPE))
+    return chunk
+
+
+def _concat_chunks(chunks) -> pd.DataFrame:
+    """Объединение частей с общим словарем категорий (иначе категории превратились бы в object)"""
+    if len(chunks) == 1:
+        return chunks[0]
+    categorical = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    unions = {c: union_categoricals([chunk[c] for chunk in chunks], sort_categories=True) for c in categorical}
+    frame = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for c in categorical:
+        frame[c] = pd.Categorical(unions[c])
+    return frame[list(chunks[0].columns)]
+
+
+def read_typed_csv(path: str, split_blood_pressure: bool = False,
+                   chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    """Чтение CSV по частям с приведением каждой части к компактным типам"""
+    string_columns = {c: str for c, dtype in DTYPES.items() if dtype == 'category'}
+    chunks = [_convert_chunk(chunk, split_blood_pressure)
+              for chunk in pd.read_csv(path, chunksize=chunksize, dtype=string_columns)]
+    if not chunks:
+        return pd.read_csv(path)
+    return _concat_chunks(chunks)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(path: str, cache_dir: str, split_blood_pressure: bool):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    variant = 'bp_split' if split_blood_pressure else 'bp_raw'
+    base = os.path.join(cache_dir, f"{stem}.{variant}.v{CACHE_VERSION}")
+    return f"{base}.parquet", f"{base}.meta.json"
+
+
+def _cache_is_valid(path: str, meta_path: str) -> bool:
+    """Кэш актуален, если совпали mtime и размер, а при их изменении - SHA-256 исходного файла"""
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stat = os.stat(path)
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return True
+    if meta.get('size') != stat.st_size or meta.get('sha256') != file_sha256(path):
+        return False
+    # Файл только "тронут" (например, скопирован заново): обновляем mtime, кэш остается
+    meta['mtime_ns'] = stat.st_mtime_ns
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return True
+
+
+def load_dataset(path: str, split_blood_pressure: bool = False, cache_dir: Optional[str] = None,
+                 use_cache: bool = True, chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    """
+    Загрузка датасета с компактными типами
+
+    Args:
+        path: Путь к CSV
+        split_blood_pressure: Разобрать blood_pressure на bp_systolic и bp_diastolic
+        cache_dir: Каталог Parquet-кэша (по умолчанию DATASET_CACHE_DIR или .cache рядом с файлом)
+        use_cache: Использовать Parquet-кэш (если установлен pyarrow)
+        chunksize: Строк в одной части при чтении CSV
+    """
+    if not (use_cache and PARQUET_AVAILABLE):
+        return read_typed_csv(path, split_blood_pressure, chunksize)
+
+    cache_dir = cache_dir or os.getenv('DATASET_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+    parquet_path, meta_path = _cache_paths(path, cache_dir, split_blood_pressure)
+    try:
+        if os.path.exists(parquet_path) and _cache_is_valid(path, meta_path):
+            logger.debug(f"Loading {path} from cache {parquet_path}")
+            return pd.read_parquet(parquet_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable dataset cache {parquet_path}: {e}")
+
+    data = read_typed_csv(path, split_blood_pressure, chunksize)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        stat = os.stat(path)
+        data.to_parquet(parquet_path, index=False)
+        with open(meta_path, 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'mtime_ns': stat.st_mtime_ns,
+                       'size': stat.st_size, 'sha256': file_sha256(path)}, f)
+    except OSError as e:
+        logger.warning(f"Failed to write dataset cache {parquet_path}: {e}")
+    return data
+
+
+def logical_type(dtype) -> str:
+    """Логический тип колонки (для сравнения схем без учета размера типа и категорий)"""
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'boolean'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime'
+    return 'string'
+
+
+def _measure(label: str, load) -> Dict:
+    start = time.perf_counter()
+    data = load()
+    elapsed = time.perf_counter() - start
+    return {'method': label, 'rows': len(data), 'seconds': round(elapsed, 4),
+            'memory_mb': round(data.memory_usage(deep=True).sum() / 2 ** 20, 2)}
+
+
+def report(paths, cache_dir: str) -> list:
+    """
+    Время загрузки и занимаемая память: pd.read_csv, типизированное чтение без кэша,
+    первая загрузка с записью кэша (чтение, запись Parquet и SHA-256 файла) и загрузка из кэша
+    """
+    results = []
+    for path in paths:
+        rows = [
+            _measure('pd.read_csv', lambda: pd.read_csv(path)),
+            _measure('typed, cold', lambda: read_typed_csv(path)),
+        ]
+        if PARQUET_AVAILABLE:
+            # Первая загрузка через кэш - с пустым кэшем
+            for cache_file in _cache_paths(path, cache_dir, split_blood_pressure=False):
+                if os.path.exists(cache_file):
+                    os.remove(cache_file)
+            rows.append(_measure('typed, cache miss', lambda: load_dataset(path, cache_dir=cache_dir)))
+            rows.append(_measure('typed, cached', lambda: load_dataset(path, cache_dir=cache_dir)))
+        for row in rows:
+            row['file'] = os.path.basename(path)
+        results.extend(rows)
+    return results
+
+
+def main():
+    """Основная функция: отчет о времени загрузки и памяти"""
+    parser = argparse.ArgumentParser(description="Типизированная загрузка датасета и отчет о памяти")
+    parser.add_argument("--data-dir", default="../data", help="Каталог с CSV")
+    parser.add_argument("--scale", type=int, default=10, help="Во сколько раз увеличить 30k-датасет для отчета")
+    parser.add_argument("--cache-dir", default=".dataset_cache", help="Каталог Parquet-кэша")
+    args = parser.parse_args()
+
+    paths = [os.path.join(args.data_dir, 'hospital_readmissions_100.csv'),
+             os.path.join(args.data_dir, 'hospital_readmissions_30k.csv')]
+    if args.scale > 1:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        scaled = os.path.join(args.cache_dir, f'hospital_readmissions_30k_x{args.scale}.csv')
+        if not os.path.exists(scaled):
+            base = pd.read_csv(paths[1])
+            pd.concat([base] * args.scale, ignore_index=True).to_csv(scaled, index=False)
+        paths.append(scaled)
+
+    results = report(paths, args.cache_dir)
+    print(f"{'Файл':<40s} | {'Способ':<17s} | {'Строк':>9s} | {'Время, c':>9s} | {'Память, МБ':>10s}")
+    print("-" * 98)
+    for row in results:
+        print(f"{row['file']:<40s} | {row['method']:<17s} | {row['rows']:>9d} | "
+              f"{row['seconds']:>9.4f} | {row['memory_mb']:>10.2f}")
+    if not PARQUET_AVAILABLE:
+        print("\npyarrow не установлен: Parquet-кэш отключен")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
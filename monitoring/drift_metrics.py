@@ -0,0 +1,263 @@
+"""
+Векторизованные метрики drift для всех колонок датасета
+PSI, Колмогоров-Смирнов, Jensen-Shannon и Wasserstein считаются сразу для всех числовых
+и категориальных колонок пакетными операциями NumPy, без цикла по колонкам
+
+Числовые колонки раскладываются в непересекающиеся диапазоны [2j, 2j+1] (j - номер колонки),
+после чего одна сортировка и один searchsorted обслуживают все колонки одновременно
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from drift_profile import EPSILON, ID_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Пороги детекции drift по колонке (как у Evidently по умолчанию)
+KS_PVALUE_THRESHOLD = 0.05
+WASSERSTEIN_THRESHOLD = 0.1
+JS_THRESHOLD = 0.1
+# До этого размера референса числовые колонки проверяются KS-тестом, выше - нормированным Wasserstein
+SMALL_SAMPLE_ROWS = 1000
+PSI_BINS = 10
+
+METRIC_COLUMNS = ['kind', 'psi', 'js', 'ks', 'ks_pvalue', 'wasserstein', 'stattest', 'drifted']
+
+
+def prepare_features(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Подготовка признаков: исключение идентификаторов и разбор blood_pressure ("130/72")
+    на две числовые колонки bp_systolic и bp_diastolic
+    """
+    features = data.drop(columns=[c for c in data.columns if c in ID_COLUMNS])
+    if 'blood_pressure' in features.columns:
+        parts = features['blood_pressure'].astype(str).str.split('/', n=1, expand=True)
+        features = features.drop(columns=['blood_pressure'])
+        features['bp_systolic'] = pd.to_numeric(parts[0], errors='coerce')
+        features['bp_diastolic'] = pd.to_numeric(parts[1], errors='coerce') if parts.shape[1] > 1 else np.nan
+    return features
+
+
+def _split_columns(reference: pd.DataFrame, current: pd.DataFrame):
+    columns = [c for c in reference.columns if c in current.columns]
+    numeric = [c for c in columns
+               if pd.api.types.is_numeric_dtype(reference[c]) and not pd.api.types.is_bool_dtype(reference[c])]
+    categorical = [c for c in columns if c not in numeric]
+    return numeric, categorical
+
+
+def _flatten_numeric(values: np.ndarray, low: np.ndarray, span: np.ndarray):
+    """
+    Перевод матрицы (строки x колонки) в один массив с непересекающимися диапазонами колонок
+
+    Returns:
+        (отсортированные значения в диапазонах [2j, 2j+1], номер колонки каждого значения)
+    """
+    scaled = (values - low) / span + 2 * np.arange(values.shape[1])
+    column_ids = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    valid = ~np.isnan(scaled)
+    flat, ids = scaled[valid], column_ids[valid]
+    order = np.argsort(flat, kind='stable')
+    return flat[order], ids[order]
+
+
+def _ks_pvalue(statistic: np.ndarray, n: np.ndarray, m: np.ndarray) -> np.ndarray:
+    """
+    Асимптотическое p-value двухвыборочного KS-теста (распределение Колмогорова)
+
+    Знакопеременный ряд 2 * sum (-1)^(k-1) exp(-2 k^2 lam^2) при малых lam не сходится за разумное
+    число членов (при lam = 0 дает 0 вместо 1), поэтому для lam < 1 используется
+    эквивалентное представление через функцию распределения:
+    1 - sqrt(2 pi) / lam * sum exp(-(2k-1)^2 pi^2 / (8 lam^2))
+    """
+    statistic = np.asarray(statistic, dtype=np.float64)
+    en = np.sqrt(n * m / np.maximum(n + m, 1))
+    lam = (en + 0.12 + 0.11 / np.maximum(en, 1e-12)) * statistic
+    k = np.arange(1, 101)[:, None]
+    large = np.maximum(lam, 1.0)[None, :]
+    tail = (2 * (-1.0) ** (k - 1) * np.exp(-2 * (k ** 2) * large ** 2)).sum(axis=0)
+    small = np.maximum(lam, 1e-12)[None, :]
+    cdf = np.sqrt(2 * np.pi) / small[0] * np.exp(-((2 * k - 1) ** 2) * np.pi ** 2 / (8 * small ** 2)).sum(axis=0)
+    return np.clip(np.where(lam < 1.0, 1.0 - cdf, tail), 0.0, 1.0)
+
+
+def numeric_drift_metrics(reference: np.ndarray, current: np.ndarray, bins: int = PSI_BINS) -> Dict[str, np.ndarray]:
+    """
+    Метрики drift для матриц числовых колонок (строки x колонки, NaN - пропуски)
+
+    Returns:
+        Массивы по колонкам: psi, js, ks, ks_pvalue, wasserstein (нормирован на std референса)
+    """
+    k = reference.shape[1]
+    both = np.vstack([reference, current])
+    low = np.nanmin(both, axis=0)
+    span = np.nanmax(both, axis=0) - low
+    span = np.where(span > 0, span, 1.0)
+
+    ref_flat, ref_ids = _flatten_numeric(reference, low, span)
+    cur_flat, cur_ids = _flatten_numeric(current, low, span)
+    n_ref = np.bincount(ref_ids, minlength=k).astype(np.float64)
+    n_cur = np.bincount(cur_ids, minlength=k).astype(np.float64)
+    ref_start = np.concatenate([[0], np.cumsum(n_ref)[:-1]])
+    cur_start = np.concatenate([[0], np.cumsum(n_cur)[:-1]])
+
+    # KS и Wasserstein: эмпирические CDF обеих выборок во всех точках объединенной выборки
+    points = np.concatenate([ref_flat, cur_flat])
+    point_ids = np.concatenate([ref_ids, cur_ids])
+    order = np.argsort(points, kind='stable')
+    points, point_ids = points[order], point_ids[order]
+    cdf_ref = (np.searchsorted(ref_flat, points, side='right') - ref_start[point_ids]) / np.maximum(n_ref[point_ids], 1)
+    cdf_cur = (np.searchsorted(cur_flat, points, side='right') - cur_start[point_ids]) / np.maximum(n_cur[point_ids], 1)
+    gap = np.abs(cdf_ref - cdf_cur)
+    ks = np.zeros(k)
+    np.maximum.at(ks, point_ids, gap)
+
+    # Интеграл |F_ref - F_cur| по оси значений (в исходных единицах), без шагов через границу колонок
+    step = np.diff(points, append=points[-1] if len(points) else 0.0)
+    step[np.append(point_ids[1:] != point_ids[:-1], True)] = 0.0
+    wasserstein = np.bincount(point_ids, weights=gap * step * span[point_ids], minlength=k)
+    ref_std = np.nanstd(reference, axis=0)
+    wasserstein = wasserstein / np.where(ref_std > 0, ref_std, 1.0)
+
+    # PSI и JS: гистограммы по квантильным корзинам референса (общие внутренние границы всех колонок)
+    quantiles = np.nanquantile(reference, np.linspace(0, 1, bins + 1)[1:-1], axis=0)
+    inner_edges = ((quantiles - low) / span + 2 * np.arange(k)).T.ravel()
+    ref_hist = _histogram(ref_flat, ref_ids, inner_edges, bins, k)
+    cur_hist = _histogram(cur_flat, cur_ids, inner_edges, bins, k)
+    psi, js = _distribution_distances(ref_hist, cur_hist)
+
+    return {
+        'psi': psi,
+        'js': js,
+        'ks': ks,
+        'ks_pvalue': _ks_pvalue(ks, n_ref, n_cur),
+        'wasserstein': wasserstein,
+        'n_reference': n_ref,
+        'n_current': n_cur,
+    }
+
+
+def _histogram(flat: np.ndarray, ids: np.ndarray, inner_edges: np.ndarray, bins: int, k: int) -> np.ndarray:
+    """Счетчики корзин (колонки x корзины) по плоскому массиву всех колонок"""
+    position = np.searchsorted(inner_edges, flat, side='right') - ids * (bins - 1)
+    bin_idx = np.clip(position, 0, bins - 1)
+    return np.bincount(ids * bins + bin_idx, minlength=k * bins).reshape(k, bins).astype(np.float64)
+
+
+def _distribution_distances(ref_counts: np.ndarray, cur_counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """PSI и расстояние Jensen-Shannon (основание 2, от 0 до 1) для строк матриц счетчиков"""
+    ref = ref_counts / np.maximum(ref_counts.sum(axis=1, keepdims=True), 1)
+    cur = cur_counts / np.maximum(cur_counts.sum(axis=1, keepdims=True), 1)
+    ref_s, cur_s = np.clip(ref, EPSILON, None), np.clip(cur, EPSILON, None)
+    psi = np.sum((cur_s - ref_s) * np.log(cur_s / ref_s), axis=1)
+    mid = (ref + cur) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kl_ref = np.where(ref > 0, ref * np.log2(ref / mid), 0.0)
+        kl_cur = np.where(cur > 0, cur * np.log2(cur / mid), 0.0)
+    js = np.sqrt(np.clip((kl_ref.sum(axis=1) + kl_cur.sum(axis=1)) / 2, 0.0, 1.0))
+    return psi, js
+
+
+def categorical_drift_metrics(reference: pd.DataFrame, current: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    PSI и Jensen-Shannon для категориальных колонок
+
+    Пары (колонка, значение) всех колонок кодируются одним factorize, частоты считаются одним bincount
+    """
+    k = reference.shape[1]
+    ref_col = np.repeat(np.arange(k), len(reference))
+    cur_col = np.repeat(np.arange(k), len(current))
+    ref_values = reference.astype(str).to_numpy().T.ravel()
+    cur_values = current.astype(str).to_numpy().T.ravel()
+    pairs = pd.MultiIndex.from_arrays([
+        np.concatenate([ref_col, cur_col]), np.concatenate([ref_values, cur_values])
+    ])
+    codes, uniques = pairs.factorize()
+    ref_codes, cur_codes = codes[:len(ref_values)], codes[len(ref_values):]
+    code_column = uniques.get_level_values(0).to_numpy()
+
+    # Матрица колонки x категории: каждая категория занимает свой слот в строке своей колонки;
+    # пустые слоты (у колонки меньше категорий) дают нулевой вклад в PSI и JS
+    per_column = np.bincount(code_column, minlength=k)
+    starts = np.concatenate([[0], np.cumsum(per_column)[:-1]])
+    order = np.argsort(code_column, kind='stable')
+    slot = np.empty(len(code_column), dtype=np.int64)
+    slot[order] = np.arange(len(code_column)) - starts[code_column[order]]
+    width = max(int(per_column.max()), 1) if len(per_column) else 1
+    ref_counts = np.zeros((k, width))
+    cur_counts = np.zeros((k, width))
+    np.add.at(ref_counts, (code_column[ref_codes], slot[ref_codes]), 1)
+    np.add.at(cur_counts, (code_column[cur_codes], slot[cur_codes]), 1)
+    psi, js = _distribution_distances(ref_counts, cur_counts)
+    return {'psi': psi, 'js': js, 'n_categories': per_column}
+
+
+def compute_drift_metrics(reference: pd.DataFrame, current: pd.DataFrame,
+                          bins: int = PSI_BINS) -> pd.DataFrame:
+    """
+    Метрики drift по всем признакам
+
+    Returns:
+        DataFrame (признак x метрика): kind, psi, js, ks, ks_pvalue, wasserstein, stattest, drifted
+    """
+    reference = prepare_features(reference)
+    current = prepare_features(current)
+    numeric, categorical = _split_columns(reference, current)
+    frames = []
+
+    if numeric:
+        metrics = numeric_drift_metrics(
+            reference[numeric].to_numpy(dtype=np.float64, na_value=np.nan),
+            current[numeric].to_numpy(dtype=np.float64, na_value=np.nan),
+            bins=bins
+        )
+        frame = pd.DataFrame({name: metrics[name] for name in ('psi', 'js', 'ks', 'ks_pvalue', 'wasserstein')},
+                             index=numeric)
+        frame['kind'] = 'numeric'
+        frames.append(frame)
+
+    if categorical:
+        metrics = categorical_drift_metrics(reference[categorical], current[categorical])
+        frame = pd.DataFrame({'psi': metrics['psi'], 'js': metrics['js']}, index=categorical)
+        frame['ks'] = np.nan
+        frame['ks_pvalue'] = np.nan
+        frame['wasserstein'] = np.nan
+        frame['kind'] = 'categorical'
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    return apply_drift_rules(pd.concat(frames), len(reference))
+
+
+def apply_drift_rules(metrics: pd.DataFrame, reference_rows: int) -> pd.DataFrame:
+    """
+    Выбор статистического теста и решение о drift по колонкам
+
+    Числовые колонки: KS-тест для небольшого референса, иначе нормированный Wasserstein;
+    категориальные колонки: расстояние Jensen-Shannon
+    """
+    metrics = metrics.copy()
+    numeric = (metrics['kind'] == 'numeric').to_numpy()
+    if reference_rows <= SMALL_SAMPLE_ROWS:
+        numeric_test = 'ks'
+        numeric_drifted = metrics['ks_pvalue'] < KS_PVALUE_THRESHOLD
+    else:
+        numeric_test = 'wasserstein'
+        numeric_drifted = metrics['wasserstein'] > WASSERSTEIN_THRESHOLD
+    metrics['stattest'] = np.where(numeric, numeric_test, 'jensenshannon')
+    metrics['drifted'] = np.where(numeric, numeric_drifted, metrics['js'] > JS_THRESHOLD)
+    return metrics[METRIC_COLUMNS]
+
+
+def drift_summary(metrics: pd.DataFrame, share_threshold: float = 0.2) -> Dict:
+    """Итог по датасету: доля сместившихся признаков как drift_score"""
+    drift_score = float(metrics['drifted'].mean()) if len(metrics) else 0.0
+    return {
+        'drift_score': drift_score,
+        'drift_detected': drift_score > share_threshold,
+        'drifted_columns': list(metrics.index[metrics['drifted']]),
+    }
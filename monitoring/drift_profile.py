@@ -0,0 +1,227 @@
+"""
+Потоковая детекция data drift на основе профилей
+Референсный профиль (гистограммы, квантили, частоты категорий) считается один раз,
+статистика текущего окна обновляется инкрементально по мере поступления записей,
+а drift - дешевое сравнение двух сводок без сканирования DataFrame
+"""
+import time
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Колонки-идентификаторы не участвуют в детекции drift
+ID_COLUMNS = {'patient_id'}
+# Строковые колонки с большим числом значений не считаются категориальными
+MAX_CATEGORIES = 50
+# Порог PSI, выше которого колонка считается сместившейся
+PSI_THRESHOLD = 0.2
+# Сглаживание пустых корзин при расчете PSI
+EPSILON = 1e-6
+
+
+class ColumnProfile:
+    """Сводка одной колонки: корзины значений и их доли в референсных данных"""
+
+    def __init__(self, name: str, kind: str, ref_counts: np.ndarray,
+                 bin_edges: Optional[np.ndarray] = None, categories: Optional[List[str]] = None,
+                 quantiles: Optional[Dict[str, float]] = None, mean: Optional[float] = None,
+                 std: Optional[float] = None):
+        self.name = name
+        # numeric: корзины по bin_edges; categorical: корзины по categories + корзина "прочее"
+        self.kind = kind
+        self.ref_counts = np.asarray(ref_counts, dtype=np.float64)
+        self.ref_probs = self.ref_counts / max(self.ref_counts.sum(), 1.0)
+        self.bin_edges = bin_edges
+        self.categories = categories
+        self.quantiles = quantiles or {}
+        self.mean = mean
+        self.std = std
+        if categories is not None:
+            self._category_index = {c: i for i, c in enumerate(categories)}
+
+    @property
+    def n_bins(self) -> int:
+        return len(self.ref_counts)
+
+    def bin_counts(self, values: Union[pd.Series, np.ndarray]) -> np.ndarray:
+        """Распределение значений по корзинам профиля (векторизованно)"""
+        if self.kind == 'numeric':
+            array = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+            array = array[~np.isnan(array)]
+            # Внутренние границы: значения вне референсного диапазона попадают в крайние корзины
+            idx = np.searchsorted(self.bin_edges[1:-1], array, side='right')
+        else:
+            other = len(self.categories)
+            idx = pd.Series(values).dropna().astype(str).map(self._category_index) \
+                .fillna(other).to_numpy(dtype=np.int64)
+        return np.bincount(idx, minlength=self.n_bins).astype(np.float64)
+
+
+class ReferenceProfile:
+    """Профиль референсных данных, вычисляемый один раз"""
+
+    def __init__(self, columns: Dict[str, ColumnProfile], row_count: int):
+        self.columns = columns
+        self.row_count = row_count
+
+    @classmethod
+    def build(cls, data: pd.DataFrame, bins: int = 10) -> 'ReferenceProfile':
+        """Построение профиля: квантильные корзины для чисел, частоты для категорий"""
+        columns = {}
+        for col in data.columns:
+            if col in ID_COLUMNS:
+                continue
+            series = data[col].dropna()
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                values = series.to_numpy(dtype=np.float64)
+                edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+                if len(edges) < 2:
+                    edges = np.array([values.min(), values.min() + 1.0])
+                counts = np.bincount(np.searchsorted(edges[1:-1], values, side='right'), minlength=len(edges) - 1)
+                profile = ColumnProfile(
+                    col, 'numeric', counts, bin_edges=edges,
+                    quantiles={str(q): float(np.quantile(values, q)) for q in (0.05, 0.25, 0.5, 0.75, 0.95)},
+                    mean=float(values.mean()), std=float(values.std())
+                )
+            else:
+                frequencies = series.astype(str).value_counts()
+                if len(frequencies) > MAX_CATEGORIES:
+                    logger.debug(f"Skipping high-cardinality column {col} ({len(frequencies)} values)")
+                    continue
+                categories = list(frequencies.index)
+                counts = np.append(frequencies.to_numpy(dtype=np.float64), 0.0)
+                profile = ColumnProfile(col, 'categorical', counts, categories=categories)
+            columns[col] = profile
+        logger.info(f"Reference profile built: {len(columns)} columns, {len(data)} rows")
+        return cls(columns, len(data))
+
+
+class WindowStats:
+    """Инкрементальная статистика окна: счетчики корзин по колонкам"""
+
+    def __init__(self, profile: ReferenceProfile):
+        self.profile = profile
+        self.counts = {name: np.zeros(col.n_bins) for name, col in profile.columns.items()}
+        self.rows = 0
+        self.started_at: Optional[float] = None
+
+    def update(self, batch: pd.DataFrame):
+        """Добавление пачки записей"""
+        if self.started_at is None:
+            self.started_at = time.time()
+        for name, col in self.profile.columns.items():
+            if name in batch.columns:
+                self.counts[name] += col.bin_counts(batch[name])
+        self.rows += len(batch)
+
+    def add(self, other: 'WindowStats'):
+        for name in self.counts:
+            self.counts[name] += other.counts[name]
+        self.rows += other.rows
+
+    def subtract(self, other: 'WindowStats'):
+        for name in self.counts:
+            self.counts[name] -= other.counts[name]
+        self.rows -= other.rows
+
+
+def population_stability_index(ref_probs: np.ndarray, counts: np.ndarray) -> float:
+    """PSI между референсными долями и счетчиками текущего окна"""
+    total = counts.sum()
+    if total <= 0:
+        return 0.0
+    current = np.clip(counts / total, EPSILON, None)
+    reference = np.clip(ref_probs, EPSILON, None)
+    return float(np.sum((current - reference) * np.log(current / reference)))
+
+
+def compare_to_profile(profile: ReferenceProfile, stats: WindowStats,
+                       psi_threshold: float = PSI_THRESHOLD) -> Dict:
+    """
+    Сравнение статистики окна с референсным профилем
+
+    Returns:
+        Словарь с drift_score (доля сместившихся колонок), drift_detected и PSI по колонкам
+    """
+    column_scores = {}
+    for name, col in profile.columns.items():
+        if stats.counts[name].sum() > 0:
+            column_scores[name] = population_stability_index(col.ref_probs, stats.counts[name])
+    drifted = [name for name, psi in column_scores.items() if psi > psi_threshold]
+    drift_score = len(drifted) / len(column_scores) if column_scores else 0.0
+    return {
+        'drift_score': drift_score,
+        'drift_detected': drift_score > 0.2,
+        'drifted_columns': drifted,
+        'column_scores': column_scores,
+        'rows': stats.rows,
+        'timestamp': time.time()
+    }
+
+
+class StreamingDriftDetector:
+    """
+    Потоковый детектор drift с окнами по числу записей
+
+    Tumbling-окно: slide_size = None, результат выдается каждые window_size записей.
+    Sliding-окно: окно из window_size последних записей, результат каждые slide_size записей;
+    окно хранится как очередь панелей по slide_size записей с накопленной суммой.
+    """
+
+    def __init__(self, profile: ReferenceProfile, window_size: int = 1000,
+                 slide_size: Optional[int] = None, psi_threshold: float = PSI_THRESHOLD):
+        if slide_size is not None and (slide_size <= 0 or window_size % slide_size != 0):
+            raise ValueError("slide_size must be a positive divisor of window_size")
+        self.profile = profile
+        self.window_size = window_size
+        self.slide_size = slide_size or window_size
+        self.psi_threshold = psi_threshold
+        self.panes_per_window = self.window_size // self.slide_size
+        self._panes: deque = deque()
+        self._window = WindowStats(profile)
+        self._pane = WindowStats(profile)
+
+    def add(self, records: Union[pd.DataFrame, Iterable[Dict]]) -> List[Dict]:
+        """
+        Добавление записей
+
+        Returns:
+            Результаты drift для окон, завершившихся на этих записях
+        """
+        batch = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+        results = []
+        position = 0
+        while position < len(batch):
+            take = min(self.slide_size - self._pane.rows, len(batch) - position)
+            self._pane.update(batch.iloc[position:position + take])
+            position += take
+            if self._pane.rows >= self.slide_size:
+                results.extend(self._close_pane())
+        return results
+
+    def _close_pane(self) -> List[Dict]:
+        self._panes.append(self._pane)
+        self._window.add(self._pane)
+        self._pane = WindowStats(self.profile)
+        if len(self._panes) > self.panes_per_window:
+            self._window.subtract(self._panes.popleft())
+        if len(self._panes) < self.panes_per_window:
+            return []
+        result = compare_to_profile(self.profile, self._window, self.psi_threshold)
+        if self.slide_size == self.window_size:
+            # Tumbling-окно начинается заново
+            self._panes.clear()
+            self._window = WindowStats(self.profile)
+        return [result]
+
+    def current(self) -> Dict:
+        """Drift по текущему (возможно неполному) окну"""
+        stats = WindowStats(self.profile)
+        stats.add(self._window)
+        stats.add(self._pane)
+        return compare_to_profile(self.profile, stats, self.psi_threshold)
@@ -0,0 +1,201 @@
+"""
+Учет опаздывающих (late-arriving) данных
+Для каждой записи сравнивается время события (event time) и время обработки (processing time).
+Записи учитываются пачками: гистограмма задержек и максимум event time считаются векторизованно
+в памяти и сбрасываются в Redis одним pipeline в счетчики по корзинам времени обработки
+
+Ключи Redis:
+    late_data:{начало корзины}            - hash: total, late, lateness_sum, le_<граница> (гистограмма)
+    late_data:{начало корзины}:watermark  - zset: источник -> максимальный event time в корзине
+
+Модуль используется и вне мониторинга (load-generator учитывает задержку подтверждения своих событий),
+поэтому pandas нужен только для разбора времени в строковом виде
+"""
+import time
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import redis
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'late_data'
+# Верхние границы корзин гистограммы задержки, секунды (последняя корзина - все, что больше)
+LATENESS_BOUNDS = [0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0]
+HISTOGRAM_FIELDS = [f"le_{b:g}" for b in LATENESS_BOUNDS] + ['le_inf']
+
+
+def to_epoch_seconds(values: Sequence) -> np.ndarray:
+    """Время события в секундах epoch: числа (секунды или миллисекунды) или строки ISO 8601"""
+    array = np.asarray(values)
+    if array.dtype.kind in 'fiu':
+        seconds = array.astype(np.float64)
+        return np.where(seconds > 1e11, seconds / 1000.0, seconds)
+    if not PANDAS_AVAILABLE:
+        raise ImportError("pandas is required to parse non-numeric event times")
+    series = pd.Series(values)
+    seconds = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    text = np.isnan(seconds) & series.notna().to_numpy()
+    if text.any():
+        parsed = pd.to_datetime(series[text], errors='coerce', utc=True, format='ISO8601')
+        seconds[text] = (parsed - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy(dtype=np.float64, na_value=np.nan)
+    # Значения в миллисекундах (например, timestamp_ms или время записи Kafka)
+    return np.where(seconds > 1e11, seconds / 1000.0, seconds)
+
+
+class LatenessRecorder:
+    """
+    Сторона продюсера или консьюмера: накопление задержек и пакетная запись в Redis
+
+    Записи попадают в корзину по времени обработки; запись считается опоздавшей,
+    если задержка больше allowed_lateness секунд
+    """
+
+    def __init__(self, redis_client: redis.Redis, source: str = 'default', bucket_seconds: int = 60,
+                 allowed_lateness: float = 5.0, flush_every: int = 10000, flush_interval: float = 1.0,
+                 ttl_seconds: int = 86400):
+        self.redis_client = redis_client
+        self.source = source
+        self.bucket_seconds = bucket_seconds
+        self.allowed_lateness = allowed_lateness
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.ttl_seconds = ttl_seconds
+        # Начало корзины -> [total, late, lateness_sum, гистограмма...]
+        self._pending: Dict[int, np.ndarray] = {}
+        self._max_event: Dict[int, float] = {}
+        self._pending_records = 0
+        self._last_flush = time.time()
+
+    def record(self, event_time, processing_time: Optional[float] = None):
+        """Учет одной записи"""
+        self.record_batch([event_time], None if processing_time is None else [processing_time])
+
+    def record_batch(self, event_times: Sequence, processing_times: Optional[Sequence] = None):
+        """
+        Учет пачки записей
+
+        Args:
+            event_times: Время событий (секунды/миллисекунды epoch или ISO 8601)
+            processing_times: Время обработки в секундах epoch (по умолчанию - текущее)
+        """
+        events = to_epoch_seconds(event_times)
+        if processing_times is None:
+            processing = np.full(len(events), time.time())
+        else:
+            processing = np.asarray(processing_times, dtype=np.float64)
+        valid = ~np.isnan(events)
+        events, processing = events[valid], processing[valid]
+        if len(events) == 0:
+            return
+
+        lateness = np.maximum(processing - events, 0.0)
+        buckets = (processing // self.bucket_seconds).astype(np.int64) * self.bucket_seconds
+        starts, index = np.unique(buckets, return_inverse=True)
+        width = 3 + len(HISTOGRAM_FIELDS)
+        counts = np.zeros((len(starts), width))
+        counts[:, 0] = np.bincount(index, minlength=len(starts))
+        counts[:, 1] = np.bincount(index, weights=lateness > self.allowed_lateness, minlength=len(starts))
+        counts[:, 2] = np.bincount(index, weights=lateness, minlength=len(starts))
+        bins = np.searchsorted(LATENESS_BOUNDS, lateness, side='left')
+        np.add.at(counts, (index, 3 + bins), 1)
+        max_event = np.full(len(starts), -np.inf)
+        np.maximum.at(max_event, index, events)
+
+        for i, start in enumerate(starts.tolist()):
+            if start in self._pending:
+                self._pending[start] += counts[i]
+                self._max_event[start] = max(self._max_event[start], float(max_event[i]))
+            else:
+                self._pending[start] = counts[i]
+                self._max_event[start] = float(max_event[i])
+        self._pending_records += len(events)
+
+        if self._pending_records >= self.flush_every or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленных счетчиков в Redis одним pipeline"""
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start, counts in self._pending.items():
+            key = f"{KEY_PREFIX}:{start}"
+            pipe.hincrby(key, 'total', int(counts[0]))
+            if counts[1]:
+                pipe.hincrby(key, 'late', int(counts[1]))
+            pipe.hincrbyfloat(key, 'lateness_sum', float(counts[2]))
+            for field, count in zip(HISTOGRAM_FIELDS, counts[3:]):
+                if count:
+                    pipe.hincrby(key, field, int(count))
+            pipe.expire(key, self.ttl_seconds)
+            # Watermark источника в корзине растет только вперед
+            pipe.zadd(f"{key}:watermark", {self.source: self._max_event[start]}, gt=True)
+            pipe.expire(f"{key}:watermark", self.ttl_seconds)
+        try:
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to flush late data counters: {e}")
+            return
+        self._pending.clear()
+        self._max_event.clear()
+        self._pending_records = 0
+
+
+def read_lateness(redis_client: redis.Redis, window_seconds: int = 300, bucket_seconds: int = 60,
+                  now: Optional[float] = None) -> Dict:
+    """
+    Сводка по корзинам за последние window_seconds секунд
+
+    Returns:
+        Словарь: total, late, late_ratio, mean_lateness, histogram (граница -> накопленное число записей),
+        windows - по корзинам: начало, total, late, watermark и отставание watermark от конца корзины
+    """
+    now = time.time() if now is None else now
+    last = int(now // bucket_seconds) * bucket_seconds
+    starts = list(range(last - window_seconds + bucket_seconds, last + 1, bucket_seconds))
+    pipe = redis_client.pipeline(transaction=False)
+    for start in starts:
+        pipe.hgetall(f"{KEY_PREFIX}:{start}")
+        pipe.zrange(f"{KEY_PREFIX}:{start}:watermark", 0, -1, withscores=True)
+    replies = pipe.execute()
+
+    histogram = np.zeros(len(HISTOGRAM_FIELDS))
+    total = late = lateness_sum = 0.0
+    windows: List[Dict] = []
+    for i, start in enumerate(starts):
+        fields, sources = replies[2 * i], replies[2 * i + 1]
+        if not fields:
+            continue
+        bucket_total = float(fields.get('total', 0))
+        bucket_late = float(fields.get('late', 0))
+        total += bucket_total
+        late += bucket_late
+        lateness_sum += float(fields.get('lateness_sum', 0))
+        histogram += [float(fields.get(f, 0)) for f in HISTOGRAM_FIELDS]
+        # Общий watermark - минимальный среди источников: до него данные получены от всех
+        watermark = min(score for _, score in sources) if sources else None
+        windows.append({
+            'start': start,
+            'total': int(bucket_total),
+            'late': int(bucket_late),
+            'watermark': watermark,
+            'watermark_lag': None if watermark is None else max(0.0, min(start + bucket_seconds, now) - watermark),
+        })
+
+    return {
+        'total': int(total),
+        'late': int(late),
+        'late_ratio': late / total if total > 0 else 0.0,
+        'mean_lateness': lateness_sum / total if total > 0 else 0.0,
+        'histogram': dict(zip([f"{b:g}" for b in LATENESS_BOUNDS] + ['+Inf'], np.cumsum(histogram).astype(int).tolist())),
+        'windows': windows,
+    }
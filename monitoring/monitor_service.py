@@ -0,0 +1,441 @@
+"""
+Непрерывный мониторинг данных: сервис читает признаки из Kafka, из истории предсказаний
+model-server в Redis или из журнала предсказаний в Redis Stream, собирает их в окна ограниченного
+размера и по каждому окну выполняет цикл проверок DataDriftMonitor (drift, late data, схема)
+
+Прогресс сохраняется после обработки окна: в Kafka - коммитом смещений группы потребителей,
+в Redis - отметкой времени (watermark), до которой история уже обработана, в Redis Stream -
+подтверждением (XACK) записей группы потребителей. После перезапуска окно, не успевшее
+обработаться, читается повторно (at-least-once)
+"""
+import json
+import os
+import signal
+import sys
+import time
+import logging
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import redis
+from prometheus_client import Counter, Gauge
+
+from data_drift_monitor import DataDriftMonitor, load_reference_data
+from late_data import LatenessRecorder
+from profile_store import open_profile
+
+logger = logging.getLogger(__name__)
+
+
+def _deserialize(raw: bytes) -> Optional[Dict]:
+    """JSON-запись из Kafka; некорректные сообщения не останавливают сервис"""
+    try:
+        value = json.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+class KafkaFeatureSource:
+    """Источник признаков из топика Kafka; прогресс - смещения группы потребителей"""
+
+    def __init__(self, bootstrap_servers: List[str], topic: str, group_id: str = 'data-drift-monitor'):
+        from kafka import KafkaConsumer
+
+        self.topic = topic
+        self.consumer = KafkaConsumer(
+            topic,
+            bootstrap_servers=bootstrap_servers,
+            group_id=group_id,
+            enable_auto_commit=False,
+            auto_offset_reset='earliest',
+            value_deserializer=_deserialize
+        )
+        self.last_timestamp: Optional[float] = None
+        logger.info(f"Kafka feature source started on topic '{topic}' (group {group_id})")
+
+    def poll(self, max_records: int) -> List[Optional[Dict]]:
+        """Не больше max_records записей (None - некорректное сообщение)"""
+        batches = self.consumer.poll(timeout_ms=1000, max_records=max(1, max_records))
+        records = []
+        for batch in batches.values():
+            for record in batch:
+                records.append(record.value)
+                self.last_timestamp = record.timestamp / 1000.0
+        return records
+
+    def commit(self):
+        """Коммит смещений всех уже прочитанных (и обработанных) записей"""
+        self.consumer.commit()
+
+    def close(self):
+        self.consumer.close()
+
+
+class RedisHistorySource:
+    """
+    Источник признаков из истории предсказаний model-server (списки patient:{id}:predictions)
+
+    Каждый проход по ключам читает записи с timestamp в интервале (конец прошлого прохода, начало прохода].
+    Ключи обрабатываются пачками с pipeline, поэтому в памяти не больше одной пачки записей.
+    Watermark сохраняется в Redis, когда проход полностью прочитан и все его записи обработаны
+    """
+
+    def __init__(self, redis_client: redis.Redis, key_pattern: str = 'patient:*:predictions',
+                 checkpoint_key: str = 'drift_monitor:watermark', scan_count: int = 500,
+                 poll_interval: float = 5.0):
+        self.redis_client = redis_client
+        self.key_pattern = key_pattern
+        self.checkpoint_key = checkpoint_key
+        self.scan_count = scan_count
+        self.poll_interval = poll_interval
+        self.watermark = float(redis_client.get(checkpoint_key) or 0.0)
+        self._read_from = self.watermark
+        self.last_timestamp: Optional[float] = None
+        self._pass: Optional[Iterator[List[Dict]]] = None
+        self._pass_upper = 0.0
+        self._buffer: List[Dict] = []
+        self._committable: Optional[float] = None
+        logger.info(f"Redis history source started: pattern '{key_pattern}', watermark {self.watermark}")
+
+    def _scan_pass(self, lower: float, upper: float) -> Iterator[List[Dict]]:
+        keys = []
+        for key in self.redis_client.scan_iter(match=self.key_pattern, count=self.scan_count):
+            keys.append(key)
+            if len(keys) >= self.scan_count:
+                yield self._read_keys(keys, lower, upper)
+                keys = []
+        if keys:
+            yield self._read_keys(keys, lower, upper)
+
+    def _read_keys(self, keys: List[str], lower: float, upper: float) -> List[Dict]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.lrange(key, 0, -1)
+        records = []
+        for values in pipe.execute():
+            # LPUSH: новые записи в начале списка, чтение до первой уже обработанной
+            for raw in values:
+                record = _deserialize(raw.encode('utf-8') if isinstance(raw, str) else raw)
+                if record is None:
+                    # Запись без времени нельзя отнести к проходу, иначе она читалась бы каждый раз
+                    continue
+                timestamp = float(record.get('timestamp', 0.0))
+                if timestamp <= lower:
+                    break
+                if timestamp <= upper:
+                    records.append(record)
+        return records
+
+    def poll(self, max_records: int) -> List[Optional[Dict]]:
+        """Не больше max_records записей; между проходами - пауза poll_interval"""
+        while len(self._buffer) < max_records:
+            if self._pass is None:
+                if self._buffer or time.time() - self._pass_upper < self.poll_interval:
+                    break
+                self._pass_upper = time.time()
+                self._pass = self._scan_pass(self._read_from, self._pass_upper)
+            chunk = next(self._pass, None)
+            if chunk is None:
+                # Проход прочитан; watermark сохраняется после обработки окна с его записями
+                self._pass = None
+                self._read_from = self._pass_upper
+                self._committable = self._pass_upper
+                continue
+            self._buffer.extend(chunk)
+        records, self._buffer = self._buffer[:max_records], self._buffer[max_records:]
+        timestamps = [r['timestamp'] for r in records if r is not None and 'timestamp' in r]
+        if timestamps:
+            self.last_timestamp = max(float(t) for t in timestamps)
+        if not records:
+            time.sleep(min(self.poll_interval, 1.0))
+        return records
+
+    def commit(self):
+        """Сохранение watermark завершенного прохода, если все его записи переданы на обработку"""
+        if self._committable is not None and not self._buffer:
+            self.watermark = self._committable
+            self.redis_client.set(self.checkpoint_key, self.watermark)
+            self._committable = None
+
+    def close(self):
+        pass
+
+
+class RedisStreamSource:
+    """
+    Источник признаков из журнала предсказаний model-server в Redis Stream (PREDICTION_LOG_MODE=stream)
+
+    Чтение группой потребителей (XREADGROUP): каждая группа (мониторинг drift, аналитика, переобучение)
+    получает все записи по порядку независимо от других. Прочитанные записи подтверждаются XACK
+    после обработки окна. После перезапуска сначала один раз дочитываются неподтвержденные записи
+    этого потребителя, затем по ходу чтения, не больше max_records за poll, забираются записи
+    остановившихся потребителей группы (XAUTOCLAIM)
+    """
+
+    def __init__(self, redis_client: redis.Redis, stream: str = 'predictions', group: str = 'data-drift-monitor',
+                 consumer: str = 'data-drift-monitor-1', start_id: str = '0', block_ms: int = 1000,
+                 claim_idle_ms: int = 60000):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.last_timestamp: Optional[float] = None
+        self._delivered: List[str] = []
+        try:
+            redis_client.xgroup_create(stream, group, id=start_id, mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        # Сначала собственные неподтвержденные записи, затем новые
+        self._read_id = '0-0'
+        # Позиция обхода списка неподтвержденных записей группы и время следующего обхода
+        self._claim_cursor = '0-0'
+        self._next_claim = 0.0
+        logger.info(f"Redis stream source started: stream '{stream}', group {group}, consumer {consumer}")
+
+    def _claim(self, count: int) -> List:
+        """
+        Не больше count неподтвержденных записей других потребителей группы, простаивающих дольше
+        claim_idle_ms; после полного обхода следующий начинается через claim_idle_ms
+        """
+        if time.time() < self._next_claim:
+            return []
+        response = self.redis_client.xautoclaim(self.stream, self.group, self.consumer, self.claim_idle_ms,
+                                                start_id=self._claim_cursor, count=count)
+        self._claim_cursor = response[0]
+        if self._claim_cursor == '0-0':
+            self._next_claim = time.time() + self.claim_idle_ms / 1000
+        # Записи этого потребителя, еще не подтвержденные после обработки окна, уже переданы
+        delivered = set(self._delivered)
+        return [entry for entry in response[1] if entry[0] not in delivered]
+
+    def poll(self, max_records: int) -> List[Optional[Dict]]:
+        """Не больше max_records записей; если новых нет - ожидание до block_ms"""
+        count = max(1, max_records)
+        entries = []
+        while self._read_id != '>':
+            # Неподтвержденные записи потребителя: по истории после последней прочитанной
+            response = self.redis_client.xreadgroup(self.group, self.consumer, {self.stream: self._read_id},
+                                                    count=count)
+            entries = response[0][1] if response else []
+            if entries:
+                self._read_id = entries[-1][0]
+                break
+            self._read_id = '>'
+        # Записи забираются только после дочитывания своих: иначе они прочитались бы дважды
+        if not entries:
+            entries = self._claim(count)
+        if not entries:
+            response = self.redis_client.xreadgroup(self.group, self.consumer, {self.stream: '>'},
+                                                    count=count, block=self.block_ms)
+            entries = response[0][1] if response else []
+        records = []
+        for entry_id, fields in entries:
+            self._delivered.append(entry_id)
+            if not fields:
+                # Запись удалена обрезкой MAXLEN, пока была неподтвержденной
+                continue
+            records.append(_deserialize(fields['data'].encode('utf-8')) if 'data' in fields else None)
+        timestamps = [r['timestamp'] for r in records if r is not None and 'timestamp' in r]
+        if timestamps:
+            self.last_timestamp = max(float(t) for t in timestamps)
+        return records
+
+    def commit(self):
+        """Подтверждение всех переданных на обработку записей"""
+        if self._delivered:
+            self.redis_client.xack(self.stream, self.group, *self._delivered)
+            self._delivered = []
+
+    def close(self):
+        pass
+
+
+class MonitoringService:
+    """
+    Цикл сервиса: чтение источника, окно не больше window_size записей, проверки по окну
+
+    Окно обрабатывается, когда набрано window_size записей или прошло max_interval секунд
+    и в окне есть хотя бы min_rows записей
+    """
+
+    def __init__(self, monitor: DataDriftMonitor, source, window_size: int = 1000,
+                 max_interval: float = 60.0, min_rows: int = 100,
+                 lateness_recorder: Optional[LatenessRecorder] = None, event_time_field: str = 'timestamp',
+                 drift_method: str = 'full'):
+        self.monitor = monitor
+        self.source = source
+        # full - Evidently/метрики относительно всего референса, profile - PSI по корзинам профиля
+        self.drift_method = drift_method
+        # Учет задержки между временем события и временем чтения записи сервисом
+        self.lateness_recorder = lateness_recorder
+        self.event_time_field = event_time_field
+        self.window_size = window_size
+        self.max_interval = max_interval
+        self.min_rows = min_rows
+        self.running = False
+        self._window: List[Dict] = []
+        self._window_started = time.time()
+        self._last_window_end = time.time()
+        self._window_records = 0
+
+        # Метрики сервиса в реестре монитора: выгружаются вместе с результатами проверок
+        registry = monitor.registry
+        self.records_counter = Counter('drift_monitor_records_total', 'Records consumed by the monitoring service',
+                                       registry=registry)
+        self.malformed_counter = Counter('drift_monitor_malformed_records_total', 'Malformed records skipped',
+                                         registry=registry)
+        self.windows_counter = Counter('drift_monitor_windows_total', 'Windows processed by the monitoring service',
+                                       registry=registry)
+        self.throughput_gauge = Gauge('drift_monitor_throughput_records_per_second',
+                                      'Records per second over the last window', registry=registry)
+        self.buffered_gauge = Gauge('drift_monitor_buffered_records', 'Records in the current window',
+                                    registry=registry)
+        self.lag_gauge = Gauge('drift_monitor_source_lag_seconds', 'Age of the newest processed record',
+                               registry=registry)
+
+    def step(self) -> Optional[Dict]:
+        """
+        Одна итерация: чтение записей и, если окно готово, его обработка
+
+        Returns:
+            Результат цикла проверок, если окно было обработано
+        """
+        records = self.source.poll(self.window_size - len(self._window))
+        valid = [r for r in records if r is not None]
+        if len(valid) < len(records):
+            self.malformed_counter.inc(len(records) - len(valid))
+        if records:
+            self.records_counter.inc(len(records))
+            self._window_records += len(records)
+        if self.lateness_recorder is not None and valid:
+            event_times = [r[self.event_time_field] for r in valid if self.event_time_field in r]
+            if event_times:
+                self.lateness_recorder.record_batch(event_times)
+        if valid and not self._window:
+            self._window_started = time.time()
+        self._window.extend(valid)
+        self.buffered_gauge.set(len(self._window))
+
+        full = len(self._window) >= self.window_size
+        expired = time.time() - self._window_started >= self.max_interval and len(self._window) >= self.min_rows
+        if full or expired:
+            return self._process_window()
+        if not self._window and records:
+            # Пачка целиком из некорректных записей: прогресс можно сохранить сразу
+            self.source.commit()
+        return None
+
+    def _process_window(self) -> Dict:
+        frame = pd.DataFrame(self._window)
+        if self.monitor.reference_data is not None:
+            reference_columns = list(self.monitor.reference_data.columns)
+        else:
+            reference_columns = list(self.monitor.reference_profile.columns)
+        frame = frame[[c for c in reference_columns if c in frame.columns]]
+
+        now = time.time()
+        elapsed = now - self._last_window_end
+        self.throughput_gauge.set(self._window_records / elapsed if elapsed > 0 else 0.0)
+        if self.source.last_timestamp is not None:
+            self.lag_gauge.set(max(0.0, now - self.source.last_timestamp))
+        self.windows_counter.inc()
+
+        if self.lateness_recorder is not None:
+            self.lateness_recorder.flush()
+        result = self.monitor.run_cycle(frame, drift_method=self.drift_method)
+        self.source.commit()
+        logger.info(f"Window processed: {len(frame)} records, drift score {result['drift']['drift_score']:.3f}, "
+                    f"schema failures {result['schema_failures']}")
+
+        self._window = []
+        self._window_records = 0
+        self._last_window_end = time.time()
+        self.buffered_gauge.set(0)
+        return result
+
+    def run(self):
+        """Запуск цикла до остановки сигналом SIGTERM/SIGINT"""
+        self.running = True
+        try:
+            while self.running:
+                self.step()
+        finally:
+            self.source.close()
+            logger.info("Monitoring service stopped")
+
+    def stop(self, *_args):
+        self.running = False
+
+
+def main():
+    """Основная функция: настройка из переменных окружения"""
+    reference_path = os.getenv('REFERENCE_PATH', '/data/hospital_readmissions_30k.csv')
+    source_type = os.getenv('MONITOR_SOURCE', 'redis')
+    export_mode = os.getenv('METRICS_EXPORT_MODE', 'pull')
+
+    redis_client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        decode_responses=True,
+        socket_connect_timeout=5
+    )
+    monitor = DataDriftMonitor(
+        redis_client=redis_client,
+        prometheus_gateway=os.getenv('PROMETHEUS_GATEWAY', 'pushgateway:9091'),
+        export_mode=export_mode
+    )
+    # Для сохраненного профиля по умолчанию drift окна считается по его корзинам:
+    # выборка строк из профиля слишком мала для сравнения с полным референсом
+    drift_method = os.getenv('DRIFT_METHOD') or ('profile' if reference_path.endswith('.drprof') else 'full')
+    if reference_path.endswith('.drprof'):
+        monitor.set_reference_profile(open_profile(reference_path))
+    else:
+        monitor.set_reference_data(load_reference_data(reference_path))
+    if export_mode == 'pull':
+        monitor.start_metrics_server(int(os.getenv('METRICS_PORT', 9105)))
+
+    if source_type == 'kafka':
+        source = KafkaFeatureSource(
+            os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:19092').split(','),
+            os.getenv('FEATURES_TOPIC', 'patient-features'),
+            group_id=os.getenv('MONITOR_GROUP_ID', 'data-drift-monitor')
+        )
+    elif source_type == 'redis':
+        source = RedisHistorySource(redis_client, poll_interval=float(os.getenv('REDIS_POLL_INTERVAL', 5)))
+    elif source_type == 'redis-stream':
+        source = RedisStreamSource(
+            redis_client,
+            stream=os.getenv('PREDICTION_STREAM', 'predictions'),
+            group=os.getenv('MONITOR_GROUP_ID', 'data-drift-monitor'),
+            consumer=os.getenv('MONITOR_CONSUMER', 'data-drift-monitor-1'),
+            start_id=os.getenv('MONITOR_STREAM_START', '0')
+        )
+    else:
+        raise ValueError(f"Unknown MONITOR_SOURCE: {source_type}")
+
+    lateness_recorder = LatenessRecorder(
+        redis_client,
+        source=f"monitor-{source_type}",
+        allowed_lateness=float(os.getenv('ALLOWED_LATENESS_SECONDS', 5))
+    )
+    service = MonitoringService(
+        monitor, source,
+        window_size=int(os.getenv('WINDOW_SIZE', 1000)),
+        max_interval=float(os.getenv('MAX_WINDOW_INTERVAL', 60)),
+        min_rows=int(os.getenv('MIN_WINDOW_ROWS', 100)),
+        lateness_recorder=lateness_recorder,
+        drift_method=drift_method
+    )
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
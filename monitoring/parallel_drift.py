@@ -0,0 +1,349 @@
+"""
+Параллельная оценка drift по окнам, сегментам и группам признаков
+Референсные и текущие данные кодируются в блоки float64 в разделяемой памяти (shared memory):
+числовые колонки как есть, категориальные - номерами категорий. Процессы пула подключаются
+к блокам один раз при старте и получают задания в виде диапазонов строк, без передачи DataFrame
+"""
+import argparse
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from drift_metrics import (
+    METRIC_COLUMNS, PSI_BINS, _distribution_distances, _split_columns,
+    apply_drift_rules, drift_summary, numeric_drift_metrics, prepare_features
+)
+
+logger = logging.getLogger(__name__)
+
+# Блоки разделяемой памяти, к которым подключен процесс пула: имя блока -> (SharedMemory, матрица)
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+
+def available_cpus() -> int:
+    """Число ядер, доступных процессу с учетом cpuset и квоты CPU контейнера (cgroup)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    for path, parse in (('/sys/fs/cgroup/cpu.max', _parse_cgroup_v2),
+                        ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', _parse_cgroup_v1)):
+        try:
+            with open(path) as f:
+                quota = parse(f.read(), path)
+        except (OSError, ValueError):
+            continue
+        if quota:
+            cpus = min(cpus, max(1, int(np.ceil(quota))))
+        break
+    return max(1, cpus)
+
+
+def _parse_cgroup_v2(content: str, _path: str) -> Optional[float]:
+    quota, period = content.split()[:2]
+    return None if quota == 'max' else float(quota) / float(period)
+
+
+def _parse_cgroup_v1(content: str, path: str) -> Optional[float]:
+    quota = float(content.strip())
+    if quota <= 0:
+        return None
+    with open(os.path.join(os.path.dirname(path), 'cpu.cfs_period_us')) as f:
+        return quota / float(f.read().strip())
+
+
+class SharedColumns:
+    """Матрица колонок (строки x колонки, float64) в разделяемой памяти"""
+
+    def __init__(self, values: np.ndarray):
+        self.shape = values.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        array = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        array[:] = values
+
+    @property
+    def spec(self) -> Tuple[str, Tuple[int, int]]:
+        """Описание блока для процессов пула: имя и форма"""
+        return self.shm.name, self.shape
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _encode(reference: pd.DataFrame, current: pd.DataFrame, numeric: List[str], categorical: List[str]):
+    """
+    Кодирование признаков в float64: категории нумеруются общим словарем референса и текущих данных
+
+    Returns:
+        (матрица референса, матрица текущих данных, число категорий по категориальным колонкам)
+    """
+    ref_blocks = [reference[numeric].to_numpy(dtype=np.float64, na_value=np.nan)]
+    cur_blocks = [current[numeric].to_numpy(dtype=np.float64, na_value=np.nan)]
+    n_categories = []
+    for col in categorical:
+        codes, uniques = pd.factorize(pd.concat([reference[col], current[col]], ignore_index=True).astype(str))
+        ref_blocks.append(codes[:len(reference), None].astype(np.float64))
+        cur_blocks.append(codes[len(reference):, None].astype(np.float64))
+        n_categories.append(len(uniques))
+    return np.hstack(ref_blocks), np.hstack(cur_blocks), n_categories
+
+
+def _attach(spec: Tuple[str, Tuple[int, int]]) -> np.ndarray:
+    name, shape = spec
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+    return _attached[name][1]
+
+
+def _init_worker(ref_spec, cur_spec):
+    """Подключение процесса пула к блокам разделяемой памяти"""
+    _attach(ref_spec)
+    _attach(cur_spec)
+
+
+def _evaluate_job(ref_spec, cur_spec, job: Dict) -> Dict:
+    """
+    Метрики drift для одного задания: диапазон строк текущих данных x группа колонок
+
+    Колонки задания заданы номерами в матрице; числовые идут первыми, затем категориальные.
+    Референс - диапазон строк того же сегмента (или весь референс)
+    """
+    reference = _attach(ref_spec)[job['ref_start']:job['ref_stop']]
+    current = _attach(cur_spec)[job['start']:job['stop']]
+    result = {name: [] for name in ('psi', 'js', 'ks', 'ks_pvalue', 'wasserstein')}
+    numeric = job['numeric']
+    if numeric and len(current):
+        metrics = numeric_drift_metrics(reference[:, numeric], current[:, numeric], bins=job['bins'])
+        for name in result:
+            result[name].extend(metrics[name].tolist())
+    elif numeric:
+        for name in result:
+            result[name].extend([np.nan] * len(numeric))
+    for column, n_categories in job['categorical']:
+        ref_counts = np.bincount(reference[:, column].astype(np.int64), minlength=n_categories)
+        cur_counts = np.bincount(current[:, column].astype(np.int64), minlength=n_categories)
+        psi, js = _distribution_distances(ref_counts[None, :].astype(np.float64), cur_counts[None, :].astype(np.float64))
+        result['psi'].append(float(psi[0]) if len(current) else np.nan)
+        result['js'].append(float(js[0]) if len(current) else np.nan)
+        for name in ('ks', 'ks_pvalue', 'wasserstein'):
+            result[name].append(np.nan)
+    return {'key': job['key'], 'features': job['features'], 'rows': job['stop'] - job['start'],
+            'reference_rows': job['ref_stop'] - job['ref_start'], **result}
+
+
+class ParallelDriftEvaluator:
+    """
+    Параллельная оценка drift текущих данных относительно референса
+
+    Текущие данные делятся на группы (сегмент x окно), каждая группа и каждая часть признаков -
+    отдельное задание пула процессов. Каждый сегмент сравнивается с референсными строками того же
+    сегмента; весь референс используется, только если в нем нет строк сегмента.
+    Результат - матрица (сегмент, окно, признак) x метрики
+    """
+
+    def __init__(self, reference: pd.DataFrame, max_workers: Optional[int] = None, bins: int = PSI_BINS):
+        self.reference = prepare_features(reference)
+        self.reference_rows = len(reference)
+        self.max_workers = max_workers or available_cpus()
+        self.bins = bins
+
+    def _reference_segments(self, segment_by: Optional[str]):
+        """
+        Перестановка строк референса по сегментам и диапазон строк каждого сегмента
+
+        Returns:
+            (перестановка строк референса, словарь сегмент -> (начало, конец))
+        """
+        if not segment_by or segment_by not in self.reference.columns:
+            return np.arange(len(self.reference)), {}
+        segments = self.reference[segment_by].astype(str).to_numpy()
+        order = np.argsort(segments, kind='stable')
+        ordered = segments[order]
+        names, starts, counts = np.unique(ordered, return_index=True, return_counts=True)
+        return order, {name: (int(start), int(start + count)) for name, start, count in zip(names, starts, counts)}
+
+    def _groups(self, current: pd.DataFrame, segment_by: Optional[str], window_column: Optional[str],
+                window_freq: Optional[str], window_rows: Optional[int]):
+        """
+        Разбиение текущих данных на группы сегмент x окно
+
+        Returns:
+            (перестановка строк, при которой каждая группа занимает непрерывный диапазон,
+             список (ключ группы, начало, конец))
+        """
+        keys = pd.DataFrame(index=current.index)
+        keys['segment'] = current[segment_by].astype(str).to_numpy() if segment_by else 'all'
+        if window_column:
+            timestamps = pd.to_datetime(current[window_column], errors='coerce')
+            keys['window'] = timestamps.dt.floor(window_freq or '1h').astype(str).to_numpy()
+        elif window_rows:
+            keys['window'] = np.arange(len(current)) // window_rows
+        else:
+            keys['window'] = 0
+        positions = np.arange(len(current))
+        order = np.lexsort((positions, keys['window'].to_numpy(), keys['segment'].to_numpy()))
+        ordered = keys.iloc[order]
+        changes = np.flatnonzero(
+            (ordered['segment'].to_numpy()[1:] != ordered['segment'].to_numpy()[:-1]) |
+            (ordered['window'].to_numpy()[1:] != ordered['window'].to_numpy()[:-1])
+        ) + 1
+        bounds = np.concatenate([[0], changes, [len(ordered)]])
+        groups = [((ordered['segment'].iat[start], ordered['window'].iat[start]), int(start), int(stop))
+                  for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+        return order, groups
+
+    def evaluate(self, current: pd.DataFrame, segment_by: Optional[str] = None,
+                 window_column: Optional[str] = None, window_freq: Optional[str] = None,
+                 window_rows: Optional[int] = None, feature_chunks: int = 1,
+                 features: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Параллельная оценка drift
+
+        Args:
+            current: Текущие данные
+            segment_by: Колонка сегментации (например, discharge_destination)
+            window_column: Колонка времени для окон по времени
+            window_freq: Размер окна по времени (например, '1h')
+            window_rows: Размер окна в строках (если окна не по времени)
+            feature_chunks: На сколько частей делить признаки внутри одной группы
+            features: Подмножество признаков (по умолчанию все; колонка сегментации не оценивается)
+
+        Returns:
+            DataFrame с индексом (segment, window, feature) и колонками метрик, rows, reference_rows
+        """
+        start_time = time.time()
+        order, groups = self._groups(current, segment_by, window_column, window_freq, window_rows)
+        current_features = prepare_features(current)
+        numeric, categorical = _split_columns(self.reference, current_features)
+        # Внутри сегмента распределение колонки сегментации вырождено, ее drift не имеет смысла
+        numeric = [c for c in numeric if c != segment_by]
+        categorical = [c for c in categorical if c != segment_by]
+        if features is not None:
+            numeric = [c for c in numeric if c in features]
+            categorical = [c for c in categorical if c in features]
+
+        ref_matrix, cur_matrix, n_categories = _encode(self.reference, current_features, numeric, categorical)
+        cur_matrix = cur_matrix[order]
+        ref_order, ref_segments = self._reference_segments(segment_by)
+        ref_matrix = ref_matrix[ref_order]
+        columns = [(i, name) for i, name in enumerate(numeric + categorical)]
+        chunks = [list(chunk) for chunk in np.array_split(np.arange(len(columns)), max(1, feature_chunks)) if len(chunk)]
+
+        jobs = []
+        for key, start, stop in groups:
+            ref_start, ref_stop = ref_segments.get(key[0], (0, len(ref_matrix)))
+            for chunk in chunks:
+                jobs.append({
+                    'key': key,
+                    'start': start,
+                    'stop': stop,
+                    'ref_start': ref_start,
+                    'ref_stop': ref_stop,
+                    'bins': self.bins,
+                    'features': [columns[i][1] for i in chunk],
+                    'numeric': [int(i) for i in chunk if i < len(numeric)],
+                    'categorical': [(int(i), n_categories[i - len(numeric)]) for i in chunk if i >= len(numeric)],
+                })
+
+        ref_shared = SharedColumns(ref_matrix)
+        cur_shared = SharedColumns(cur_matrix)
+        try:
+            workers = min(self.max_workers, len(jobs)) or 1
+            if workers == 1:
+                _init_worker(ref_shared.spec, cur_shared.spec)
+                results = [_evaluate_job(ref_shared.spec, cur_shared.spec, job) for job in jobs]
+                _detach_all()
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(ref_shared.spec, cur_shared.spec)) as pool:
+                    results = list(pool.map(_evaluate_job, [ref_shared.spec] * len(jobs),
+                                            [cur_shared.spec] * len(jobs), jobs,
+                                            chunksize=max(1, len(jobs) // (workers * 4))))
+        finally:
+            ref_shared.release()
+            cur_shared.release()
+
+        frame = self._combine(results, numeric)
+        logger.info(f"Parallel drift evaluation: {len(groups)} groups, {len(jobs)} jobs, "
+                    f"{workers} workers, {time.time() - start_time:.2f}s")
+        return frame
+
+    def _combine(self, results: List[Dict], numeric: List[str]) -> pd.DataFrame:
+        """Сборка результатов заданий в общую матрицу с решениями о drift"""
+        rows = []
+        for result in results:
+            segment, window = result['key']
+            for i, feature in enumerate(result['features']):
+                rows.append({
+                    'segment': segment,
+                    'window': window,
+                    'feature': feature,
+                    'kind': 'numeric' if feature in numeric else 'categorical',
+                    'rows': result['rows'],
+                    'reference_rows': result['reference_rows'],
+                    **{name: result[name][i] for name in ('psi', 'js', 'ks', 'ks_pvalue', 'wasserstein')},
+                })
+        if not rows:
+            return pd.DataFrame(columns=METRIC_COLUMNS + ['rows', 'reference_rows'])
+        frame = pd.DataFrame(rows).set_index(['segment', 'window', 'feature']).sort_index()
+        # Выбор теста зависит от размера референса, а он у сегментов свой
+        decided = pd.concat([apply_drift_rules(group, int(reference_rows))
+                             for reference_rows, group in frame.groupby('reference_rows', sort=False)]).sort_index()
+        decided['rows'] = frame['rows']
+        decided['reference_rows'] = frame['reference_rows']
+        return decided
+
+
+def _detach_all():
+    for shm, _ in _attached.values():
+        shm.close()
+    _attached.clear()
+
+
+def summarize_groups(matrix: pd.DataFrame) -> pd.DataFrame:
+    """Итог drift по каждой группе (сегмент, окно): drift_score и список сместившихся признаков"""
+    summaries = []
+    for (segment, window), group in matrix.groupby(level=['segment', 'window'], sort=True):
+        summary = drift_summary(group.droplevel(['segment', 'window']))
+        summaries.append({'segment': segment, 'window': window, 'rows': int(group['rows'].iloc[0]), **summary})
+    return pd.DataFrame(summaries).set_index(['segment', 'window'])
+
+
+def main():
+    """Основная функция: backfill drift по окнам и сегментам"""
+    parser = argparse.ArgumentParser(description="Параллельная оценка drift по окнам и сегментам")
+    parser.add_argument("reference", help="CSV с референсными данными")
+    parser.add_argument("current", help="CSV с текущими данными")
+    parser.add_argument("--segment-by", help="Колонка сегментации (например, discharge_destination)")
+    parser.add_argument("--window-column", help="Колонка времени для окон")
+    parser.add_argument("--window-freq", default="1h", help="Размер окна по времени")
+    parser.add_argument("--window-rows", type=int, help="Размер окна в строках (если нет колонки времени)")
+    parser.add_argument("--feature-chunks", type=int, default=1, help="На сколько частей делить признаки")
+    parser.add_argument("--workers", type=int, help="Число процессов (по умолчанию - доступные ядра)")
+    parser.add_argument("--output", default="drift_backfill.csv", help="CSV с матрицей результатов")
+    args = parser.parse_args()
+
+    evaluator = ParallelDriftEvaluator(pd.read_csv(args.reference), max_workers=args.workers)
+    matrix = evaluator.evaluate(
+        pd.read_csv(args.current), segment_by=args.segment_by, window_column=args.window_column,
+        window_freq=args.window_freq, window_rows=args.window_rows, feature_chunks=args.feature_chunks
+    )
+    matrix.to_csv(args.output)
+    summary = summarize_groups(matrix)
+    print(summary[['rows', 'drift_score', 'drift_detected']].to_string())
+    print(f"\nГрупп с drift: {int(summary['drift_detected'].sum())} из {len(summary)}; матрица сохранена в {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
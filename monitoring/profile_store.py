@@ -0,0 +1,209 @@
+"""
+Хранение референсного профиля в компактном бинарном файле
+Профиль (сводки колонок, квантили и выборка строк) строится один раз командой build,
+а монитор открывает файл через memory mapping: время старта и занимаемая память
+не зависят от размера референсного датасета
+
+Формат файла: MAGIC, длина заголовка (uint64), JSON-заголовок, выравнивание до 8 байт,
+затем один непрерывный блок float64, на который ссылаются смещения из заголовка
+"""
+import argparse
+import json
+import struct
+import sys
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_loader import load_dataset
+from drift_profile import ColumnProfile, ReferenceProfile
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DRPROF1\n'
+FORMAT_VERSION = 1
+
+
+class _ArrayWriter:
+    """Накопление массивов в один блок float64 с запоминанием смещений"""
+
+    def __init__(self):
+        self.chunks: List[np.ndarray] = []
+        self.size = 0
+
+    def add(self, values) -> List[int]:
+        array = np.ascontiguousarray(values, dtype=np.float64)
+        ref = [self.size, len(array)]
+        self.chunks.append(array)
+        self.size += len(array)
+        return ref
+
+
+def save_profile(profile: ReferenceProfile, path: str, sample: Optional[pd.DataFrame] = None):
+    """
+    Сохранение профиля в бинарный файл
+
+    Args:
+        profile: Референсный профиль
+        path: Путь к файлу профиля
+        sample: Выборка строк референсных данных (для Evidently и проверки схемы)
+    """
+    writer = _ArrayWriter()
+    columns = []
+    for col in profile.columns.values():
+        columns.append({
+            'name': col.name,
+            'kind': col.kind,
+            'ref_counts': writer.add(col.ref_counts),
+            'bin_edges': writer.add(col.bin_edges) if col.bin_edges is not None else None,
+            'categories': col.categories,
+            'quantiles': col.quantiles,
+            'mean': col.mean,
+            'std': col.std,
+        })
+
+    sample_header = None
+    if sample is not None:
+        sample_columns = []
+        for name in sample.columns:
+            series = sample[name]
+            entry = {'name': name, 'dtype': str(series.dtype)}
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                entry['kind'] = 'numeric'
+                entry['data'] = writer.add(series.to_numpy(dtype=np.float64, na_value=np.nan))
+            else:
+                # Строки кодируются номерами категорий, пропуски - NaN
+                codes, categories = pd.factorize(series.astype('object'), use_na_sentinel=True)
+                entry['kind'] = 'categorical'
+                entry['categories'] = [str(c) for c in categories]
+                entry['data'] = writer.add(np.where(codes < 0, np.nan, codes))
+            sample_columns.append(entry)
+        sample_header = {'rows': len(sample), 'columns': sample_columns}
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'created_at': time.time(),
+        'row_count': profile.row_count,
+        'columns': columns,
+        'sample': sample_header,
+    }).encode('utf-8')
+    padding = (-(len(MAGIC) + 8 + len(header))) % 8
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * padding)
+        for chunk in writer.chunks:
+            f.write(chunk.tobytes())
+    logger.info(f"Reference profile saved to {path}: {len(columns)} columns, "
+                f"{sample_header['rows'] if sample_header else 0} sampled rows")
+
+
+class StoredProfile:
+    """Профиль, открытый из файла через memory mapping"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a reference profile file")
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(header_len))
+        if self.header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported profile version: {self.header['version']}")
+        data_offset = len(MAGIC) + 8 + header_len
+        data_offset += (-data_offset) % 8
+        # Страницы файла подгружаются ОС по мере обращения к массивам
+        self.data = np.memmap(path, dtype=np.float64, mode='r', offset=data_offset)
+        self.profile = ReferenceProfile(
+            {c['name']: self._column(c) for c in self.header['columns']},
+            self.header['row_count']
+        )
+
+    def _array(self, ref: Optional[List[int]]) -> Optional[np.ndarray]:
+        if ref is None:
+            return None
+        offset, length = ref
+        return self.data[offset:offset + length]
+
+    def _column(self, entry: Dict) -> ColumnProfile:
+        return ColumnProfile(
+            entry['name'], entry['kind'], self._array(entry['ref_counts']),
+            bin_edges=self._array(entry['bin_edges']), categories=entry['categories'],
+            quantiles=entry['quantiles'], mean=entry['mean'], std=entry['std']
+        )
+
+    def sample_frame(self) -> Optional[pd.DataFrame]:
+        """Выборка референсных строк с исходными типами колонок"""
+        sample = self.header.get('sample')
+        if not sample:
+            return None
+        data = {}
+        for entry in sample['columns']:
+            values = np.array(self._array(entry['data']))
+            if entry['kind'] == 'numeric':
+                series = pd.Series(values)
+                if entry['dtype'].startswith(('int', 'uint')) and not series.isna().any():
+                    series = series.astype(entry['dtype'])
+            else:
+                categories = np.array(entry['categories'] + [None], dtype=object)
+                codes = np.where(np.isnan(values), len(entry['categories']), values).astype(np.int64)
+                series = pd.Series(categories[codes], dtype=object)
+                if entry['dtype'] != 'object' and not series.isna().any():
+                    series = series.astype(entry['dtype'])
+            data[entry['name']] = series
+        return pd.DataFrame(data)
+
+
+def open_profile(path: str) -> StoredProfile:
+    """Открытие сохраненного профиля"""
+    stored = StoredProfile(path)
+    logger.info(f"Reference profile opened from {path}: {len(stored.profile.columns)} columns, "
+                f"built from {stored.profile.row_count} rows")
+    return stored
+
+
+def build_profile_file(data_path: str, output_path: str, sample_rows: int = 5000, bins: int = 10):
+    """
+    Команда build: построение профиля по CSV и сохранение в файл
+
+    CSV читается тем же типизированным загрузчиком, что и окна монитора, поэтому типы колонок
+    профиля (категории, уменьшенные целые) совпадают с типами сравниваемых данных
+    """
+    if sample_rows < 1:
+        raise ValueError("sample_rows must be at least 1")
+    data = load_dataset(data_path)
+    profile = ReferenceProfile.build(data, bins=bins)
+    sample = data.sample(min(sample_rows, len(data)), random_state=42)
+    save_profile(profile, output_path, sample=sample)
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Построение референсного профиля для мониторинга drift")
+    parser.add_argument("command", choices=["build"], help="Команда")
+    parser.add_argument("data", help="CSV с референсными данными")
+    parser.add_argument("output", help="Путь к файлу профиля")
+    parser.add_argument("--sample-rows", type=_positive_int, default=5000,
+                        help="Количество сохраняемых строк выборки (не меньше 1: монитор использует ее как референс)")
+    parser.add_argument("--bins", type=int, default=10, help="Количество квантильных корзин для числовых колонок")
+    args = parser.parse_args()
+
+    build_profile_file(args.data, args.output, sample_rows=args.sample_rows, bins=args.bins)
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
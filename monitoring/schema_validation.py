@@ -0,0 +1,196 @@
+"""
+Декларативная проверка схемы и качества данных
+Правила колонок (тип, допустимость пропусков, диапазон, регулярное выражение, перечисление)
+описываются в JSON (readmissions_schema.json) и проверяются векторизованно по частям файла,
+поэтому объем проверяемых данных не ограничен памятью
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'readmissions_schema.json')
+
+
+def load_schema(path: str = DEFAULT_SCHEMA_PATH) -> Dict:
+    """Загрузка схемы из JSON"""
+    with open(path) as f:
+        return json.load(f)
+
+
+class ValidationReport:
+    """Счетчики нарушений по правилам и примеры идентификаторов строк"""
+
+    def __init__(self, sample_size: int = 5):
+        self.sample_size = sample_size
+        self.violations: Dict[str, int] = {}
+        self.samples: Dict[str, List] = {}
+        self.missing_columns: List[str] = []
+        self.unexpected_columns: List[str] = []
+        self.rows = 0
+        self.violating_rows = 0
+        self.chunks = 0
+        self.elapsed = 0.0
+        # Строки текущей части, нарушившие хотя бы одно правило
+        self._chunk_invalid: Optional[np.ndarray] = None
+
+    def add(self, column: str, rule: str, mask: np.ndarray, ids: np.ndarray):
+        count = int(mask.sum())
+        if count == 0:
+            return
+        if self._chunk_invalid is not None:
+            self._chunk_invalid |= mask
+        key = f"{column}:{rule}"
+        self.violations[key] = self.violations.get(key, 0) + count
+        samples = self.samples.setdefault(key, [])
+        if len(samples) < self.sample_size:
+            samples.extend(ids[mask][:self.sample_size - len(samples)].tolist())
+
+    @property
+    def total_violations(self) -> int:
+        return sum(self.violations.values())
+
+    @property
+    def violating_ratio(self) -> float:
+        """Доля строк, нарушивших хотя бы одно правило"""
+        return self.violating_rows / self.rows if self.rows else 0.0
+
+    @property
+    def rows_per_minute(self) -> float:
+        return self.rows / self.elapsed * 60 if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'rows': self.rows,
+            'chunks': self.chunks,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_minute': round(self.rows_per_minute),
+            'missing_columns': self.missing_columns,
+            'unexpected_columns': self.unexpected_columns,
+            'total_violations': self.total_violations,
+            'violating_rows': self.violating_rows,
+            'violations': self.violations,
+            'samples': {key: [str(i) for i in ids] for key, ids in self.samples.items()},
+        }
+
+
+class SchemaValidator:
+    """Проверка DataFrame или CSV-файла по декларативной схеме"""
+
+    def __init__(self, schema: Optional[Dict] = None, sample_size: int = 5):
+        self.schema = schema or load_schema()
+        self.columns = self.schema['columns']
+        self.id_column = self.schema.get('id_column')
+        self.sample_size = sample_size
+        # Индексы допустимых значений перечислений строятся один раз
+        self._enums = {name: pd.Index(rule['enum']) for name, rule in self.columns.items() if 'enum' in rule}
+
+    def validate_frame(self, data: pd.DataFrame, report: Optional[ValidationReport] = None) -> ValidationReport:
+        """Проверка одной части данных; результаты добавляются к report"""
+        start = time.perf_counter()
+        report = report or ValidationReport(self.sample_size)
+        if self.id_column and self.id_column in data.columns:
+            ids = data[self.id_column].to_numpy()
+        else:
+            ids = np.arange(report.rows, report.rows + len(data))
+
+        report._chunk_invalid = np.zeros(len(data), dtype=bool)
+        for name, rule in self.columns.items():
+            if name not in data.columns:
+                if name not in report.missing_columns:
+                    report.missing_columns.append(name)
+                # Отсутствие обязательной колонки - нарушение для каждой строки части; необязательная
+                # (required: false или nullable) отмечается один раз в missing_columns
+                if rule.get('required', not rule.get('nullable', True)):
+                    report.add(name, 'missing', np.ones(len(data), dtype=bool), ids)
+                continue
+            self._validate_column(name, rule, data[name], ids, report)
+        for name in data.columns:
+            if name not in self.columns and name not in report.unexpected_columns:
+                report.unexpected_columns.append(name)
+
+        report.violating_rows += int(report._chunk_invalid.sum())
+        report._chunk_invalid = None
+        report.rows += len(data)
+        report.chunks += 1
+        report.elapsed += time.perf_counter() - start
+        return report
+
+    def _validate_column(self, name: str, rule: Dict, series: pd.Series, ids: np.ndarray, report: ValidationReport):
+        null = series.isna().to_numpy()
+        if not rule.get('nullable', True):
+            report.add(name, 'null', null, ids)
+
+        kind = rule.get('type', 'string')
+        if kind in ('integer', 'number'):
+            values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            invalid = np.isnan(values) & ~null
+            if kind == 'integer':
+                invalid |= ~np.isnan(values) & (values != np.floor(values))
+            report.add(name, 'type', invalid, ids)
+            checked = ~np.isnan(values)
+            if 'min' in rule:
+                report.add(name, 'min', checked & (values < rule['min']), ids)
+            if 'max' in rule:
+                report.add(name, 'max', checked & (values > rule['max']), ids)
+            return
+
+        text = series.astype(str)
+        if 'regex' in rule:
+            matched = text.str.fullmatch(rule['regex']).fillna(False).to_numpy(dtype=bool)
+            report.add(name, 'regex', ~matched & ~null, ids)
+        if name in self._enums:
+            known = self._enums[name].get_indexer(text) >= 0
+            report.add(name, 'enum', ~known & ~null, ids)
+
+    def validate_file(self, path: str, chunksize: int = 200000) -> ValidationReport:
+        """Проверка CSV-файла по частям по chunksize строк"""
+        report = ValidationReport(self.sample_size)
+        started = time.perf_counter()
+        # Все колонки читаются строками: типы проверяются правилами, а не выводом типов pandas
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=True):
+            self.validate_frame(chunk, report)
+        report.elapsed = time.perf_counter() - started
+        logger.info(f"Validated {report.rows} rows from {path} in {report.elapsed:.2f}s "
+                    f"({report.rows_per_minute:,.0f} rows/min), {report.total_violations} violations")
+        return report
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Проверка данных по декларативной схеме")
+    parser.add_argument("data", help="CSV-файл для проверки")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="JSON-файл схемы")
+    parser.add_argument("--chunksize", type=int, default=200000, help="Строк в одной части файла")
+    parser.add_argument("--samples", type=int, default=5, help="Примеров идентификаторов строк на правило")
+    parser.add_argument("--output", help="JSON-файл с отчетом")
+    args = parser.parse_args()
+
+    validator = SchemaValidator(load_schema(args.schema), sample_size=args.samples)
+    report = validator.validate_file(args.data, chunksize=args.chunksize).to_dict()
+
+    print(f"Строк: {report['rows']}, частей: {report['chunks']}, "
+          f"скорость: {report['rows_per_minute']:,} строк/мин")
+    if report['missing_columns']:
+        print(f"Отсутствующие колонки: {', '.join(report['missing_columns'])}")
+    for key, count in sorted(report['violations'].items(), key=lambda item: -item[1]):
+        print(f"  {key:<32s} {count:>10d}  примеры: {', '.join(report['samples'][key])}")
+    if not report['violations']:
+        print("Нарушений нет")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['total_violations'] else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
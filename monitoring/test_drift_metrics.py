@@ -0,0 +1,61 @@
+"""
+Проверка векторизованных метрик drift (drift_metrics)
+
+Запуск: python -m pytest monitoring/test_drift_metrics.py
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from drift_metrics import SMALL_SAMPLE_ROWS, _ks_pvalue, compute_drift_metrics  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'hospital_readmissions_30k.csv')
+
+
+class KsPvalueTest(unittest.TestCase):
+
+    def test_zero_statistic_gives_pvalue_one(self):
+        pvalues = _ks_pvalue(np.array([0.0, 1e-4, 0.01]), np.full(3, 800.0), np.full(3, 800.0))
+        np.testing.assert_allclose(pvalues, 1.0)
+
+    def test_matches_kolmogorov_distribution(self):
+        # Значения функции выживания распределения Колмогорова (scipy.stats.kstwobign.sf)
+        statistic = np.array([0.03, 0.05, 0.07, 0.1])
+        expected = np.array([8.59258512e-01, 2.63333882e-01, 3.77711420e-02, 6.06644367e-04])
+        np.testing.assert_allclose(_ks_pvalue(statistic, np.full(4, 800.0), np.full(4, 800.0)), expected,
+                                   rtol=1e-6)
+
+    def test_pvalue_decreases_with_statistic(self):
+        pvalues = _ks_pvalue(np.linspace(0, 0.2, 50), np.full(50, 800.0), np.full(50, 800.0))
+        self.assertTrue(np.all(np.diff(pvalues) <= 1e-12))
+
+
+class ComputeDriftMetricsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = pd.read_csv(DATA_PATH, nrows=800)
+
+    def test_identical_small_sample_has_no_drift(self):
+        self.assertLessEqual(len(self.reference), SMALL_SAMPLE_ROWS)
+        metrics = compute_drift_metrics(self.reference, self.reference.copy())
+        numeric = metrics[metrics['kind'] == 'numeric']
+        self.assertTrue((numeric['stattest'] == 'ks').all())
+        np.testing.assert_allclose(numeric['ks_pvalue'].to_numpy(), 1.0)
+        self.assertEqual(list(metrics.index[metrics['drifted']]), [])
+
+    def test_shifted_small_sample_is_detected(self):
+        current = self.reference.copy()
+        current['age'] = current['age'] + 15
+        metrics = compute_drift_metrics(self.reference, current)
+        self.assertTrue(metrics.loc['age', 'drifted'])
+        self.assertLess(metrics.loc['age', 'ks_pvalue'], 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Проверка параллельной оценки drift по сегментам (parallel_drift)
+
+Запуск: python -m pytest monitoring/test_parallel_drift.py
+"""
+import os
+import sys
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from drift_metrics import SMALL_SAMPLE_ROWS  # noqa: E402
+from parallel_drift import ParallelDriftEvaluator  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'hospital_readmissions_30k.csv')
+SEGMENT = 'discharge_destination'
+
+
+class SegmentDriftTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = pd.read_csv(DATA_PATH, nrows=1200)
+
+    def evaluate(self, current: pd.DataFrame) -> pd.DataFrame:
+        return ParallelDriftEvaluator(self.reference, max_workers=1).evaluate(current, segment_by=SEGMENT)
+
+    def test_unchanged_small_segments_have_no_drift(self):
+        matrix = self.evaluate(self.reference.copy())
+        # Референсы сегментов малы, поэтому числовые признаки проверяются KS-тестом
+        self.assertTrue((matrix['reference_rows'] <= SMALL_SAMPLE_ROWS).all())
+        numeric = matrix[matrix['kind'] == 'numeric']
+        self.assertTrue((numeric['stattest'] == 'ks').all())
+        self.assertEqual(matrix.index[matrix['drifted']].tolist(), [])
+        self.assertNotIn(SEGMENT, matrix.index.get_level_values('feature'))
+
+    def test_shift_in_one_segment_is_detected(self):
+        current = self.reference.copy()
+        segment = current[SEGMENT].value_counts().index[0]
+        shifted = current[SEGMENT] == segment
+        current.loc[shifted, 'age'] = current.loc[shifted, 'age'] + 15
+        matrix = self.evaluate(current)
+        drifted = matrix.index[matrix['drifted']].tolist()
+        self.assertEqual(drifted, [(segment, 0, 'age')])
+
+
+if __name__ == '__main__':
+    unittest.main()
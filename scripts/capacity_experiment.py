@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+A/B эксперимент по емкости: варианты конфигурации под одинаковой нагрузкой.
+
+Для каждого повтора и варианта скрипт применяет конфигурацию (например, включает или выключает
+dynamic allocation), ждет прогрева, запускает load-generator с фиксированным профилем нагрузки
+и одновременно собирает CPU/RAM подов (resource_sampler.py). Пропускная способность и ресурсы
+связываются в метрики эффективности:
+    - событий на ядро-секунду CPU;
+    - ГБ-секунд памяти на миллион событий;
+    - p99 задержки (подтверждения Kafka; end-to-end зонда, если задан Prometheus).
+По повторам считаются средние и 95% доверительные интервалы, а также изменение стоимости
+относительно первого (базового) варианта. Порядок вариантов перемешивается в каждом повторе,
+чтобы медленный дрейф кластера не приписывался одному варианту.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from resource_sampler import KubeApiClient, ResourceSampler, TimeSeriesWriter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "load-generator"))
+from sketch import QuantileSketch  # noqa: E402
+
+COST_REDUCTION_TARGET = 0.35
+# Квантили t-распределения Стьюдента для двустороннего 95% интервала (степени свободы 1-30)
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+METRICS = ["events_per_core_second", "gb_seconds_per_million_events", "p99_latency_ms",
+           "achieved_rate", "avg_cpu_cores", "avg_memory_gb"]
+
+
+def t_quantile(df: int) -> float:
+    return T_95[df - 1] if df <= len(T_95) else 1.96
+
+
+def confidence_interval(values: List[float]) -> Dict:
+    """Среднее и полуширина 95% доверительного интервала по повторам"""
+    values = [v for v in values if v is not None]
+    n = len(values)
+    if n == 0:
+        return {"mean": None, "ci95": None, "n": 0}
+    mean = sum(values) / n
+    if n == 1:
+        return {"mean": mean, "ci95": None, "n": 1}
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    return {"mean": mean, "ci95": t_quantile(n - 1) * std / math.sqrt(n), "n": n}
+
+
+def relative_change(baseline: List[float], variant: List[float]) -> Optional[Dict]:
+    """
+    Изменение среднего варианта относительно базового в процентах с 95% интервалом
+
+    Интервал разности средних - по Уэлчу, затем делится на среднее базового варианта
+    """
+    a, b = [v for v in baseline if v is not None], [v for v in variant if v is not None]
+    if len(a) < 2 or len(b) < 2:
+        return None
+    mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+    var_a = sum((v - mean_a) ** 2 for v in a) / (len(a) - 1) / len(a)
+    var_b = sum((v - mean_b) ** 2 for v in b) / (len(b) - 1) / len(b)
+    se = math.sqrt(var_a + var_b)
+    if se > 0:
+        df = (var_a + var_b) ** 2 / (var_a ** 2 / (len(a) - 1) + var_b ** 2 / (len(b) - 1))
+    else:
+        df = len(a) + len(b) - 2
+    half = t_quantile(max(1, int(df))) * se
+    diff = mean_b - mean_a
+    return {
+        "percent": diff / mean_a * 100,
+        "ci95_low": (diff - half) / mean_a * 100,
+        "ci95_high": (diff + half) / mean_a * 100,
+    }
+
+
+def integrate(samples: List[Dict], started_at: float, finished_at: float) -> Tuple[float, float, int]:
+    """
+    Ядро-секунды CPU и ГБ-секунды памяти подов за интервал прогона (метод трапеций)
+
+    Returns:
+        (ядро-секунды, ГБ-секунды, число измерений в интервале)
+    """
+    points = []
+    for s in samples:
+        if started_at <= s["timestamp"] <= finished_at and s["pods"]:
+            points.append((s["timestamp"], sum(p["cpu"] for p in s["pods"]), sum(p["memory"] for p in s["pods"])))
+    if len(points) < 2:
+        return 0.0, 0.0, len(points)
+    core_seconds = gb_seconds = 0.0
+    for (t0, cpu0, mem0), (t1, cpu1, mem1) in zip(points, points[1:]):
+        core_seconds += (cpu0 + cpu1) / 2 * (t1 - t0)
+        gb_seconds += (mem0 + mem1) / 2 * (t1 - t0)
+    # Края интервала до первого и после последнего измерения считаются по ближайшему значению
+    core_seconds += points[0][1] * (points[0][0] - started_at) + points[-1][1] * (finished_at - points[-1][0])
+    gb_seconds += points[0][2] * (points[0][0] - started_at) + points[-1][2] * (finished_at - points[-1][0])
+    return core_seconds, gb_seconds, len(points)
+
+
+def run_metrics(summary: Dict, samples: List[Dict], e2e_p99_ms: Optional[float] = None) -> Dict:
+    """Метрики эффективности одного прогона из итогов генератора и временного ряда ресурсов"""
+    started_at, finished_at = summary["started_at"], summary["finished_at"]
+    duration = max(finished_at - started_at, 1e-9)
+    events = summary["successful_requests"]
+    core_seconds, gb_seconds, points = integrate(samples, started_at, finished_at)
+    ack_p99 = QuantileSketch.from_dict(summary["ack_latency_sketch"]).quantile(0.99)
+    return {
+        "duration_seconds": round(duration, 3),
+        "events": events,
+        "failed_events": summary["failed_requests"],
+        "achieved_rate": events / duration,
+        "resource_samples": points,
+        "cpu_core_seconds": core_seconds,
+        "memory_gb_seconds": gb_seconds,
+        "avg_cpu_cores": core_seconds / duration,
+        "avg_memory_gb": gb_seconds / duration,
+        "events_per_core_second": events / core_seconds if core_seconds > 0 else None,
+        "gb_seconds_per_million_events": gb_seconds / events * 1e6 if events else None,
+        "ack_p99_latency_ms": ack_p99,
+        "e2e_p99_latency_ms": e2e_p99_ms,
+        "p99_latency_ms": e2e_p99_ms if e2e_p99_ms is not None else ack_p99,
+    }
+
+
+def query_e2e_p99(prometheus_url: str, started_at: float, finished_at: float) -> Optional[float]:
+    """p99 end-to-end задержки зонда за интервал прогона из Prometheus (мс)"""
+    window = max(int(finished_at - started_at), 1)
+    query = (f"histogram_quantile(0.99, sum(increase(pipeline_e2e_latency_seconds_bucket[{window}s])) by (le))")
+    url = f"{prometheus_url.rstrip('/')}/api/v1/query?{urlencode({'query': query, 'time': finished_at})}"
+    try:
+        with urlopen(url, timeout=10) as response:
+            result = json.load(response)["data"]["result"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Не удалось получить e2e latency из Prometheus: {e}")
+        return None
+    if not result:
+        return None
+    value = float(result[0]["value"][1])
+    return None if math.isnan(value) else value * 1000
+
+
+class ExperimentRunner:
+    """Прогон вариантов конфигурации с фиксированной нагрузкой и сбором ресурсов"""
+
+    def __init__(self, config: Dict, sampler: ResourceSampler, samples_path: str,
+                 prometheus_url: Optional[str] = None, seed: int = 42):
+        self.config = config
+        self.sampler = sampler
+        self.samples_path = samples_path
+        self.prometheus_url = prometheus_url
+        self.rng = random.Random(seed)
+        self.runs: List[Dict] = []
+
+    def apply_variant(self, variant: Dict):
+        if variant.get("apply"):
+            print(f"Применение варианта {variant['name']}: {' '.join(variant['apply'])}")
+            subprocess.run(variant["apply"], cwd=REPO_ROOT, check=True, timeout=variant.get("apply_timeout", 900))
+        time.sleep(variant.get("warmup_seconds", self.config.get("warmup_seconds", 60)))
+
+    def run_load(self, variant: Dict, summary_path: str):
+        """Запуск load-generator с профилем нагрузки эксперимента (одинаковым для всех вариантов)"""
+        load = self.config["load"]
+        env = dict(os.environ)
+        env.update(load.get("env", {}))
+        env.update(variant.get("load_env", {}))
+        env.update({
+            "LOAD_PROFILE": load.get("profile", ""),
+            "DURATION_SECONDS": str(load["duration_seconds"]),
+            "STARTUP_DELAY_SECONDS": "0",
+            "RUN_SUMMARY_PATH": summary_path,
+        })
+        command = load.get("command") or [sys.executable, "generator.py"]
+        subprocess.run(command, cwd=os.path.join(REPO_ROOT, "load-generator"), env=env, check=True,
+                       timeout=load["duration_seconds"] + load.get("startup_timeout", 300))
+
+    def run_once(self, variant: Dict, repeat: int, writer: TimeSeriesWriter) -> Dict:
+        self.apply_variant(variant)
+        label = f"{variant['name']}#{repeat}"
+        stop = threading.Event()
+        samples: List[Dict] = []
+        interval = self.config.get("sample_interval", 1.0)
+        # Измерения пишутся в файл и одновременно остаются в памяти для расчета метрик прогона
+        sampling = threading.Thread(target=self.sampler.run, args=(writer, math.inf, interval, label),
+                                    kwargs={"stop": stop, "on_sample": samples.append}, daemon=True)
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            summary_path = f.name
+        sampling.start()
+        try:
+            self.run_load(variant, summary_path)
+        finally:
+            stop.set()
+            sampling.join()
+        with open(summary_path) as f:
+            summary = json.load(f)
+        os.remove(summary_path)
+
+        e2e_p99 = None
+        if self.prometheus_url:
+            e2e_p99 = query_e2e_p99(self.prometheus_url, summary["started_at"], summary["finished_at"])
+        metrics = run_metrics(summary, samples, e2e_p99)
+        print(f"[{label}] {metrics['achieved_rate']:.0f} событий/с, "
+              f"{metrics['events_per_core_second'] or 0:.0f} событий/ядро-с, "
+              f"{metrics['gb_seconds_per_million_events'] or 0:.1f} ГБ-с/млн, p99={metrics['p99_latency_ms']}мс")
+        return {"variant": variant["name"], "repeat": repeat, **metrics}
+
+    def run(self, on_run=None) -> List[Dict]:
+        """
+        Все повторы всех вариантов; завершенные прогоны накапливаются в self.runs,
+        поэтому остаются доступны, если следующий прогон прерван ошибкой
+        """
+        self.runs = []
+        with TimeSeriesWriter(self.samples_path) as writer:
+            for repeat in range(self.config.get("repeats", 3)):
+                variants = list(self.config["variants"])
+                self.rng.shuffle(variants)
+                for variant in variants:
+                    self.runs.append(self.run_once(variant, repeat, writer))
+                    if on_run:
+                        on_run(self.runs)
+        return self.runs
+
+
+def summarize_runs(runs: List[Dict], variants: List[str]) -> Dict:
+    """Средние с доверительными интервалами по вариантам и изменения относительно базового"""
+    summary = {}
+    baseline = variants[0]
+    for name in variants:
+        variant_runs = [r for r in runs if r["variant"] == name]
+        summary[name] = {metric: confidence_interval([r[metric] for r in variant_runs]) for metric in METRICS}
+        if name != baseline:
+            base_runs = [r for r in runs if r["variant"] == baseline]
+            # Стоимость CPU на событие обратна событиям на ядро-секунду
+            cpu_cost = relative_change([1 / r["events_per_core_second"] for r in base_runs if r["events_per_core_second"]],
+                                       [1 / r["events_per_core_second"] for r in variant_runs if r["events_per_core_second"]])
+            memory_cost = relative_change([r["gb_seconds_per_million_events"] for r in base_runs],
+                                          [r["gb_seconds_per_million_events"] for r in variant_runs])
+            latency = relative_change([r["p99_latency_ms"] for r in base_runs], [r["p99_latency_ms"] for r in variant_runs])
+            summary[name]["vs_baseline"] = {
+                "cpu_cost_per_event": cpu_cost,
+                "memory_cost_per_event": memory_cost,
+                "p99_latency": latency,
+                "meets_cost_target": bool(cpu_cost and cpu_cost["ci95_high"] <= -COST_REDUCTION_TARGET * 100),
+            }
+    return summary
+
+
+def _format(stat: Dict, digits: int = 1) -> str:
+    if stat["mean"] is None:
+        return "-"
+    if stat["ci95"] is None:
+        return f"{stat['mean']:.{digits}f}"
+    return f"{stat['mean']:.{digits}f} ± {stat['ci95']:.{digits}f}"
+
+
+def format_report(summary: Dict, baseline: str) -> str:
+    lines = [
+        "| Вариант | Событий/с | Событий на ядро-с | ГБ-с на млн событий | p99, мс | CPU, ядер | RAM, ГБ |",
+        "|---------|----------:|------------------:|--------------------:|--------:|----------:|--------:|",
+    ]
+    for name, stats in summary.items():
+        lines.append(f"| {name} | {_format(stats['achieved_rate'], 0)} | {_format(stats['events_per_core_second'], 0)} "
+                     f"| {_format(stats['gb_seconds_per_million_events'])} | {_format(stats['p99_latency_ms'])} "
+                     f"| {_format(stats['avg_cpu_cores'], 3)} | {_format(stats['avg_memory_gb'], 3)} |")
+    lines.append("")
+    for name, stats in summary.items():
+        diff = stats.get("vs_baseline")
+        if not diff:
+            continue
+        lines.append(f"Изменение {name} относительно {baseline} (95% ДИ):")
+        for key, title in [("cpu_cost_per_event", "CPU на событие"), ("memory_cost_per_event", "память на событие"),
+                           ("p99_latency", "p99 задержки")]:
+            change = diff[key]
+            if change:
+                lines.append(f"  - {title}: {change['percent']:+.1f}% [{change['ci95_low']:+.1f}%, {change['ci95_high']:+.1f}%]")
+            else:
+                lines.append(f"  - {title}: недостаточно повторов")
+        verdict = "достигнута" if diff["meets_cost_target"] else "не подтверждена"
+        lines.append(f"  - цель снижения стоимости CPU на {COST_REDUCTION_TARGET:.0%}: {verdict}")
+    return "\n".join(lines)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="A/B эксперимент по емкости с метриками эффективности")
+    parser.add_argument("--config", default=os.path.join(REPO_ROOT, "scripts", "capacity_experiment.json"),
+                        help="JSON с вариантами, профилем нагрузки и числом повторов")
+    parser.add_argument("--repeats", type=int, help="Число повторов (переопределяет конфигурацию)")
+    parser.add_argument("--api-server", default=None, help="URL Kubernetes API (по умолчанию in-cluster или kubectl proxy)")
+    parser.add_argument("--prometheus-url", default=None, help="Prometheus для p99 end-to-end задержки зонда")
+    parser.add_argument("--seed", type=int, default=42, help="Seed перемешивания порядка вариантов")
+    parser.add_argument("--samples-output", default="capacity_experiment_samples.csv.gz", help="Временные ряды ресурсов")
+    parser.add_argument("--output", default="capacity_experiment", help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        config = json.load(f)
+    if args.repeats:
+        config["repeats"] = args.repeats
+    resources = config.get("resources", {})
+
+    client = KubeApiClient(args.api_server)
+    sampler = ResourceSampler(client, resources.get("namespace", "bigdata"),
+                              resources.get("selector", "component=taskmanager"),
+                              resources.get("statefulset", "flink-taskmanager"))
+    variants = [v["name"] for v in config["variants"]]
+
+    def save_report(runs: List[Dict], error: Optional[str] = None) -> str:
+        """Отчет по завершенным прогонам; пишется после каждого прогона, чтобы ошибка не теряла результаты"""
+        summary = summarize_runs(runs, variants)
+        report = format_report(summary, variants[0])
+        if error:
+            report = f"Эксперимент прерван после {len(runs)} прогонов: {error}\n\n{report}"
+        with open(f"{args.output}.json", "w", encoding="utf-8") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "config": config, "complete": error is None,
+                       "error": error, "runs": runs, "summary": summary}, f, indent=2, ensure_ascii=False)
+        with open(f"{args.output}.md", "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        return report
+
+    runner = ExperimentRunner(config, sampler, args.samples_output, args.prometheus_url, args.seed)
+    try:
+        runs = runner.run(on_run=save_report)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        print(f"[ERROR] Прогон прерван: {e}")
+        save_report(runner.runs, str(e))
+        print(f"[WARN] Частичные результаты ({len(runner.runs)} прогонов) сохранены в {args.output}.json и {args.output}.md")
+        return 1
+    finally:
+        sampler.close()
+
+    report = save_report(runs)
+    print()
+    print(report)
+    print(f"\n[OK] Результаты сохранены в {args.output}.json и {args.output}.md")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,138 +1,45 @@
 #!/usr/bin/env python3
 """
 Скрипт для сравнения загруженности CPU и RAM с dynamic allocation и без него.
-Собирает реальные метрики из Kubernetes.
+Собирает реальные метрики из Kubernetes API (см. resource_sampler.py) и переключает
+dynamic allocation скриптом toggle_dynamic_allocation.sh, поэтому запуск не требует ввода.
 """
 
+import os
 import subprocess
 import json
-import time
 import sys
-from typing import Dict, List
+import time
+from typing import Dict
 from datetime import datetime
 
-def get_pod_metrics(namespace: str = "bigdata", label_selector: str = "component=taskmanager") -> List[Dict]:
-    """Получить метрики подов через kubectl top"""
-    try:
-        cmd = [
-            "kubectl", "top", "pods",
-            "-n", namespace,
-            "-l", label_selector,
-            "--no-headers"
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        
-        if result.returncode != 0:
-            print(f"[ERROR] kubectl top не доступен: {result.stderr}")
-            return []
-        
-        pods = []
-        for line in result.stdout.strip().split('\n'):
-            if not line:
-                continue
-            parts = line.split()
-            if len(parts) >= 3:
-                pod_name = parts[0]
-                cpu = parts[1]
-                memory = parts[2]
-                pods.append({
-                    "name": pod_name,
-                    "cpu": cpu,
-                    "memory": memory
-                })
-        return pods
-    except Exception as e:
-        print(f"[ERROR] Ошибка получения метрик: {e}")
-        return []
-
-def get_replica_count(namespace: str = "bigdata", statefulset: str = "flink-taskmanager") -> int:
-    """Получить текущее количество реплик StatefulSet"""
-    try:
-        cmd = [
-            "kubectl", "get", "statefulset",
-            statefulset,
-            "-n", namespace,
-            "-o", "jsonpath={.status.replicas}"
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        if result.returncode == 0 and result.stdout.strip():
-            return int(result.stdout.strip())
-        return 0
-    except Exception as e:
-        print(f"[ERROR] Ошибка получения количества реплик: {e}")
-        return 0
+from resource_sampler import KubeApiClient, ResourceSampler, TimeSeriesWriter, summarize
 
-def parse_cpu(cpu_str: str) -> float:
-    """Парсинг CPU значения в коры"""
-    cpu_str = cpu_str.strip()
-    if cpu_str.endswith('m'):
-        return float(cpu_str[:-1]) / 1000.0
-    elif cpu_str.endswith('n'):
-        return float(cpu_str[:-1]) / 1000000000.0
-    else:
-        return float(cpu_str)
+TOGGLE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "toggle_dynamic_allocation.sh")
 
-def parse_memory(mem_str: str) -> float:
-    """Парсинг памяти в гигабайты"""
-    mem_str = mem_str.strip()
-    if mem_str.endswith('Gi'):
-        return float(mem_str[:-2])
-    elif mem_str.endswith('Mi'):
-        return float(mem_str[:-2]) / 1024.0
-    elif mem_str.endswith('Ki'):
-        return float(mem_str[:-2]) / (1024 * 1024.0)
-    else:
-        return float(mem_str) / (1024 * 1024 * 1024.0)
+def toggle_dynamic_allocation(action: str, script: str = TOGGLE_SCRIPT) -> bool:
+    """Включение/выключение dynamic allocation скриптом (ждет готовности подов после рестарта)"""
+    try:
+        subprocess.run(["bash", script, action], check=True, timeout=900)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
+        print(f"[ERROR] Не удалось выполнить {script} {action}: {e}")
+        return False
 
-def collect_metrics(duration_seconds: int = 60, interval: int = 10) -> Dict:
+def collect_metrics(sampler: ResourceSampler, writer: TimeSeriesWriter, label: str,
+                    duration_seconds: int = 60, interval: float = 1.0) -> Dict:
     """Собрать метрики за указанный период"""
     print(f"Сбор метрик в течение {duration_seconds} секунд (интервал: {interval}с)...")
-    
     measurements = []
-    iterations = duration_seconds // interval
-    
-    for i in range(iterations):
-        timestamp = datetime.now().isoformat()
-        replicas = get_replica_count()
-        pods = get_pod_metrics()
-        
-        if pods:
-            total_cpu = sum(parse_cpu(p['cpu']) for p in pods)
-            total_memory = sum(parse_memory(p['memory']) for p in pods)
-            avg_cpu_per_pod = total_cpu / len(pods) if pods else 0
-            avg_memory_per_pod = total_memory / len(pods) if pods else 0
-            
-            measurement = {
-                "timestamp": timestamp,
-                "replicas": replicas,
-                "pod_count": len(pods),
-                "total_cpu_cores": round(total_cpu, 3),
-                "total_memory_gb": round(total_memory, 3),
-                "avg_cpu_per_pod": round(avg_cpu_per_pod, 3),
-                "avg_memory_per_pod": round(avg_memory_per_pod, 3),
-            }
-            measurements.append(measurement)
-            
-            print(f"[{i+1}/{iterations}] Реплик: {replicas}, Подов: {len(pods)}, "
-                  f"CPU: {total_cpu:.2f} cores, RAM: {total_memory:.2f} GB")
-        
-        if i < iterations - 1:
-            time.sleep(interval)
-    
-    # Вычислить средние значения
-    if measurements:
-        return {
-            "measurements": measurements,
-            "avg_replicas": round(sum(m['replicas'] for m in measurements) / len(measurements), 2),
-            "avg_total_cpu": round(sum(m['total_cpu_cores'] for m in measurements) / len(measurements), 3),
-            "avg_total_memory": round(sum(m['total_memory_gb'] for m in measurements) / len(measurements), 3),
-            "avg_cpu_per_pod": round(sum(m['avg_cpu_per_pod'] for m in measurements) / len(measurements), 3),
-            "avg_memory_per_pod": round(sum(m['avg_memory_per_pod'] for m in measurements) / len(measurements), 3),
-            "min_replicas": min(m['replicas'] for m in measurements),
-            "max_replicas": max(m['replicas'] for m in measurements),
-        }
-    
-    return {}
+
+    def report(measurement: Dict):
+        measurements.append(measurement)
+        pods = measurement["pods"]
+        print(f"[{len(measurements)}] Реплик: {measurement['replicas']}, Подов: {len(pods)}, "
+              f"CPU: {sum(p['cpu'] for p in pods):.2f} cores, RAM: {sum(p['memory'] for p in pods):.2f} GB")
+
+    sampler.run(writer, duration_seconds, interval, label, on_sample=report)
+    return summarize(measurements)
 
 def print_comparison(without_da: Dict, with_da: Dict):
     """Вывести сравнение метрик"""
@@ -191,8 +98,16 @@ def main():
     
     parser = argparse.ArgumentParser(description="Сравнение метрик с dynamic allocation и без")
     parser.add_argument("--duration", type=int, default=60, help="Длительность сбора метрик в секундах")
-    parser.add_argument("--interval", type=int, default=10, help="Интервал между измерениями в секундах")
+    parser.add_argument("--interval", type=float, default=1.0, help="Интервал между измерениями в секундах")
     parser.add_argument("--namespace", default="bigdata", help="Kubernetes namespace")
+    parser.add_argument("--api-server", default=None,
+                        help="URL Kubernetes API (по умолчанию in-cluster или kubectl proxy на :8001)")
+    parser.add_argument("--no-toggle", action="store_true",
+                        help="Не переключать dynamic allocation (конфигурация меняется внешним сценарием)")
+    parser.add_argument("--warmup", type=int, default=30, help="Пауза после переключения в секундах")
+    parser.add_argument("--samples-output", default="dynamic_allocation_samples.csv",
+                        help="Файл с временными рядами измерений")
+    parser.add_argument("--output", default="dynamic_allocation_comparison.json", help="Файл с итогами")
     
     args = parser.parse_args()
     
@@ -202,42 +117,29 @@ def main():
     print("=" * 80)
     print()
     
-    # Проверка доступности kubectl
+    client = KubeApiClient(args.api_server)
+    sampler = ResourceSampler(client, namespace=args.namespace)
+    results = {}
     try:
-        subprocess.run(["kubectl", "version", "--client"], capture_output=True, check=True, timeout=5)
-    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-        print("[ERROR] kubectl не доступен. Убедитесь, что kubectl установлен и настроен.")
-        return 1
-    
-    # Сбор метрик БЕЗ dynamic allocation
-    print("\n[ШАГ 1] Сбор метрик БЕЗ Dynamic Allocation")
-    print("Выключение dynamic allocation...")
-    print("Выполните вручную:")
-    print("  1. Отредактируйте kubernetes/01-flink-config.yaml - удалите строки с kubernetes.taskmanager.*")
-    print("  2. kubectl apply -f kubernetes/01-flink-config.yaml")
-    print("  3. kubectl rollout restart statefulset/flink-taskmanager -n bigdata")
-    input("Нажмите Enter когда dynamic allocation выключен и будете готовы начать сбор метрик...")
-    
-    without_da = collect_metrics(args.duration, args.interval)
-    
-    if not without_da:
-        print("[ERROR] Не удалось собрать метрики без dynamic allocation")
-        return 1
-    
-    # Сбор метрик С dynamic allocation
-    print("\n[ШАГ 2] Сбор метрик С Dynamic Allocation")
-    print("Включение dynamic allocation...")
-    print("Выполните вручную:")
-    print("  1. Убедитесь, что в kubernetes/01-flink-config.yaml есть строки с kubernetes.taskmanager.*")
-    print("  2. kubectl apply -f kubernetes/01-flink-config.yaml")
-    print("  3. kubectl rollout restart statefulset/flink-taskmanager -n bigdata")
-    input("Нажмите Enter когда dynamic allocation включен и будете готовы начать сбор метрик...")
-    
-    with_da = collect_metrics(args.duration, args.interval)
-    
-    if not with_da:
-        print("[ERROR] Не удалось собрать метрики с dynamic allocation")
-        return 1
+        with TimeSeriesWriter(args.samples_output) as writer:
+            for step, (label, action, title) in enumerate([
+                ("without_dynamic_allocation", "disable", "БЕЗ"),
+                ("with_dynamic_allocation", "enable", "С"),
+            ], start=1):
+                print(f"\n[ШАГ {step}] Сбор метрик {title} Dynamic Allocation")
+                if not args.no_toggle:
+                    if not toggle_dynamic_allocation(action):
+                        return 1
+                    time.sleep(args.warmup)
+                results[label] = collect_metrics(sampler, writer, label, args.duration, args.interval)
+                if not results[label]:
+                    print(f"[ERROR] Не удалось собрать метрики {title.lower()} dynamic allocation")
+                    return 1
+    finally:
+        sampler.close()
+    
+    without_da = results["without_dynamic_allocation"]
+    with_da = results["with_dynamic_allocation"]
     
     # Сравнение
     print_comparison(without_da, with_da)
@@ -247,14 +149,15 @@ def main():
         "timestamp": datetime.now().isoformat(),
         "duration_seconds": args.duration,
         "interval_seconds": args.interval,
+        "samples_file": args.samples_output,
         "without_dynamic_allocation": without_da,
         "with_dynamic_allocation": with_da
     }
     
-    with open("dynamic_allocation_comparison.json", "w", encoding='utf-8') as f:
+    with open(args.output, "w", encoding='utf-8') as f:
         json.dump(output, f, indent=2, ensure_ascii=False)
     
-    print("\n[OK] Результаты сохранены в dynamic_allocation_comparison.json")
+    print(f"\n[OK] Результаты сохранены в {args.output}, временные ряды - в {args.samples_output}")
     
     return 0
 
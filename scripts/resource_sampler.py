@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Высокочастотный сбор загруженности CPU и RAM подов напрямую из Kubernetes API.
+
+Вместо двух процессов kubectl на каждое измерение используется один клиент с постоянными
+(keep-alive) соединениями: метрики подов (metrics.k8s.io) и число реплик StatefulSet
+запрашиваются параллельно, поэтому интервал в 1 с и меньше выдерживается без сдвига.
+Измерения сразу дописываются в компактный CSV (по строке на под, .gz - со сжатием).
+
+API-сервер задается URL: внутри кластера - через service account, снаружи - через
+`kubectl proxy` (http://127.0.0.1:8001) или любой локальный сервер с теми же путями.
+"""
+
+import argparse
+import csv
+import gzip
+import http.client
+import json
+import math
+import os
+import re
+import ssl
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+from urllib.parse import quote, urlsplit
+
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+KUBECTL_PROXY_URL = "http://127.0.0.1:8001"
+CSV_FIELDS = ["timestamp", "label", "replicas", "pod", "cpu_millicores", "memory_mib", "window_seconds"]
+
+
+def parse_cpu(cpu_str: str) -> float:
+    """Парсинг CPU значения в коры"""
+    cpu_str = cpu_str.strip()
+    if cpu_str.endswith('m'):
+        return float(cpu_str[:-1]) / 1000.0
+    elif cpu_str.endswith('u'):
+        return float(cpu_str[:-1]) / 1000000.0
+    elif cpu_str.endswith('n'):
+        return float(cpu_str[:-1]) / 1000000000.0
+    else:
+        return float(cpu_str)
+
+
+def parse_memory(mem_str: str) -> float:
+    """Парсинг памяти в гигабайты"""
+    mem_str = mem_str.strip()
+    binary = {'Ki': 1024, 'Mi': 1024 ** 2, 'Gi': 1024 ** 3, 'Ti': 1024 ** 4}
+    decimal = {'k': 1000, 'M': 1000 ** 2, 'G': 1000 ** 3, 'T': 1000 ** 4}
+    if mem_str[-2:] in binary:
+        return float(mem_str[:-2]) * binary[mem_str[-2:]] / 1024 ** 3
+    if mem_str[-1:] in decimal:
+        return float(mem_str[:-1]) * decimal[mem_str[-1:]] / 1024 ** 3
+    return float(mem_str) / 1024 ** 3
+
+
+def parse_duration(duration: str) -> float:
+    """Длительность в формате Go ("15s", "1m0.5s") в секундах"""
+    units = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+    return sum(float(value) * units[unit] for value, unit in re.findall(r"([\d.]+)(ms|h|m|s)", duration))
+
+
+def default_api_server() -> str:
+    """Внутри пода - адрес API из окружения, иначе kubectl proxy"""
+    host = os.getenv("KUBERNETES_SERVICE_HOST")
+    if host:
+        return f"https://{host}:{os.getenv('KUBERNETES_SERVICE_PORT', '443')}"
+    return KUBECTL_PROXY_URL
+
+
+class KubeApiClient:
+    """
+    Клиент Kubernetes API с постоянными соединениями
+
+    У каждого потока свое keep-alive соединение (http.client не потокобезопасен),
+    поэтому параллельные запросы не открывают новых TCP/TLS-сессий на каждое измерение
+    """
+
+    def __init__(self, base_url: Optional[str] = None, token: Optional[str] = None,
+                 ca_cert: Optional[str] = None, insecure: bool = False, timeout: float = 5.0):
+        base_url = base_url or default_api_server()
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+
+        in_cluster = os.path.isdir(SERVICE_ACCOUNT_DIR) and base_url.startswith("https://")
+        if token is None and in_cluster:
+            with open(os.path.join(SERVICE_ACCOUNT_DIR, "token")) as f:
+                token = f.read().strip()
+        if ca_cert is None and in_cluster:
+            ca_cert = os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt")
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+        self.ssl_context = None
+        if self.scheme == "https":
+            self.ssl_context = ssl.create_default_context(cafile=ca_cert)
+            if insecure:
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.scheme == "https":
+                conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                                   context=self.ssl_context)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get_json(self, path: str) -> Dict:
+        """GET запрос; при разрыве keep-alive соединения запрос повторяется один раз"""
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("GET", self.prefix + path, headers=self.headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                with self._lock:
+                    self._connections.remove(conn)
+                if attempt:
+                    raise
+                continue
+            if response.status != 200:
+                raise RuntimeError(f"GET {path}: HTTP {response.status} {body[:200]!r}")
+            return json.loads(body)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class ResourceSampler:
+    """Периодический опрос метрик подов и числа реплик StatefulSet"""
+
+    def __init__(self, client: KubeApiClient, namespace: str = "bigdata",
+                 label_selector: str = "component=taskmanager", statefulset: str = "flink-taskmanager"):
+        self.client = client
+        self.pods_path = (f"/apis/metrics.k8s.io/v1beta1/namespaces/{namespace}/pods"
+                          f"?labelSelector={quote(label_selector)}")
+        self.statefulset_path = f"/apis/apps/v1/namespaces/{namespace}/statefulsets/{statefulset}"
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sampler")
+
+    def sample(self) -> Dict:
+        """Одно измерение: оба запроса выполняются параллельно"""
+        timestamp = time.time()
+        pods_future = self._executor.submit(self.client.get_json, self.pods_path)
+        replicas_future = self._executor.submit(self.client.get_json, self.statefulset_path)
+        pods = []
+        for item in pods_future.result().get("items", []):
+            containers = item.get("containers", [])
+            pods.append({
+                "name": item["metadata"]["name"],
+                "cpu": sum(parse_cpu(c["usage"]["cpu"]) for c in containers),
+                "memory": sum(parse_memory(c["usage"]["memory"]) for c in containers),
+                "window": parse_duration(item.get("window", "0s")),
+            })
+        replicas = replicas_future.result().get("status", {}).get("replicas", 0)
+        return {"timestamp": timestamp, "replicas": int(replicas), "pods": pods}
+
+    def run(self, writer: "TimeSeriesWriter", duration: float, interval: float = 1.0,
+            label: str = "", on_sample=None, stop: Optional[threading.Event] = None) -> int:
+        """
+        Сбор измерений в течение duration секунд с фиксированным шагом interval
+
+        Моменты измерений планируются от времени старта, поэтому длительность запросов
+        не накапливается в сдвиг; пропущенные из-за медленного API шаги не догоняются.
+        Сбор завершается раньше, если установлено событие stop
+        """
+        stop = stop or threading.Event()
+        started = time.monotonic()
+        deadline = started + duration
+        next_tick = started
+        samples = 0
+        while next_tick < deadline and not stop.is_set():
+            try:
+                measurement = self.sample()
+            except (RuntimeError, OSError, http.client.HTTPException, ValueError) as e:
+                print(f"[ERROR] Ошибка получения метрик: {e}", file=sys.stderr)
+            else:
+                writer.write(measurement, label)
+                samples += 1
+                if on_sample:
+                    on_sample(measurement)
+            now = time.monotonic()
+            next_tick += interval
+            if next_tick < now:
+                next_tick = started + math.ceil((now - started) / interval) * interval
+            stop.wait(max(0.0, min(next_tick, deadline) - now))
+        return samples
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+
+class TimeSeriesWriter:
+    """Построчная запись измерений в CSV (по строке на под); файл дописывается"""
+
+    def __init__(self, path: str):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        opener = gzip.open if path.endswith(".gz") else open
+        self._file = opener(path, "at", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if not exists:
+            self._writer.writerow(CSV_FIELDS)
+
+    def write(self, measurement: Dict, label: str = ""):
+        timestamp = f"{measurement['timestamp']:.3f}"
+        replicas = measurement["replicas"]
+        if not measurement["pods"]:
+            self._writer.writerow([timestamp, label, replicas, "", "", "", ""])
+        for pod in measurement["pods"]:
+            self._writer.writerow([timestamp, label, replicas, pod["name"], round(pod["cpu"] * 1000, 1),
+                                   round(pod["memory"] * 1024, 1), pod["window"]])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_samples(path: str, label: Optional[str] = None) -> Iterator[Dict]:
+    """Чтение файла измерений, сгруппированного обратно по моментам измерений"""
+    opener = gzip.open if path.endswith(".gz") else open
+    current = None
+    with opener(path, "rt", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if label is not None and row["label"] != label:
+                continue
+            key = (row["timestamp"], row["label"])
+            if current is None or current["key"] != key:
+                if current is not None:
+                    yield current
+                current = {"key": key, "timestamp": float(row["timestamp"]), "label": row["label"],
+                           "replicas": int(row["replicas"]), "pods": []}
+            if row["pod"]:
+                current["pods"].append({"name": row["pod"], "cpu": float(row["cpu_millicores"]) / 1000,
+                                        "memory": float(row["memory_mib"]) / 1024})
+    if current is not None:
+        yield current
+
+
+def summarize(samples) -> Dict:
+    """Средние и диапазоны по измерениям (формат compare_dynamic_allocation.collect_metrics)"""
+    totals = []
+    for s in samples:
+        if not s["pods"]:
+            continue
+        total_cpu = sum(p["cpu"] for p in s["pods"])
+        total_memory = sum(p["memory"] for p in s["pods"])
+        totals.append((s["replicas"], total_cpu, total_memory, len(s["pods"])))
+    if not totals:
+        return {}
+    n = len(totals)
+    return {
+        "samples": n,
+        "avg_replicas": round(sum(t[0] for t in totals) / n, 2),
+        "avg_total_cpu": round(sum(t[1] for t in totals) / n, 3),
+        "avg_total_memory": round(sum(t[2] for t in totals) / n, 3),
+        "avg_cpu_per_pod": round(sum(t[1] / t[3] for t in totals) / n, 3),
+        "avg_memory_per_pod": round(sum(t[2] / t[3] for t in totals) / n, 3),
+        "min_replicas": min(t[0] for t in totals),
+        "max_replicas": max(t[0] for t in totals),
+    }
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Высокочастотный сбор CPU/RAM подов из Kubernetes API")
+    parser.add_argument("--api-server", default=None,
+                        help=f"URL API-сервера (по умолчанию in-cluster или {KUBECTL_PROXY_URL})")
+    parser.add_argument("--token", default=None, help="Bearer-токен (по умолчанию токен service account)")
+    parser.add_argument("--ca-cert", default=None, help="CA-сертификат API-сервера")
+    parser.add_argument("--insecure", action="store_true", help="Не проверять TLS-сертификат")
+    parser.add_argument("--namespace", default="bigdata", help="Kubernetes namespace")
+    parser.add_argument("--selector", default="component=taskmanager", help="Label selector подов")
+    parser.add_argument("--statefulset", default="flink-taskmanager", help="StatefulSet для числа реплик")
+    parser.add_argument("--duration", type=float, default=60, help="Длительность сбора в секундах")
+    parser.add_argument("--interval", type=float, default=1.0, help="Интервал между измерениями в секундах")
+    parser.add_argument("--label", default="", help="Метка серии (например, with_da / without_da)")
+    parser.add_argument("--output", default="resource_samples.csv", help="Файл измерений (.csv или .csv.gz)")
+    args = parser.parse_args()
+
+    client = KubeApiClient(args.api_server, token=args.token, ca_cert=args.ca_cert, insecure=args.insecure)
+    sampler = ResourceSampler(client, args.namespace, args.selector, args.statefulset)
+    try:
+        with TimeSeriesWriter(args.output) as writer:
+            count = sampler.run(writer, args.duration, args.interval, args.label)
+    finally:
+        sampler.close()
+    summary = summarize(read_samples(args.output, args.label))
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    print(f"[OK] {count} измерений записано в {args.output}")
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
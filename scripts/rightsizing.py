@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Рекомендации по размерам ресурсов и инстансов по записанному потреблению.
+
+Источники временных рядов:
+    - CSV сборщика resource_sampler.py / compare_dynamic_allocation.py (по строке на под);
+    - выгрузка Prometheus query_range (JSON ответа /api/v1/query_range) для CPU и памяти.
+Для каждого компонента (под без порядкового номера или хэша ReplicaSet) считаются перцентили
+потребления на реплику, рекомендуются requests/limits и класс инстанса (cpu-bound,
+memory-bound, balanced), оцениваются экономия относительно текущих requests из
+docker-compose.yml / манифестов Kubernetes и риск троттлинга CPU и OOM.
+
+Разбор текущих конфигураций требует PyYAML; без него сравнение с текущими размерами пропускается.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from resource_sampler import parse_cpu, parse_memory, read_samples
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Типы инстансов: vCPU, ГБ RAM, цена $/час on-demand и spot (ориентировочно, us-east-1; см. 08-instance-optimization.yaml)
+INSTANCE_CATALOG = {
+    "m5.large": {"class": "balanced", "cpu": 2, "memory": 8, "on_demand": 0.096, "spot": 0.04},
+    "m5.xlarge": {"class": "balanced", "cpu": 4, "memory": 16, "on_demand": 0.192, "spot": 0.08},
+    "m5.2xlarge": {"class": "balanced", "cpu": 8, "memory": 32, "on_demand": 0.384, "spot": 0.16},
+    "c5.xlarge": {"class": "cpu-bound", "cpu": 4, "memory": 8, "on_demand": 0.17, "spot": 0.07},
+    "c5.2xlarge": {"class": "cpu-bound", "cpu": 8, "memory": 16, "on_demand": 0.34, "spot": 0.15},
+    "r5.large": {"class": "memory-bound", "cpu": 2, "memory": 16, "on_demand": 0.126, "spot": 0.05},
+    "r5.xlarge": {"class": "memory-bound", "cpu": 4, "memory": 32, "on_demand": 0.252, "spot": 0.10},
+}
+# Доля ресурсов узла, доступная подам (остальное - kubelet, системные демоны)
+ALLOCATABLE_FRACTION = 0.9
+# Границы ГБ памяти на ядро для классов нагрузки
+CPU_BOUND_MAX_GB_PER_CORE = 2.5
+MEMORY_BOUND_MIN_GB_PER_CORE = 6.0
+
+
+def component_of(pod: str) -> str:
+    """Имя компонента: без порядкового номера StatefulSet или суффиксов Deployment/ReplicaSet"""
+    name = re.sub(r"-[a-z0-9]{6,10}-[a-z0-9]{5}$", "", pod)
+    return re.sub(r"-\d+$", "", name)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0-100) с линейной интерполяцией"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def load_sampler_csv(path: str, usage: Dict[str, Dict[str, List[float]]]):
+    """Потребление на реплику из файла resource_sampler.py"""
+    for sample in read_samples(path):
+        replicas: Dict[str, int] = {}
+        for pod in sample["pods"]:
+            component = component_of(pod["name"])
+            series = usage.setdefault(component, {"cpu": [], "memory": [], "replicas": []})
+            series["cpu"].append(pod["cpu"])
+            series["memory"].append(pod["memory"])
+            replicas[component] = replicas.get(component, 0) + 1
+        for component, count in replicas.items():
+            usage[component]["replicas"].append(count)
+
+
+def load_prometheus_export(path: str, resource: str, usage: Dict[str, Dict[str, List[float]]],
+                           label: str = "pod"):
+    """
+    Потребление из ответа Prometheus /api/v1/query_range
+
+    CPU - в ядрах (например, rate(container_cpu_usage_seconds_total[1m])),
+    память - в байтах (container_memory_working_set_bytes)
+    """
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    result = payload.get("data", payload).get("result", [])
+    replicas: Dict[str, Dict[float, int]] = {}
+    for series in result:
+        metric = series.get("metric", {})
+        name = metric.get(label) or metric.get("pod") or metric.get("container") or metric.get("name")
+        if not name:
+            continue
+        component = component_of(name)
+        target = usage.setdefault(component, {"cpu": [], "memory": [], "replicas": []})
+        for timestamp, value in series.get("values", []):
+            value = float(value)
+            if math.isnan(value):
+                continue
+            target[resource].append(value if resource == "cpu" else value / 1024 ** 3)
+            if resource == "cpu":
+                counts = replicas.setdefault(component, {})
+                counts[timestamp] = counts.get(timestamp, 0) + 1
+    for component, counts in replicas.items():
+        usage[component]["replicas"].extend(counts.values())
+
+
+def _parse_resources(resources: Dict) -> Dict:
+    """requests/limits Kubernetes в ядрах и ГБ"""
+    parsed = {}
+    for kind in ("requests", "limits"):
+        values = resources.get(kind) or {}
+        parsed[kind] = {
+            "cpu": parse_cpu(str(values["cpu"])) if "cpu" in values else None,
+            "memory": parse_memory(str(values["memory"])) if "memory" in values else None,
+        }
+    return parsed
+
+
+def _compose_resources(values: Dict) -> Dict:
+    """cpus/memory docker compose в формате Kubernetes (суффиксы памяти docker - двоичные: 512M = 512Mi)"""
+    converted = {}
+    if "cpus" in values:
+        converted["cpu"] = values["cpus"]
+    if "memory" in values:
+        converted["memory"] = re.sub(r"^([\d.]+)([kmgt])b?$", lambda m: m.group(1) + m.group(2).upper() + "i",
+                                     str(values["memory"]).strip().lower())
+    return converted
+
+
+def load_compose_sizes(path: str) -> Dict[str, Dict]:
+    """Текущие размеры сервисов docker-compose.yml: reservations - requests, limits - limits"""
+    with open(path, encoding="utf-8") as f:
+        compose = yaml.safe_load(f)
+    sizes = {}
+    for name, service in (compose.get("services") or {}).items():
+        resources = ((service or {}).get("deploy") or {}).get("resources") or {}
+        if not resources:
+            continue
+        sizes[name] = _parse_resources({
+            "requests": _compose_resources(resources.get("reservations") or {}),
+            "limits": _compose_resources(resources.get("limits") or {}),
+        })
+        sizes[name]["source"] = os.path.basename(path)
+    return sizes
+
+
+def load_kubernetes_sizes(paths: List[str]) -> Dict[str, Dict]:
+    """Текущие размеры контейнеров StatefulSet/Deployment и профили из ConfigMap *-config.yaml"""
+    sizes = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            documents = [d for d in yaml.safe_load_all(f) if d]
+        for doc in documents:
+            kind, name = doc.get("kind"), doc.get("metadata", {}).get("name", "")
+            if kind in ("StatefulSet", "Deployment"):
+                spec = doc.get("spec", {})
+                for container in spec.get("template", {}).get("spec", {}).get("containers", []):
+                    if container.get("resources"):
+                        sizes[name] = _parse_resources(container["resources"])
+                        sizes[name].update({"source": os.path.basename(path), "replicas": spec.get("replicas", 1)})
+                        break
+            elif kind == "ConfigMap":
+                for key, value in (doc.get("data") or {}).items():
+                    if key.endswith("-config.yaml"):
+                        profile = yaml.safe_load(value) or {}
+                        if profile.get("resources"):
+                            profile_name = key[:-len("-config.yaml")]
+                            sizes[f"profile:{profile_name}"] = _parse_resources(profile["resources"])
+                            sizes[f"profile:{profile_name}"]["source"] = os.path.basename(path)
+    return sizes
+
+
+def _round_up(value: float, step: float) -> float:
+    return math.ceil(value / step - 1e-9) * step
+
+
+def recommend(cpu: List[float], memory: List[float], cpu_headroom: float = 0.15,
+              memory_headroom: float = 0.15, limit_headroom: float = 0.3) -> Dict:
+    """
+    Рекомендуемые requests/limits на реплику
+
+    CPU сжимаем: request - p95 с запасом, limit - p99 с запасом (превышение приводит к троттлингу).
+    Память не сжимаема: request - p99 с запасом, limit - максимум с запасом (превышение - OOM kill)
+    """
+    cpu_request = max(_round_up(percentile(cpu, 95) * (1 + cpu_headroom), 0.05), 0.05)
+    cpu_limit = max(_round_up(percentile(cpu, 99) * (1 + limit_headroom), 0.05), cpu_request)
+    memory_step = 64 / 1024
+    memory_request = max(_round_up(percentile(memory, 99) * (1 + memory_headroom), memory_step), memory_step)
+    memory_limit = max(_round_up(max(memory) * (1 + limit_headroom), memory_step), memory_request)
+    return {"requests": {"cpu": cpu_request, "memory": memory_request},
+            "limits": {"cpu": cpu_limit, "memory": memory_limit}}
+
+
+def risk(cpu: List[float], memory: List[float], size: Dict) -> Dict:
+    """
+    Риск для размеров size по наблюдениям
+
+    cpu_over_request - доля измерений выше request CPU (конкуренция на загруженном узле),
+    throttling - доля выше limit CPU, oom - доля измерений памяти выше 95% limit,
+    memory_headroom - запас limit памяти над наблюдавшимся максимумом
+    """
+    n_cpu, n_memory = max(len(cpu), 1), max(len(memory), 1)
+    requests, limits = size["requests"], size["limits"]
+    result = {"cpu_over_request": None, "throttling": None, "oom": None, "memory_headroom": None}
+    if requests.get("cpu"):
+        result["cpu_over_request"] = sum(v > requests["cpu"] for v in cpu) / n_cpu
+    if limits.get("cpu"):
+        result["throttling"] = sum(v > limits["cpu"] for v in cpu) / n_cpu
+    if limits.get("memory"):
+        result["oom"] = sum(v > 0.95 * limits["memory"] for v in memory) / n_memory
+        result["memory_headroom"] = 1 - max(memory, default=0.0) / limits["memory"]
+    return result
+
+
+def workload_class(cpu_request: float, memory_request: float) -> str:
+    ratio = memory_request / cpu_request if cpu_request else math.inf
+    if ratio <= CPU_BOUND_MAX_GB_PER_CORE:
+        return "cpu-bound"
+    if ratio >= MEMORY_BOUND_MIN_GB_PER_CORE:
+        return "memory-bound"
+    return "balanced"
+
+
+def cheapest_instance(cpu_request: float, memory_request: float, catalog: Dict, pricing: str = "spot",
+                      instance_class: Optional[str] = None) -> Optional[Tuple[str, int, float]]:
+    """
+    Инстанс с наименьшей стоимостью реплики в час при плотной упаковке подов
+
+    Returns:
+        (тип инстанса, подов на узел, $ за реплику в час) или None, если под не помещается
+    """
+    best = None
+    for name, spec in catalog.items():
+        if instance_class and spec["class"] != instance_class:
+            continue
+        pods = min(math.floor(spec["cpu"] * ALLOCATABLE_FRACTION / cpu_request),
+                   math.floor(spec["memory"] * ALLOCATABLE_FRACTION / memory_request))
+        if pods < 1:
+            continue
+        cost = spec[pricing] / pods
+        if best is None or cost < best[2]:
+            best = (name, pods, cost)
+    return best
+
+
+def analyze(usage: Dict[str, Dict[str, List[float]]], current: Dict[str, Dict], catalog: Dict,
+            pricing: str = "spot", **headroom) -> Dict[str, Dict]:
+    """Рекомендации, риск и экономия по компонентам"""
+    report = {}
+    for component, series in sorted(usage.items()):
+        cpu, memory = series["cpu"], series["memory"]
+        if not cpu or not memory:
+            continue
+        size = recommend(cpu, memory, **headroom)
+        req = size["requests"]
+        klass = workload_class(req["cpu"], req["memory"])
+        instance = cheapest_instance(req["cpu"], req["memory"], catalog, pricing, klass) \
+            or cheapest_instance(req["cpu"], req["memory"], catalog, pricing)
+        replicas = sum(series["replicas"]) / len(series["replicas"]) if series["replicas"] else 1.0
+        entry = {
+            "samples": len(cpu),
+            "avg_replicas": round(replicas, 2),
+            "cpu_cores": {f"p{q}": round(percentile(cpu, q), 4) for q in (50, 90, 95, 99)} | {"max": round(max(cpu), 4)},
+            "memory_gb": {f"p{q}": round(percentile(memory, q), 4) for q in (50, 90, 95, 99)} | {"max": round(max(memory), 4)},
+            "recommended": size,
+            "workload_class": klass,
+            "instance": {"type": instance[0], "pods_per_node": instance[1],
+                         "cost_per_replica_hour": round(instance[2], 4)} if instance else None,
+            "risk": risk(cpu, memory, size),
+        }
+        sizing = current.get(component)
+        if sizing and sizing["requests"]["cpu"] and sizing["requests"]["memory"]:
+            current_instance = cheapest_instance(sizing["requests"]["cpu"], sizing["requests"]["memory"], catalog, pricing)
+            entry["current"] = {
+                "source": sizing.get("source"),
+                "requests": sizing["requests"],
+                "limits": sizing["limits"],
+                "risk": risk(cpu, memory, sizing),
+                "cpu_utilization_p95": round(percentile(cpu, 95) / sizing["requests"]["cpu"], 3),
+                "memory_utilization_p99": round(percentile(memory, 99) / sizing["requests"]["memory"], 3),
+                "cost_per_replica_hour": round(current_instance[2], 4) if current_instance else None,
+            }
+            if current_instance and instance:
+                entry["savings"] = {
+                    "per_hour": round((current_instance[2] - instance[2]) * replicas, 4),
+                    "percent": round((1 - instance[2] / current_instance[2]) * 100, 1),
+                }
+        report[component] = entry
+    return report
+
+
+def format_quantity(cpu: Optional[float] = None, memory: Optional[float] = None) -> str:
+    if cpu is not None:
+        return f"{round(cpu * 1000)}m"
+    if memory is None:
+        return "-"
+    mib = round(memory * 1024)
+    return f"{mib // 1024}Gi" if mib % 1024 == 0 else f"{mib}Mi"
+
+
+def format_report(report: Dict[str, Dict]) -> str:
+    lines = [
+        "| Компонент | CPU p95 | RAM p99 | Класс | Requests (CPU/RAM) | Limits (CPU/RAM) | Инстанс | Текущие requests | Экономия | Троттлинг | OOM |",
+        "|-----------|--------:|--------:|-------|-------------------|------------------|---------|------------------|---------:|----------:|----:|",
+    ]
+    for component, entry in report.items():
+        rec = entry["recommended"]
+        current = entry.get("current")
+        savings = entry.get("savings")
+        instance = entry["instance"]
+        lines.append(
+            f"| {component} | {entry['cpu_cores']['p95']:.3f} | {entry['memory_gb']['p99']:.2f} ГБ | {entry['workload_class']} "
+            f"| {format_quantity(cpu=rec['requests']['cpu'])} / {format_quantity(memory=rec['requests']['memory'])} "
+            f"| {format_quantity(cpu=rec['limits']['cpu'])} / {format_quantity(memory=rec['limits']['memory'])} "
+            f"| {instance['type'] + ' x' + str(instance['pods_per_node']) if instance else '-'} "
+            f"| {format_quantity(cpu=current['requests']['cpu']) + ' / ' + format_quantity(memory=current['requests']['memory']) if current else '-'} "
+            f"| {str(savings['percent']) + '%' if savings else '-'} "
+            f"| {entry['risk']['throttling']:.1%} | {entry['risk']['oom']:.1%} |")
+    total_savings = sum(e["savings"]["per_hour"] for e in report.values() if e.get("savings"))
+    total_current = sum((e["current"]["cost_per_replica_hour"] or 0) * e["avg_replicas"]
+                        for e in report.values() if e.get("savings"))
+    if total_current:
+        lines.append("")
+        lines.append(f"Экономия по компонентам с известными текущими размерами: ${total_savings:.3f}/час "
+                     f"({total_savings / total_current:.1%} стоимости узлов под эти компоненты)")
+    return "\n".join(lines)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Рекомендации requests/limits и инстансов по потреблению ресурсов")
+    parser.add_argument("--samples", action="append", default=[], help="CSV resource_sampler.py (можно несколько)")
+    parser.add_argument("--prometheus-cpu", help="JSON query_range с CPU в ядрах")
+    parser.add_argument("--prometheus-memory", help="JSON query_range с памятью в байтах")
+    parser.add_argument("--label", default="pod", help="Метка Prometheus с именем пода/контейнера")
+    parser.add_argument("--compose", default=os.path.join(REPO_ROOT, "docker-compose.yml"),
+                        help="docker-compose.yml с текущими размерами")
+    parser.add_argument("--manifests", nargs="*", default=[
+        os.path.join(REPO_ROOT, "kubernetes", "03-flink-taskmanager-statefulset.yaml"),
+        os.path.join(REPO_ROOT, "kubernetes", "02-flink-jobmanager.yaml"),
+        os.path.join(REPO_ROOT, "kubernetes", "08-instance-optimization.yaml"),
+    ], help="Манифесты Kubernetes с текущими размерами (имеют приоритет над docker-compose)")
+    parser.add_argument("--catalog", help="JSON с типами инстансов (формат INSTANCE_CATALOG)")
+    parser.add_argument("--pricing", choices=["spot", "on_demand"], default="spot", help="Цены инстансов")
+    parser.add_argument("--cpu-headroom", type=float, default=0.15, help="Запас CPU request над p95")
+    parser.add_argument("--memory-headroom", type=float, default=0.15, help="Запас памяти request над p99")
+    parser.add_argument("--limit-headroom", type=float, default=0.3, help="Запас limits над p99 CPU / максимумом памяти")
+    parser.add_argument("--output", default="rightsizing", help="Префикс файлов отчета (.json и .md)")
+    args = parser.parse_args()
+
+    usage: Dict[str, Dict[str, List[float]]] = {}
+    for path in args.samples:
+        load_sampler_csv(path, usage)
+    if args.prometheus_cpu:
+        load_prometheus_export(args.prometheus_cpu, "cpu", usage, args.label)
+    if args.prometheus_memory:
+        load_prometheus_export(args.prometheus_memory, "memory", usage, args.label)
+    if not usage:
+        print("[ERROR] Нет данных: укажите --samples или --prometheus-cpu/--prometheus-memory")
+        return 1
+
+    current: Dict[str, Dict] = {}
+    if YAML_AVAILABLE:
+        if args.compose and os.path.exists(args.compose):
+            current.update(load_compose_sizes(args.compose))
+        current.update(load_kubernetes_sizes([p for p in args.manifests if os.path.exists(p)]))
+    else:
+        print("[WARN] PyYAML не установлен: сравнение с текущими размерами пропущено")
+
+    catalog = INSTANCE_CATALOG
+    if args.catalog:
+        with open(args.catalog, encoding="utf-8") as f:
+            catalog = json.load(f)
+
+    report = analyze(usage, current, catalog, args.pricing, cpu_headroom=args.cpu_headroom,
+                     memory_headroom=args.memory_headroom, limit_headroom=args.limit_headroom)
+    table = format_report(report)
+    print(table)
+
+    profiles = {name[len("profile:"):]: size for name, size in current.items() if name.startswith("profile:")}
+    with open(f"{args.output}.json", "w", encoding="utf-8") as f:
+        json.dump({"pricing": args.pricing, "components": report, "current_profiles": profiles}, f, indent=2, ensure_ascii=False)
+    with open(f"{args.output}.md", "w", encoding="utf-8") as f:
+        f.write(table + "\n")
+    print(f"\n[OK] Рекомендации сохранены в {args.output}.json и {args.output}.md")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Проверка resource_sampler на локальном сервере с путями Kubernetes API (http.server):
+метрики подов metrics.k8s.io и статус StatefulSet
+
+Запуск: python -m unittest scripts/test_resource_sampler.py (или pytest)
+"""
+
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from resource_sampler import KubeApiClient, ResourceSampler, TimeSeriesWriter, read_samples  # noqa: E402
+
+NAMESPACE = "bigdata"
+STATEFULSET = "flink-taskmanager"
+PODS = [
+    {"metadata": {"name": "flink-taskmanager-0"}, "window": "15s",
+     "containers": [{"usage": {"cpu": "250000000n", "memory": "512Mi"}}]},
+    {"metadata": {"name": "flink-taskmanager-1"}, "window": "15s",
+     "containers": [{"usage": {"cpu": "100m", "memory": "256Mi"}},
+                    {"usage": {"cpu": "50m", "memory": "64Mi"}}]},
+]
+
+
+class FakeKubeApiHandler(BaseHTTPRequestHandler):
+    """Ответы API-сервера по keep-alive соединениям (HTTP/1.1); счетчики - в атрибутах сервера"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            drop = self.server.drop_next
+            self.server.drop_next = False
+        if drop:
+            # Разрыв соединения без ответа, как при закрытии простаивающего keep-alive соединения
+            self.close_connection = True
+            return
+        if self.path.startswith(f"/apis/metrics.k8s.io/v1beta1/namespaces/{NAMESPACE}/pods?labelSelector="):
+            body = {"kind": "PodMetricsList", "items": PODS}
+        elif self.path == f"/apis/apps/v1/namespaces/{NAMESPACE}/statefulsets/{STATEFULSET}":
+            body = {"kind": "StatefulSet", "status": {"replicas": len(PODS), "readyReplicas": len(PODS)}}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeKubeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeKubeApiHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []
+        self.drop_next = False
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class ResourceSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeKubeApiServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        self.client = KubeApiClient(self.server.url, timeout=2.0)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmp.name, "samples.csv")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_run_writes_rows_at_subsecond_interval(self):
+        sampler = ResourceSampler(self.client, NAMESPACE, "component=taskmanager", STATEFULSET)
+        try:
+            with TimeSeriesWriter(self.output) as writer:
+                count = sampler.run(writer, duration=1.0, interval=0.2, label="with_da")
+        finally:
+            sampler.close()
+
+        self.assertGreaterEqual(count, 4)
+        with open(self.output, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), count * len(PODS))
+        self.assertEqual({row["label"] for row in rows}, {"with_da"})
+        self.assertEqual({row["replicas"] for row in rows}, {str(len(PODS))})
+        first = {row["pod"]: row for row in rows[:len(PODS)]}
+        self.assertEqual(float(first["flink-taskmanager-0"]["cpu_millicores"]), 250.0)
+        self.assertEqual(float(first["flink-taskmanager-0"]["memory_mib"]), 512.0)
+        self.assertEqual(float(first["flink-taskmanager-1"]["cpu_millicores"]), 150.0)
+        self.assertEqual(float(first["flink-taskmanager-1"]["memory_mib"]), 320.0)
+        self.assertEqual(float(first["flink-taskmanager-0"]["window_seconds"]), 15.0)
+
+        # Моменты измерений следуют с шагом interval без накопления сдвига
+        timestamps = [s["timestamp"] for s in read_samples(self.output, "with_da")]
+        self.assertEqual(len(timestamps), count)
+        steps = [b - a for a, b in zip(timestamps, timestamps[1:])]
+        self.assertTrue(all(0.1 < step < 0.3 for step in steps), steps)
+
+        # Оба запроса каждого измерения идут по постоянным соединениям потоков пула
+        self.assertEqual(len(self.server.requests), 2 * count)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_get_json_reuses_connection(self):
+        path = f"/apis/apps/v1/namespaces/{NAMESPACE}/statefulsets/{STATEFULSET}"
+        for _ in range(5):
+            self.assertEqual(self.client.get_json(path)["status"]["replicas"], len(PODS))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_get_json_reconnects_after_dropped_connection(self):
+        path = f"/apis/apps/v1/namespaces/{NAMESPACE}/statefulsets/{STATEFULSET}"
+        self.client.get_json(path)
+        self.server.drop_next = True
+        self.assertEqual(self.client.get_json(path)["status"]["replicas"], len(PODS))
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.client._connections), 1)
+
+    def test_get_json_raises_on_http_error(self):
+        with self.assertRaises(RuntimeError):
+            self.client.get_json("/apis/apps/v1/namespaces/other/statefulsets/missing")
+
+
+if __name__ == "__main__":
+    unittest.main()